@@ -0,0 +1,414 @@
+"""
+Сессия без Qt для скриптов и пакетных заданий.
+Asyncio client of profile server: keep-alive HTTP/1.1 connections are pooled,
+answers are decompressed and parsed while they are received
+"""
+import asyncio
+import ssl
+import time
+import typing
+import urllib.parse
+from collections import deque
+from http.cookies import SimpleCookie
+
+from cli3.arrow_ipc import AnswerParser, ArrowColumns, accept_header
+from cli3.compression import StreamDecoder, accept_encoding
+from cli3.decoding import decode
+from cli3.endpoints import Endpoints
+from cli3.models import Query
+from cli3.paging import Pager, encode_page
+from cli3.stream import ColumnBuffers
+
+_READ_SIZE = 64 * 1024
+
+
+class HttpError(Exception):
+    """
+    Server answered with error status
+    """
+
+    def __init__(self, status: int, message: str):
+        super().__init__(f'{status} {message}')
+        self.status = status
+        self.message = message
+
+
+class Response(object):
+    """
+    Http answer
+    """
+
+    def __init__(self, status: int, reason: str, headers: typing.Dict[str, str], body: bytes = b''):
+        self.status = status
+        self.reason = reason
+        # Lower case names
+        self.headers = headers
+        self.body = body
+        # Decompressed bytes and transferred bytes of body
+        self.size = len(body)
+        self.transferred = len(body)
+        self.keep_alive = False
+
+    def text(self) -> str:
+        return self.body.decode('utf-8', errors='replace')
+
+    def json(self, schema: str = None):
+        return decode(self.body, schema)
+
+
+class _Connection(object):
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self.used_at = time.monotonic()
+        self.requests = 0
+
+    def is_alive(self, idle_timeout: float) -> bool:
+        return not self.writer.is_closing() and not self.reader.at_eof() \
+               and time.monotonic() - self.used_at < idle_timeout
+
+    def close(self) -> None:
+        self.writer.close()
+
+
+class _StaleConnection(Exception):
+    """
+    Kept alive connection was closed by server before answer
+    """
+
+
+class ConnectionPool(object):
+    """
+    Keep-alive connections to one host, not more than max_connections are used at once
+    """
+
+    def __init__(self, host: str, port: int, use_ssl: bool = False, max_connections: int = 8,
+                 idle_timeout: float = 30, connect_timeout: float = None):
+        """
+        :param host: server host
+        :param port: server port
+        :param use_ssl: https
+        :param max_connections: connections (requests) at once, others wait
+        :param idle_timeout: idle connection is closed after timeout (sec)
+        :param connect_timeout: seconds to connect, None - no limit
+        """
+        self.host = host
+        self.port = port
+        self.max_connections = max(1, max_connections)
+        self.idle_timeout = idle_timeout
+        self.connect_timeout = connect_timeout
+        self._ssl = ssl.create_default_context() if use_ssl else None
+        self._idle = deque()
+        self._semaphore = None
+        # Connections opened and requests sent over kept alive connections
+        self.opened = 0
+        self.reused = 0
+
+    async def acquire(self) -> typing.Tuple[_Connection, bool]:
+        """
+        Take idle connection or open new one (waits for free slot)
+        :return: (connection, is reused)
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_connections)
+        await self._semaphore.acquire()
+        try:
+            while len(self._idle) > 0:
+                connection = self._idle.pop()
+                if connection.is_alive(self.idle_timeout):
+                    self.reused += 1
+                    return connection, True
+                connection.close()
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(self.host, self.port, ssl=self._ssl), self.connect_timeout)
+            self.opened += 1
+            return _Connection(reader, writer), False
+        except BaseException:
+            self._semaphore.release()
+            raise
+
+    def release(self, connection: _Connection, reusable: bool) -> None:
+        """
+        Return connection to pool
+        :param connection: acquired connection
+        :param reusable: connection may be used for next request
+        :return:
+        """
+        if reusable:
+            connection.used_at = time.monotonic()
+            connection.requests += 1
+            self._idle.append(connection)
+        else:
+            connection.close()
+        self._semaphore.release()
+
+    def close(self) -> None:
+        while len(self._idle) > 0:
+            self._idle.pop().close()
+
+
+class AsyncSession(Endpoints):
+    """
+    Сессия связи с сервером профилей на asyncio (без Qt)
+    """
+
+    def __init__(self, server: str, schema: str, max_connections: int = 8, connect_timeout: float = None,
+                 total_timeout: float = None, idle_timeout: float = 30):
+        """
+        :param server: server like http://host:port
+        :param schema: schema where user will work
+        :param max_connections: requests sent to server at once, others wait for free connection
+        :param connect_timeout: seconds to connect, None - no limit
+        :param total_timeout: seconds to get whole answer, None - no limit
+        :param idle_timeout: kept alive connection is closed after idle timeout (sec)
+        """
+        self._server = server if server.endswith('/') else server + '/'
+        self._schema = schema[:-1] if schema.endswith('/') else schema
+        self.total_timeout = total_timeout
+        url = urllib.parse.urlsplit(self._server)
+        self._host_header = url.netloc
+        self.pool = ConnectionPool(url.hostname, url.port or (443 if url.scheme == 'https' else 80),
+                                   url.scheme == 'https', max_connections, idle_timeout, connect_timeout)
+        self._cookies = SimpleCookie()
+        # Decompressed and transferred bytes of all answer bodies
+        self.received_bytes = 0
+        self.transferred_bytes = 0
+
+    def _make_url(self, path) -> str:
+        return self._server + self._schema + path
+
+    def get_base_url(self):
+        return self._make_url('')
+
+    async def __aenter__(self) -> 'AsyncSession':
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.pool.close()
+
+    async def login(self, username: str, password: str) -> str:
+        """
+        Sign in, session cookies are kept for next requests
+        :param username: user name
+        :param password: user password
+        :return: server answer
+        """
+        uri = f'{self.LOGIN_URL}?{urllib.parse.urlencode(dict(username=username, password=password))}'
+        return self._check(await self.get(uri)).text()
+
+    async def logout(self) -> str:
+        return self._check(await self.get(self.LOGOUT_URL)).text()
+
+    async def get(self, uri: str, consume: typing.Callable[[bytes], None] = None,
+                  headers: typing.Dict[str, str] = None,
+                  on_content_type: typing.Callable[[typing.Optional[str]], None] = None) -> Response:
+        """
+        Get uri of session schema
+        :param uri: path with query
+        :param consume: called with decompressed chunks of successful answer (body is not collected)
+        :param headers: additional headers
+        :param on_content_type: called with Content-Type of successful answer before consume
+        :return: answer
+        """
+        return await self.request('GET', self._make_url(uri), headers=headers, consume=consume,
+                                  on_content_type=on_content_type)
+
+    async def post(self, uri: str, body: bytes, content_type: str = 'application/json',
+                   consume: typing.Callable[[bytes], None] = None) -> Response:
+        return await self.request('POST', self._make_url(uri), body, {'Content-Type': content_type}, consume)
+
+    async def get_json(self, uri: str, schema: str = None):
+        """
+        Get json answer
+        :param uri: path with query
+        :param schema: typed schema name (see decoding.SCHEMAS)
+        :return: parsed answer
+        """
+        return self._check(await self.get(uri)).json(schema)
+
+    async def tree(self) -> dict:
+        return await self.get_json(self.TREE_API, 'tree')
+
+    async def styles(self):
+        return await self.get_json(self.STYLE_API)
+
+    async def query(self, query_id) -> Query:
+        """
+        Query definition
+        :param query_id: Query.id
+        :return: query model
+        """
+        return Query(await self.get_json(f'{self.QUERY_API}?id={query_id}', 'query'))
+
+    async def nci(self, name: str) -> dict:
+        """
+        Nci table
+        :param name: nci table name
+        :return: {"columns": [...], "rows": [...]}
+        """
+        return await self.get_json(f'{self.NCI_API}/{name}')
+
+    async def send_query(self, query: Query, params: dict = None) -> dict:
+        """
+        Run query, all pages of paged query are loaded
+        :param query: query model
+        :param params: params for query
+        :return: parsed answer, cursors data are ColumnBuffers (ArrowColumns for arrow answers)
+        """
+        pager = Pager.from_definition(query.paging)
+        content = await self._get_answer(query, params, pager)
+        while pager is not None and pager.has_more():
+            page = await self._get_answer(query, params, pager)
+            for name, value in page.items():
+                if isinstance(value, dict) and isinstance(value.get('data', None), (ColumnBuffers, ArrowColumns)):
+                    content[name]['data'].extend(value['data'])
+        return content
+
+    async def _get_answer(self, query: Query, params: typing.Optional[dict],
+                          pager: typing.Optional[Pager]) -> dict:
+        uri = f'{self.REQUEST_URL}?{query.make_request(params=params)}'
+        if pager is not None:
+            uri += encode_page(pager.page_params())
+        parser = AnswerParser()
+        self._check(await self.get(uri, parser.feed, {'Accept': accept_header()}, parser.set_content_type))
+        content = parser.close()
+        if pager is not None:
+            cursor = next((value for value in content.values()
+                           if isinstance(value, dict) and value.get('type', None) == 'cursor'), None)
+            if cursor is None:
+                pager.failed('No cursor in page answer')
+            else:
+                pager.page_received(cursor.get('page', None), len(cursor['data']))
+        return content
+
+    async def run_query(self, query_id, params: dict = None) -> dict:
+        """
+        Get query definition and run query
+        :param query_id: Query.id
+        :param params: params for query, others have default values
+        :return: parsed answer
+        """
+        return await self.send_query(await self.query(query_id), params)
+
+    @staticmethod
+    def _check(response: Response) -> Response:
+        if response.status != 200:
+            raise HttpError(response.status, response.text() or response.reason)
+        return response
+
+    async def request(self, method: str, url: str, body: bytes = None, headers: typing.Dict[str, str] = None,
+                      consume: typing.Callable[[bytes], None] = None,
+                      on_content_type: typing.Callable[[typing.Optional[str]], None] = None) -> Response:
+        """
+        Send http request over pooled connection.
+        Request over stale kept alive connection is repeated on new connection
+        :param method: GET or POST
+        :param url: full url
+        :param body: request body
+        :param headers: additional headers
+        :param consume: called with decompressed chunks of successful answer
+        :param on_content_type: called with Content-Type of successful answer before consume
+        :return: answer
+        """
+        split = urllib.parse.urlsplit(url)
+        target = (split.path or '/') + ('?' + split.query if split.query else '')
+        lines = [f'{method} {target} HTTP/1.1', f'Host: {self._host_header}',
+                 f'Accept-Encoding: {accept_encoding()}', 'Connection: keep-alive']
+        if len(self._cookies) > 0:
+            lines.append('Cookie: ' + '; '.join(f'{name}={morsel.value}' for name, morsel in self._cookies.items()))
+        for name, value in (headers or {}).items():
+            lines.append(f'{name}: {value}')
+        if body is not None:
+            lines.append(f'Content-Length: {len(body)}')
+        head = ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+        while True:
+            connection, reused = await self.pool.acquire()
+            reusable = False
+            try:
+                response = await asyncio.wait_for(
+                    self._exchange(connection, reused, head, body, method, consume, on_content_type),
+                    self.total_timeout)
+                reusable = response.keep_alive
+                self.received_bytes += response.size
+                self.transferred_bytes += response.transferred
+                return response
+            except _StaleConnection:
+                continue
+            finally:
+                self.pool.release(connection, reusable)
+
+    async def _exchange(self, connection: _Connection, reused: bool, head: bytes, body: typing.Optional[bytes],
+                        method: str, consume: typing.Optional[typing.Callable[[bytes], None]],
+                        on_content_type: typing.Optional[typing.Callable[[typing.Optional[str]], None]] = None) \
+            -> Response:
+        reader = connection.reader
+        try:
+            connection.writer.write(head + (body or b''))
+            await connection.writer.drain()
+            status_line = await reader.readline()
+        except ConnectionError:
+            if reused:
+                raise _StaleConnection()
+            raise
+        if status_line == b'':
+            if reused:
+                raise _StaleConnection()
+            raise ConnectionResetError('Connection closed without answer')
+        version, status, reason = (status_line.decode('latin-1').rstrip('\r\n').split(' ', 2) + [''])[:3]
+        status = int(status)
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            name = name.strip().lower()
+            value = value.strip()
+            if name == 'set-cookie':
+                self._cookies.load(value)
+            headers[name] = headers[name] + ', ' + value if name in headers else value
+        decoder = StreamDecoder(headers.get('content-encoding', None))
+        collected = []
+        sink = consume if consume is not None and status == 200 else collected.append
+        if on_content_type is not None and sink is consume:
+            on_content_type(headers.get('content-type', None))
+        framed = True
+        if method == 'HEAD' or status in (204, 304) or 100 <= status < 200:
+            pass
+        elif 'chunked' in headers.get('transfer-encoding', '').lower():
+            while True:
+                size = int((await reader.readline()).split(b';', 1)[0].strip() or b'0', 16)
+                if size == 0:
+                    # Trailers
+                    while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                        pass
+                    break
+                sink(decoder.decompress(await reader.readexactly(size)))
+                await reader.readexactly(2)
+        elif 'content-length' in headers:
+            left = int(headers['content-length'])
+            while left > 0:
+                chunk = await reader.read(min(left, _READ_SIZE))
+                if chunk == b'':
+                    raise asyncio.IncompleteReadError(b'', left)
+                left -= len(chunk)
+                sink(decoder.decompress(chunk))
+        else:
+            # Body ends with connection
+            framed = False
+            while True:
+                chunk = await reader.read(_READ_SIZE)
+                if chunk == b'':
+                    break
+                sink(decoder.decompress(chunk))
+        sink(decoder.flush())
+        response = Response(status, reason, headers, b''.join(collected))
+        response.size = decoder.size
+        response.transferred = decoder.compressed_size
+        connection_header = headers.get('connection', '').lower()
+        response.keep_alive = framed and connection_header != 'close' and \
+            (version == 'HTTP/1.1' or connection_header == 'keep-alive')
+        return response
@@ -6,7 +6,11 @@ import qtawesome as qta
 from PyQt5.QtCore import pyqtSignal
 from PyQt5.QtWidgets import QApplication
 
+from cli3.cache import MetadataCache, ResultCache
 from cli3.network import Session
+from cli3.nci_loader import NciLoader
+from cli3.retry import RetryPolicy, RetryBudget
+from cli3.styles import StyleTable
 
 
 class Cli3App(QApplication):
@@ -16,6 +20,8 @@ class Cli3App(QApplication):
     nci = dict()
     # Styles dict
     styles = dict()
+    # Numbered styles with brushes made of styles
+    _style_table = None
 
     @staticmethod
     def get_app_path():
@@ -30,8 +36,22 @@ class Cli3App(QApplication):
         path = pathlib.Path(__file__).parent.parent.resolve()
         config = self._read_config(str(Cli3App.get_app_path()) + '/cli3.ini')
         default_section = config['DEFAULT']
+        cache_file = default_section.get('cache_file')
+        cache = MetadataCache(ttl=default_section.getfloat('cache_ttl'),
+                              max_entries=default_section.getint('cache_size'),
+                              path=str(Cli3App.get_app_path()) + '/' + cache_file if cache_file else None)
         self.session = Session(f"http://{default_section.get('server')}:{default_section.get('port')}",
-                               default_section.get("schema"))
+                               default_section.get("schema"), cache,
+                               default_section.getfloat('connect_timeout') or None,
+                               default_section.getfloat('total_timeout') or None,
+                               default_section.getint('max_requests_per_host'),
+                               RetryPolicy(default_section.getint('retry_attempts'),
+                                           default_section.getfloat('retry_base_delay'),
+                                           default_section.getfloat('retry_max_delay'),
+                                           RetryBudget(default_section.getfloat('retry_budget'))),
+                               self._make_result_cache(default_section))
+        self.nci_loader = NciLoader(self.session, str(Cli3App.get_app_path()) + '/data', self.nci,
+                                    default_section.getint('nci_workers'))
         self._load_icons()
 
     #        path = pathlib.Path(__file__).parent.resolve()
@@ -40,12 +60,69 @@ class Cli3App(QApplication):
     #            print('QSS:', self._qss)
     #            self.setStyleSheet(self._qss)
 
+    @staticmethod
+    def _make_result_cache(section) -> typing.Optional[ResultCache]:
+        """
+        Result cache from config (opt-in)
+        :param section: config section
+        :return: cache or None if it is off
+        """
+        if not section.getboolean('result_cache'):
+            return None
+        return ResultCache(str(Cli3App.get_app_path()) + '/' + section.get('result_cache_dir'),
+                           ttl=section.getfloat('result_cache_ttl'),
+                           max_bytes=section.getint('result_cache_size') * 1024 * 1024,
+                           max_entries=section.getint('result_cache_entries'))
+
+    def get_nci(self, name):
+        """
+        Get nci table, waits for it if it is still loading
+        :param name: nci table name
+        :return: nci dataframe or None
+        """
+        if name not in self.nci:
+            return self.nci_loader.wait(name)
+        return self.nci[name]
+
+    def get_style_table(self) -> StyleTable:
+        """
+        Brushes of styles, they are made again only when styles are loaded again
+        :return:
+        """
+        if self._style_table is None or self._style_table.styles is not self.styles:
+            self._style_table = StyleTable(self.styles)
+        return self._style_table
+
     def _read_config(self, filename):
         config = configparser.ConfigParser()
         config['DEFAULT'] = {
             'server': '127.0.0.1',
             'port': 8000,
             'schema': 'common',
+            # Metadata cache: time to live (sec), max entries, file to persist (empty - memory only)
+            'cache_ttl': 300,
+            'cache_size': 256,
+            'cache_file': '',
+            # Nci tables downloaded at once
+            'nci_workers': 4,
+            # Request timeouts (sec): wait for answer headers, wait for whole answer (0 - no limit)
+            'connect_timeout': 30,
+            'total_timeout': 600,
+            # Queries sent to server at once (one is kept for interactive queries)
+            'max_requests_per_host': 4,
+            # Retries of failed queries: attempts (1 - no retries), backoff delays (sec),
+            # retries allowed per sent request
+            'retry_attempts': 3,
+            'retry_base_delay': 0.5,
+            'retry_max_delay': 10,
+            'retry_budget': 0.2,
+            # Query results cache on disk: on/off, directory, default time to live (sec),
+            # max size (Mb) and count of results
+            'result_cache': 'no',
+            'result_cache_dir': 'data/results',
+            'result_cache_ttl': 600,
+            'result_cache_size': 256,
+            'result_cache_entries': 1000,
         }
         config.read(filename)
         return config
@@ -57,6 +134,8 @@ class Cli3App(QApplication):
             'save': qta.icon('fa5.save'),
             'refresh': qta.icon('mdi.table-sync'),
             'error': qta.icon('fa5.times-circle', color='red'),
+            'cancel': qta.icon('fa5.stop-circle', color='orange'),
+            'timeout': qta.icon('fa5.clock', color='red'),
             'success': qta.icon('fa5.check-circle', color='green'),
             'table': qta.icon('mdi.file-table'),
             'send': qta.icon('mdi.send-circle'),
@@ -0,0 +1,223 @@
+"""
+Ответ на запрос в формате Arrow IPC.
+Client asks for Arrow stream with Accept header, server answers with it or with json.
+Arrow answer has one cursor: its rows are record batches with typed columns, the rest of answer
+(cursor "columns", "page" and other attributes) is json in schema metadata.
+pyarrow is optional, without it answers are json
+"""
+import json
+import typing
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+except ImportError:
+    pyarrow = None
+
+from cli3.decoding import decode
+from cli3.stream import AnswerStreamParser
+
+ARROW_STREAM = 'application/vnd.apache.arrow.stream'
+JSON = 'application/json'
+
+# Schema metadata keys
+ANSWER_KEY = b'cli3.answer'
+CURSOR_KEY = b'cli3.cursor'
+
+
+def available() -> bool:
+    return pyarrow is not None
+
+
+def accept_header() -> str:
+    """
+    Value of Accept header for query answers
+    :return: header value
+    """
+    if pyarrow is None:
+        return JSON
+    return f'{ARROW_STREAM}, {JSON};q=0.9'
+
+
+def is_arrow(content_type: typing.Optional[str]) -> bool:
+    return content_type is not None and content_type.split(';', 1)[0].strip().lower() == ARROW_STREAM
+
+
+def accepts_arrow(accept: typing.Optional[str]) -> bool:
+    return accept is not None and any(is_arrow(item) for item in accept.split(','))
+
+
+class ArrowColumns(object):
+    """
+    Cursor data as arrow table, column values are python lists only on demand
+    (same interface as ColumnBuffers)
+    """
+
+    def __init__(self, table: 'pyarrow.Table'):
+        self.table = table
+
+    def __len__(self):
+        return self.table.num_rows
+
+    def column(self, i: int) -> list:
+        """
+        Column values
+        :param i: column index
+        :return: values (None for missing column)
+        """
+        if i < self.table.num_columns:
+            return self.table.column(i).to_pylist()
+        return [None] * self.table.num_rows
+
+    def to_dict(self, names: typing.List[str]) -> typing.Dict[str, list]:
+        return {name: self.column(i) for i, name in enumerate(names)}
+
+    def rows(self) -> typing.Iterator[list]:
+        columns = [self.column(i) for i in range(self.table.num_columns)]
+        for i in range(self.table.num_rows):
+            yield [column[i] for column in columns]
+
+    def extend(self, other: 'ArrowColumns') -> None:
+        """
+        Append rows of next page
+        :param other: page data with the same schema
+        :return:
+        """
+        self.table = pyarrow.concat_tables([self.table, other.table])
+
+
+def _arrow_type(column: dict) -> 'pyarrow.DataType':
+    column_type = column.get('type', 'STRING').upper()
+    if column_type == 'INTEGER':
+        return pyarrow.int64()
+    if column_type == 'NUMBER':
+        return pyarrow.float64()
+    if column_type == 'BOOL':
+        return pyarrow.bool_()
+    if column_type in ('DATE', 'DATETIME'):
+        return pyarrow.timestamp('ms')
+    return pyarrow.string()
+
+
+def _arrow_array(values: list, column: dict) -> 'pyarrow.Array':
+    arrow_type = _arrow_type(column)
+    try:
+        if pyarrow.types.is_timestamp(arrow_type):
+            return pyarrow.array(values, pyarrow.string()).cast(arrow_type)
+        if pyarrow.types.is_boolean(arrow_type):
+            return pyarrow.array([None if value is None else str(value).upper() == 'TRUE' for value in values],
+                                 arrow_type)
+        return pyarrow.array(values, arrow_type)
+    except (pyarrow.ArrowInvalid, pyarrow.ArrowTypeError, pyarrow.ArrowNotImplementedError):
+        # Values are sent as text, client parses them
+        return pyarrow.array([None if value is None else str(value) for value in values], pyarrow.string())
+
+
+def encode_answer(answer: dict, batch_size: int = 65536) -> typing.Optional[bytes]:
+    """
+    Arrow stream of answer with one cursor
+    :param answer: answer with rows in cursor "data"
+    :param batch_size: rows in record batch
+    :return: stream bytes or None if answer can not be sent as arrow (no pyarrow, not one cursor)
+    """
+    if pyarrow is None:
+        return None
+    cursors = [name for name, value in answer.items() if isinstance(value, dict) and value.get('type') == 'cursor']
+    if len(cursors) != 1:
+        return None
+    name = cursors[0]
+    cursor = answer[name]
+    columns = cursor['columns']
+    rows = cursor['data']
+    arrays = [_arrow_array([row[i] if i < len(row) else None for row in rows], column)
+              for i, column in enumerate(columns)]
+    head = dict(answer, **{name: {key: value for key, value in cursor.items() if key != 'data'}})
+    table = pyarrow.Table.from_arrays(arrays, names=[column['name'] for column in columns]) \
+        .replace_schema_metadata({ANSWER_KEY: json.dumps(head, default=str).encode(), CURSOR_KEY: name.encode()})
+    sink = pyarrow.BufferOutputStream()
+    with pyarrow.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table, max_chunksize=batch_size)
+    return sink.getvalue().to_pybytes()
+
+
+def decode_answer(body: bytes) -> dict:
+    """
+    Answer from arrow stream, cursor data is ArrowColumns
+    :param body: stream bytes
+    :return: answer
+    """
+    if pyarrow is None:
+        raise ValueError('Arrow answer requires pyarrow package')
+    try:
+        table = pyarrow.ipc.open_stream(pyarrow.py_buffer(body)).read_all()
+    except pyarrow.ArrowException as e:
+        raise ValueError(str(e))
+    metadata = table.schema.metadata or {}
+    if ANSWER_KEY not in metadata or CURSOR_KEY not in metadata:
+        raise ValueError('No answer in arrow metadata')
+    answer = decode(metadata[ANSWER_KEY])
+    answer[metadata[CURSOR_KEY].decode()]['data'] = ArrowColumns(table.replace_schema_metadata(None))
+    return answer
+
+
+class ArrowStreamParser(object):
+    """
+    Collects arrow stream, answer is decoded at the end
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def feed(self, chunk: bytes) -> None:
+        if len(chunk) > 0:
+            self._chunks.append(chunk)
+
+    def close(self) -> dict:
+        return decode_answer(b''.join(self._chunks))
+
+
+class AnswerParser(object):
+    """
+    Parser of query answer by its content type: arrow stream or json (parsed while it is received)
+    """
+
+    def __init__(self):
+        self._parser = AnswerStreamParser()
+
+    def set_content_type(self, content_type: typing.Optional[str]) -> None:
+        """
+        Choose parser, must be called before first chunk
+        :param content_type: Content-Type of answer
+        :return:
+        """
+        if is_arrow(content_type):
+            self._parser = ArrowStreamParser()
+
+    def feed(self, chunk: bytes) -> None:
+        self._parser.feed(chunk)
+
+    def close(self) -> dict:
+        return self._parser.close()
+
+
+def to_numpy(data: ArrowColumns, i: int, column_type: str):
+    """
+    Typed column as numpy array without python objects
+    :param data: cursor data
+    :param i: column index
+    :param column_type: Column.type
+    :return: array like ingest.parse_column gives or None if column must be parsed from values
+    """
+    if i >= data.table.num_columns:
+        return None
+    array = data.table.column(i)
+    arrow_type = array.type
+    if column_type == 'INTEGER' and pyarrow.types.is_integer(arrow_type):
+        return array.fill_null(0).cast(pyarrow.int64()).to_numpy()
+    if column_type == 'NUMBER' and (pyarrow.types.is_floating(arrow_type) or pyarrow.types.is_integer(arrow_type)):
+        return array.cast(pyarrow.float64()).to_numpy()
+    if column_type == 'BOOL' and pyarrow.types.is_boolean(arrow_type):
+        return array.fill_null(False).to_numpy()
+    if column_type in ('DATE', 'DATETIME', 'TIME') and pyarrow.types.is_timestamp(arrow_type):
+        return array.cast(pyarrow.timestamp('ns')).to_numpy()
+    return None
@@ -0,0 +1,413 @@
+"""
+Кэш метаданных (запросы, дерево, стили) по url
+и кэш результатов запросов по запросу и параметрам
+"""
+import hashlib
+import json
+import os
+import pickle
+import time
+import typing
+from collections import OrderedDict
+
+
+class CacheEntry(object):
+    """
+    Cached answer for url with validators for conditional revalidation
+    """
+
+    def __init__(self, url: str, body: str, etag: str = None, last_modified: str = None,
+                 max_age: float = 0, stored_at: float = None, scope: str = ''):
+        self.url = url
+        self.scope = scope
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.max_age = max_age
+        self.stored_at = time.time() if stored_at is None else stored_at
+
+    def age(self, now: float = None) -> float:
+        return (time.time() if now is None else now) - self.stored_at
+
+    def is_fresh(self, now: float = None) -> bool:
+        return self.age(now) < self.max_age
+
+    def validators(self) -> typing.Dict[str, str]:
+        """
+        Headers for conditional request
+        :return: header -> value dict
+        """
+        headers = {}
+        if self.etag is not None:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified is not None:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+    def to_dict(self) -> dict:
+        return dict(url=self.url, body=self.body, etag=self.etag, last_modified=self.last_modified,
+                    max_age=self.max_age, stored_at=self.stored_at, scope=self.scope)
+
+    @staticmethod
+    def from_dict(entry: dict) -> 'CacheEntry':
+        return CacheEntry(**entry)
+
+
+def parse_cache_control(value: str) -> typing.Dict[str, typing.Optional[str]]:
+    """
+    Parse Cache-Control header
+    :param value: header value like 'max-age=60, no-cache'
+    :return: directive -> value dict
+    """
+    directives = {}
+    for directive in (value or '').split(','):
+        directive = directive.strip()
+        if directive == '':
+            continue
+        name, _, arg = directive.partition('=')
+        directives[name.strip().lower()] = arg.strip().strip('"') if arg else None
+    return directives
+
+
+class MetadataCache(object):
+    """
+    LRU cache of http answers with TTL.
+    Entries are kept by scope (server, schema and user of session) and url,
+    answers for one user are not given to another.
+    Stale entries are kept for revalidation with If-None-Match/If-Modified-Since.
+    May be persisted to json file
+    """
+
+    def __init__(self, ttl: float = 60, max_entries: int = 256, path: str = None):
+        """
+        :param ttl: default time to live in seconds (when server sends no max-age)
+        :param max_entries: LRU size
+        :param path: file to persist cache, None - memory only
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.path = path
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.evictions = 0
+        if self.path is not None:
+            self.load()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, url):
+        return self._key(url) in self._entries
+
+    @staticmethod
+    def _key(url: str, scope: str = '') -> str:
+        return json.dumps([scope, url]) if scope else url
+
+    def get(self, url: str, scope: str = '') -> typing.Optional[CacheEntry]:
+        """
+        Get entry (fresh or stale) and mark it as recently used
+        :param url: full url
+        :param scope: Session.get_cache_scope()
+        :return: entry or None
+        """
+        key = self._key(url, scope)
+        entry = self._entries.get(key, None)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        if entry.is_fresh():
+            self.hits += 1
+        return entry
+
+    def put(self, url: str, body: str, headers: typing.Dict[str, str] = None,
+            scope: str = '') -> typing.Optional[CacheEntry]:
+        """
+        Store answer for url
+        :param url: full url
+        :param body: answer
+        :param headers: answer headers (lower case names)
+        :param scope: Session.get_cache_scope()
+        :return: stored entry or None if answer may not be stored
+        """
+        headers = headers or {}
+        directives = parse_cache_control(headers.get('cache-control', None))
+        if 'no-store' in directives:
+            self.invalidate(url, scope)
+            return None
+        entry = CacheEntry(url, body, headers.get('etag', None), headers.get('last-modified', None),
+                           self._max_age(directives), scope=scope)
+        key = self._key(url, scope)
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        return entry
+
+    def revalidate(self, url: str, headers: typing.Dict[str, str] = None,
+                   scope: str = '') -> typing.Optional[CacheEntry]:
+        """
+        Server answered 304 Not Modified, entry is fresh again
+        :param url: full url
+        :param headers: answer headers (lower case names)
+        :param scope: Session.get_cache_scope()
+        :return: revalidated entry
+        """
+        key = self._key(url, scope)
+        entry = self._entries.get(key, None)
+        if entry is None:
+            return None
+        headers = headers or {}
+        entry.stored_at = time.time()
+        entry.max_age = self._max_age(parse_cache_control(headers.get('cache-control', None)))
+        entry.etag = headers.get('etag', entry.etag)
+        entry.last_modified = headers.get('last-modified', entry.last_modified)
+        self._entries.move_to_end(key)
+        self.revalidations += 1
+        return entry
+
+    def invalidate(self, url: str = None, scope: str = '') -> None:
+        """
+        Remove entry for url or all entries
+        :param url: full url, None - clear cache
+        :param scope: Session.get_cache_scope()
+        :return:
+        """
+        if url is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(self._key(url, scope), None)
+
+    def _max_age(self, directives: dict) -> float:
+        if 'no-cache' in directives:
+            return 0
+        if directives.get('max-age', None) is not None:
+            try:
+                return float(directives['max-age'])
+            except ValueError:
+                pass
+        return self.ttl
+
+    def load(self) -> None:
+        """
+        Load entries from file (if exists)
+        :return:
+        """
+        if self.path is None or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as inp:
+                entries = json.load(inp)
+        except (OSError, ValueError):
+            return
+        self._entries.clear()
+        for entry in entries[-self.max_entries:]:
+            entry = CacheEntry.from_dict(entry)
+            self._entries[self._key(entry.url, entry.scope)] = entry
+
+    def save(self) -> None:
+        """
+        Save entries to file in LRU order
+        :return:
+        """
+        if self.path is None:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as outp:
+            json.dump([entry.to_dict() for entry in self._entries.values()], outp)
+        os.replace(tmp_path, self.path)
+
+
+def result_key(query_id, params: dict = None, scope: str = '') -> str:
+    """
+    Canonical key of query result
+    :param query_id: Query.id
+    :param params: all query params (name -> value)
+    :param scope: server, schema and user of session (results of one user are not given to another)
+    :return: key (hex digest)
+    """
+    canonical = json.dumps({'scope': scope, 'id': query_id, 'params': params or {}}, sort_keys=True, default=str,
+                           separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class ResultEntry(object):
+    """
+    Query result stored in file
+    """
+
+    def __init__(self, key: str, query_id=None, size: int = 0, ttl: float = 0, stored_at: float = None):
+        self.key = key
+        self.query_id = query_id
+        self.size = size
+        self.ttl = ttl
+        self.stored_at = time.time() if stored_at is None else stored_at
+
+    def age(self, now: float = None) -> float:
+        return (time.time() if now is None else now) - self.stored_at
+
+    def is_fresh(self, now: float = None) -> bool:
+        return self.age(now) < self.ttl
+
+    def to_dict(self) -> dict:
+        return dict(key=self.key, query_id=self.query_id, size=self.size, ttl=self.ttl, stored_at=self.stored_at)
+
+    @staticmethod
+    def from_dict(entry: dict) -> 'ResultEntry':
+        return ResultEntry(**entry)
+
+
+class ResultCache(object):
+    """
+    LRU cache of parsed query results on disk.
+    Results are pickled, so hit needs neither network nor json parsing.
+    Size is bounded by total bytes of files and count of entries
+    """
+    INDEX_FILE = 'index.json'
+
+    def __init__(self, path: str, ttl: float = 600, max_bytes: int = 256 * 1024 * 1024, max_entries: int = 1000):
+        """
+        :param path: cache directory
+        :param ttl: default time to live in seconds (when query has no cache_ttl)
+        :param max_bytes: max total size of stored results
+        :param max_entries: max count of stored results
+        """
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+        self.evicted_bytes = 0
+        self.load()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key: str) -> typing.Optional[typing.Tuple[ResultEntry, typing.Any]]:
+        """
+        Get fresh result and mark it as recently used
+        :param key: result_key
+        :return: (entry, result) or None
+        """
+        entry = self._entries.get(key, None)
+        if entry is not None and not entry.is_fresh():
+            self.expirations += 1
+            self._remove(key)
+            self._save_index()
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        try:
+            with open(self._file(key), 'rb') as inp:
+                result = pickle.load(inp)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            self.misses += 1
+            self._remove(key)
+            self._save_index()
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry, result
+
+    def put(self, key: str, result, ttl: float = None, query_id=None) -> typing.Optional[ResultEntry]:
+        """
+        Store result
+        :param key: result_key
+        :param result: picklable result
+        :param ttl: time to live, None - default, 0 - do not store
+        :param query_id: query of result (to invalidate by query)
+        :return: stored entry or None
+        """
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0:
+            return None
+        data = pickle.dumps(result, pickle.HIGHEST_PROTOCOL)
+        if len(data) > self.max_bytes:
+            return None
+        os.makedirs(self.path, exist_ok=True)
+        self._remove(key)
+        tmp_path = self._file(key) + '.tmp'
+        with open(tmp_path, 'wb') as outp:
+            outp.write(data)
+        os.replace(tmp_path, self._file(key))
+        entry = ResultEntry(key, query_id, len(data), ttl)
+        self._entries[key] = entry
+        self.size += entry.size
+        while len(self._entries) > self.max_entries or self.size > self.max_bytes:
+            evicted = self._remove(next(iter(self._entries)))
+            self.evictions += 1
+            self.evicted_bytes += evicted.size
+        self._save_index()
+        return entry
+
+    def invalidate(self, key: str = None, query_id=None) -> None:
+        """
+        Remove result by key, all results of query or all results
+        :param key: result_key
+        :param query_id: Query.id
+        :return:
+        """
+        if key is not None:
+            keys = [key] if key in self._entries else []
+        elif query_id is not None:
+            keys = [entry.key for entry in self._entries.values() if entry.query_id == query_id]
+        else:
+            keys = list(self._entries.keys())
+        for key in keys:
+            self._remove(key)
+        self._save_index()
+
+    def stats(self) -> dict:
+        return dict(entries=len(self._entries), size=self.size, hits=self.hits, misses=self.misses,
+                    expirations=self.expirations, evictions=self.evictions, evicted_bytes=self.evicted_bytes)
+
+    def _file(self, key: str) -> str:
+        return os.path.join(self.path, key + '.pickle')
+
+    def _remove(self, key: str) -> typing.Optional[ResultEntry]:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry.size
+            try:
+                os.remove(self._file(key))
+            except OSError:
+                pass
+        return entry
+
+    def load(self) -> None:
+        """
+        Load index of stored results, results without files are dropped
+        :return:
+        """
+        try:
+            with open(os.path.join(self.path, self.INDEX_FILE), 'r', encoding='utf-8') as inp:
+                entries = json.load(inp)
+        except (OSError, ValueError):
+            return
+        self._entries.clear()
+        self.size = 0
+        for entry in entries:
+            entry = ResultEntry.from_dict(entry)
+            if os.path.exists(self._file(entry.key)):
+                self._entries[entry.key] = entry
+                self.size += entry.size
+
+    def _save_index(self) -> None:
+        os.makedirs(self.path, exist_ok=True)
+        tmp_path = os.path.join(self.path, self.INDEX_FILE + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as outp:
+            json.dump([entry.to_dict() for entry in self._entries.values()], outp)
+        os.replace(tmp_path, os.path.join(self.path, self.INDEX_FILE))
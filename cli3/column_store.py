@@ -0,0 +1,251 @@
+"""
+Хранилище колонок результата.
+Every column is one contiguous typed numpy array (see ingest), rows are addressed by position,
+so cell access is array indexing without pandas. Dataframes are built only for export.
+Columns may be left raw (answer buffers) and converted on first access: wide results show few columns
+"""
+import typing
+from collections.abc import Mapping
+
+import numpy as np
+import pandas as pd
+
+from cli3.arrow_ipc import ArrowColumns
+from cli3.ingest import make_column, arrays_to_dataframe, parse_column
+from cli3.models import Column
+from cli3.stream import ColumnBuffers
+
+
+def compact_column(data, i: int, column: Column) -> np.ndarray:
+    """
+    Typed array of cursor column, raw values in ColumnBuffers are replaced by it
+    (answer content keeps one copy of converted column)
+    :param data: ColumnBuffers or ArrowColumns
+    :param i: column index
+    :param column: column model
+    :return:
+    """
+    values = make_column(data, i, column)
+    if isinstance(data, ColumnBuffers) and isinstance(data.column(i), list) \
+            and (column.type != 'INTEGER' or None not in data.column(i)):
+        # Null of INTEGER array is 0, raw values are kept for nullable consumers (series window)
+        data.compact(i, values)
+    return values
+
+
+class LazyColumn(object):
+    """
+    Raw values of column in answer buffers (pages), converted to typed array on demand
+    """
+
+    def __init__(self, column: Column, parts: typing.List[typing.Tuple[typing.Any, int]]):
+        """
+        :param column: column model
+        :param parts: [(ColumnBuffers or ArrowColumns, column index)] in order of rows
+        """
+        self.column = column
+        self.parts = parts
+
+    def __len__(self):
+        return sum(len(data) for data, i in self.parts)
+
+    def extend(self, other: 'LazyColumn') -> 'LazyColumn':
+        return LazyColumn(self.column, self.parts + other.parts)
+
+    def convert(self) -> np.ndarray:
+        arrays = [compact_column(data, i, self.column) for data, i in self.parts]
+        if len(arrays) == 0:
+            return parse_column([], self.column)
+        return arrays[0] if len(arrays) == 1 else np.concatenate(arrays)
+
+
+class ColumnStore(object):
+    """
+    Typed column arrays of equal length in order of cursor columns
+    """
+
+    def __init__(self, arrays: typing.Dict[str, typing.Union[np.ndarray, LazyColumn]]):
+        """
+        :param arrays: column name -> array or raw column
+        """
+        self.names = list(arrays)
+        self._arrays = [values if isinstance(values, LazyColumn) else np.ascontiguousarray(values)
+                        for values in arrays.values()]
+        # Column name -> position
+        self.positions = {name: i for i, name in enumerate(self.names)}
+        self.row_count = len(self._arrays[0]) if len(self._arrays) > 0 else 0
+
+    @staticmethod
+    def from_data(data, columns: typing.List[Column], names: typing.Iterable[str] = None) -> 'ColumnStore':
+        """
+        Store of cursor data
+        :param data: array of arrays, ColumnBuffers or ArrowColumns
+        :param columns: column models in order of data
+        :param names: columns converted at once, others are converted on first access; None - all columns
+        :return:
+        """
+        if not isinstance(data, (ColumnBuffers, ArrowColumns)):
+            data = ColumnBuffers.from_rows(data)
+        names = set(names) if names is not None else None
+        return ColumnStore({column.name: compact_column(data, i, column) if names is None or column.name in names
+                            else LazyColumn(column, [(data, i)]) for i, column in enumerate(columns)})
+
+    def __len__(self):
+        return self.row_count
+
+    @property
+    def arrays(self) -> typing.List[np.ndarray]:
+        """
+        All column arrays (raw columns are converted)
+        :return:
+        """
+        return [self._array(i) for i in range(len(self.names))]
+
+    def _array(self, position: int) -> np.ndarray:
+        values = self._arrays[position]
+        if isinstance(values, LazyColumn):
+            values = np.ascontiguousarray(values.convert())
+            self._arrays[position] = values
+        return values
+
+    def position(self, name: str) -> typing.Optional[int]:
+        return self.positions.get(name, None)
+
+    def is_converted(self, name: str) -> bool:
+        return not isinstance(self._arrays[self.positions[name]], LazyColumn)
+
+    def column(self, name: str) -> typing.Optional[np.ndarray]:
+        """
+        Column array (raw column is converted)
+        :param name: column name
+        :return: array or None if there is no such column
+        """
+        position = self.positions.get(name, None)
+        return self._array(position) if position is not None else None
+
+    def row(self, row: int, names: typing.Iterable[str] = None) -> typing.Dict[str, typing.Any]:
+        """
+        Values of one row, dates are Timestamps
+        :param row: row position
+        :param names: columns to take (missing are skipped), None - all columns
+        :return: column name -> value
+        """
+        names = self.names if names is None else [name for name in names if name in self.positions]
+        values = {name: self.column(name)[row] for name in names}
+        return {name: pd.Timestamp(value) if isinstance(value, np.datetime64) else value
+                for name, value in values.items()}
+
+    def is_null(self, name: str) -> np.ndarray:
+        """
+        Null mask of column (None, NaN, NaT)
+        :param name: column name
+        :return: bool array
+        """
+        return pd.isnull(self.column(name))
+
+    def append(self, other: 'ColumnStore') -> None:
+        """
+        Append rows of next page, raw columns of both stores stay raw
+        :param other: store with the same columns
+        :return:
+        """
+        arrays = []
+        for name, values in zip(self.names, self._arrays):
+            other_values = other._arrays[other.positions[name]]
+            if isinstance(values, LazyColumn) and isinstance(other_values, LazyColumn):
+                arrays.append(values.extend(other_values))
+            else:
+                arrays.append(np.concatenate([self.column(name), other.column(name)]))
+        self._arrays = arrays
+        self.row_count += len(other)
+
+    def clear(self) -> None:
+        self._arrays = [LazyColumn(values.column, []) if isinstance(values, LazyColumn) else values[:0]
+                        for values in self._arrays]
+        self.row_count = 0
+
+    def to_dataframe(self, names: typing.List[str] = None, rows: np.ndarray = None) -> pd.DataFrame:
+        """
+        Dataframe of columns
+        :param names: column names, None - all columns
+        :param rows: row positions in order, None - all rows; they are the dataframe index
+        :return:
+        """
+        names = self.names if names is None else names
+        if rows is None:
+            return arrays_to_dataframe({name: self.column(name) for name in names})
+        return arrays_to_dataframe({name: self.column(name)[rows] for name in names}, pd.Index(rows))
+
+
+class ColumnValues(Mapping):
+    """
+    Column arrays by name: given values of columns (translations of nci columns)
+    or store columns converted on first access
+    """
+
+    def __init__(self, store: ColumnStore, values: typing.Dict[int, np.ndarray]):
+        """
+        :param store: column store
+        :param values: column position -> values replacing store column
+        """
+        self._store = store
+        self._values = values
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        values = self._values.get(self._store.positions[name], None)
+        return values if values is not None else self._store.column(name)
+
+    def __iter__(self):
+        return iter(self._store.names)
+
+    def __len__(self):
+        return len(self._store.names)
+
+
+def rank_values(values: np.ndarray) -> typing.Tuple[np.ndarray, int]:
+    """
+    Dense ranks of values in sort order
+    :param values: typed column array
+    :return: (ranks with -1 for null, count of distinct values)
+    """
+    ranks, uniques = pd.factorize(values, sort=True)
+    return ranks, len(uniques)
+
+
+class RowSorter(object):
+    """
+    Row permutations of stable multi-column sorts by typed values.
+    Ranks of columns and permutations of recent sorts are cached, so toggling sort is a lookup
+    """
+    MAX_PERMUTATIONS = 8
+
+    def __init__(self, values: typing.Mapping[int, np.ndarray]):
+        """
+        :param values: arrays to sort by, by source column
+        """
+        self._values = values
+        self._ranks = {}
+        self._permutations = {}
+
+    def rows(self, sort: typing.Sequence[typing.Tuple[int, bool]]) -> np.ndarray:
+        """
+        Source rows in sort order, nulls go last, equal rows keep source order
+        :param sort: [(column, ascending)], first column is the main one
+        :return: permutation of all rows
+        """
+        sort = tuple(sort)
+        rows = self._permutations.pop(sort, None)
+        if rows is None:
+            keys = [self._key(column, ascending) for column, ascending in reversed(sort)]
+            rows = np.argsort(keys[0], kind='stable') if len(keys) == 1 else np.lexsort(keys)
+            while len(self._permutations) >= self.MAX_PERMUTATIONS:
+                # Oldest sort goes out
+                self._permutations.pop(next(iter(self._permutations)))
+        self._permutations[sort] = rows
+        return rows
+
+    def _key(self, column: int, ascending: bool) -> np.ndarray:
+        if column not in self._ranks:
+            self._ranks[column] = rank_values(self._values[column])
+        ranks, count = self._ranks[column]
+        return np.where(ranks < 0, count, ranks if ascending else count - 1 - ranks)
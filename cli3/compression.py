@@ -0,0 +1,100 @@
+"""
+Потоковая распаковка ответов (Content-Encoding)
+"""
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+_ERRORS = (zlib.error,) if zstandard is None else (zlib.error, zstandard.ZstdError)
+
+
+def accept_encoding() -> str:
+    """
+    Value of Accept-Encoding header for supported encodings
+    :return: header value
+    """
+    encodings = ['gzip', 'deflate']
+    if zstandard is not None:
+        encodings.append('zstd')
+    return ', '.join(encodings)
+
+
+class StreamDecoder(object):
+    """
+    Decompress answer chunk by chunk and count sizes
+    """
+
+    def __init__(self, encoding: str = None):
+        """
+        :param encoding: Content-Encoding value (None or identity - not compressed)
+        """
+        self.encoding = (encoding or 'identity').strip().lower()
+        if self.encoding not in ('identity', 'gzip', 'x-gzip', 'deflate', 'zstd'):
+            raise ValueError(f'Unsupported content encoding {self.encoding}')
+        if self.encoding == 'zstd' and zstandard is None:
+            raise ValueError('zstd content encoding requires zstandard package')
+        self._decompressor = None
+        # Transferred (compressed) bytes
+        self.compressed_size = 0
+        # Decompressed bytes
+        self.size = 0
+
+    @property
+    def ratio(self) -> float:
+        """
+        Compression ratio (decompressed / transferred)
+        :return:
+        """
+        return self.size / self.compressed_size if self.compressed_size > 0 else 1.0
+
+    def decompress(self, chunk: bytes) -> bytes:
+        """
+        Decompress next chunk
+        :param chunk: received bytes
+        :return: decompressed bytes (may be empty)
+        """
+        self.compressed_size += len(chunk)
+        if self.encoding == 'identity' or len(chunk) == 0:
+            data = chunk
+        else:
+            try:
+                if self._decompressor is None:
+                    self._decompressor = self._make_decompressor(chunk)
+                data = self._decompressor.decompress(chunk)
+                # Concatenated gzip members
+                while self.encoding in ('gzip', 'x-gzip') and self._decompressor.eof \
+                        and len(self._decompressor.unused_data) > 0:
+                    rest = self._decompressor.unused_data
+                    self._decompressor = self._make_decompressor(rest)
+                    data += self._decompressor.decompress(rest)
+            except _ERRORS as e:
+                raise ValueError(f'Can not decompress {self.encoding} answer: {e}')
+        self.size += len(data)
+        return data
+
+    def flush(self) -> bytes:
+        """
+        Decompress rest of data at the end of answer
+        :return: decompressed bytes
+        """
+        data = b''
+        if self._decompressor is not None and hasattr(self._decompressor, 'flush'):
+            try:
+                data = self._decompressor.flush()
+            except _ERRORS as e:
+                raise ValueError(f'Can not decompress {self.encoding} answer: {e}')
+        self.size += len(data)
+        return data
+
+    def _make_decompressor(self, chunk: bytes):
+        if self.encoding in ('gzip', 'x-gzip'):
+            return zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif self.encoding == 'deflate':
+            # Some servers send raw deflate without zlib header
+            if len(chunk) >= 2 and chunk[0] & 0x0f == 8 and (chunk[0] << 8 | chunk[1]) % 31 == 0:
+                return zlib.decompressobj(zlib.MAX_WBITS)
+            return zlib.decompressobj(-zlib.MAX_WBITS)
+        return zstandard.ZstdDecompressor().decompressobj()
@@ -0,0 +1,212 @@
+"""
+Разбор json ответов.
+One entry point for answers and metadata with pluggable backend: orjson, msgspec or stdlib json
+(first available by default). Backends take bytes as is (QByteArray data, socket body),
+so answers are not decoded to str before parsing.
+msgspec decodes tree, query and column metadata by typed schemas: answers are validated while parsed,
+fields models do not read are dropped.
+Benchmark of backends on answers of mock server or saved answers:
+python -m cli3.decoding --rows 10000 [answer.json ...]
+"""
+import argparse
+import json
+import time
+import typing
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+BACKENDS = ('orjson', 'msgspec', 'json')
+
+Data = typing.Union[bytes, bytearray, memoryview, str]
+
+
+class InputFieldSchema(typing.TypedDict, total=False):
+    type: str
+    nci: typing.Any
+    nci_column: typing.Optional[str]
+    values: typing.Any
+
+
+class ParamSchema(typing.TypedDict, total=False):
+    name: str
+    title: typing.Optional[str]
+    type: str
+    value: typing.Any
+    input: typing.Optional[InputFieldSchema]
+
+
+class QuerySchema(typing.TypedDict, total=False):
+    id: int
+    name: str
+    url: str
+    type: str
+    cache_ttl: typing.Optional[float]
+    paging: typing.Optional[typing.Dict[str, typing.Any]]
+    params: typing.Dict[str, ParamSchema]
+    subqueries: typing.List['QuerySchema']
+
+
+class ColumnSchema(typing.TypedDict, total=False):
+    name: str
+    title: typing.Optional[str]
+    type: str
+    width: int
+    format: typing.Optional[str]
+    visable: bool
+    nci: typing.Any
+    nci_column: typing.Optional[str]
+    subqueries: typing.List[QuerySchema]
+
+
+class FolderSchema(typing.TypedDict, total=False):
+    name: str
+    folders: typing.List['FolderSchema']
+    queries: typing.List[QuerySchema]
+
+
+class TreeSchema(typing.TypedDict):
+    folders: typing.List[FolderSchema]
+
+
+# Typed metadata answers: schema name -> type
+SCHEMAS = {
+    'tree': TreeSchema,
+    'query': QuerySchema,
+    'columns': typing.List[ColumnSchema],
+}
+
+_backend = next(name for name in BACKENDS if name == 'json' or globals()[name] is not None)
+_decoders = {}
+
+
+def available_backends() -> typing.List[str]:
+    return [name for name in BACKENDS if name == 'json' or globals()[name] is not None]
+
+
+def backend() -> str:
+    return _backend
+
+
+def set_backend(name: str) -> None:
+    """
+    Choose json backend for all answers
+    :param name: one of BACKENDS
+    :return:
+    """
+    global _backend
+    if name not in available_backends():
+        raise ValueError(f'Json backend {name} is not available')
+    _backend = name
+
+
+def decode(data: Data, schema: str = None, using: str = None) -> typing.Any:
+    """
+    Parse json answer
+    :param data: answer bytes (or text)
+    :param schema: name of typed schema from SCHEMAS (only msgspec backend checks it)
+    :param using: backend name, None - current backend
+    :return: parsed answer
+    :raise ValueError: bad json or answer does not match schema
+    """
+    using = using or _backend
+    if using == 'orjson':
+        return orjson.loads(data)
+    if using == 'msgspec':
+        return _msgspec_decoder(schema).decode(data)
+    if isinstance(data, (bytearray, memoryview)):
+        data = bytes(data)
+    return json.loads(data)
+
+
+def to_text(data: Data) -> str:
+    """
+    Answer as text (for cache and messages)
+    :param data: answer bytes or text
+    :return:
+    """
+    return data if isinstance(data, str) else bytes(data).decode()
+
+
+def _msgspec_decoder(schema: typing.Optional[str]) -> 'msgspec.json.Decoder':
+    decoder = _decoders.get(schema, None)
+    if decoder is None:
+        decoder = msgspec.json.Decoder(SCHEMAS[schema]) if schema is not None else msgspec.json.Decoder()
+        _decoders[schema] = decoder
+    return decoder
+
+
+def benchmark(answers: typing.Dict[str, typing.Tuple[bytes, typing.Optional[str]]], repeat: int = 5) \
+        -> typing.Dict[str, typing.Dict[str, float]]:
+    """
+    Best decoding time of answers by every available backend
+    :param answers: answer name -> (body, schema name)
+    :param repeat: decodings of every answer, best time is taken
+    :return: answer name -> backend -> seconds
+    """
+    results = {}
+    for name, (body, schema) in answers.items():
+        results[name] = {}
+        for using in available_backends():
+            best = float('inf')
+            for _ in range(repeat):
+                started = time.perf_counter()
+                decode(body, schema, using)
+                best = min(best, time.perf_counter() - started)
+            results[name][using] = best
+    return results
+
+
+def mock_answers(rows: int, columns: int) -> typing.Dict[str, typing.Tuple[bytes, typing.Optional[str]]]:
+    """
+    Answers of mock server: tree, query definition, nci table and synthetic cursor
+    :param rows: rows of cursor
+    :param columns: columns of cursor
+    :return: answer name -> (body, schema name)
+    """
+    from cli3.endpoints import Endpoints
+    from cli3.mock_server import MockServer, demo_queries, synthetic_query
+    from cli3.synthetic import Generator
+    generator = Generator()
+    server = MockServer(demo_queries(10) + [synthetic_query(10, generator, rows, columns, nci_columns=2,
+                                                            style_columns=2)], generator=generator,
+                        nci_tables=['NCI_1'], arrow=False)
+    return {
+        'tree': (server.handle(Endpoints.TREE_API, {})[2], 'tree'),
+        'query': (server.handle(Endpoints.QUERY_API, {'id': '10'})[2], 'query'),
+        'nci': (server.handle(Endpoints.NCI_API + '/NCI_1', {})[2], None),
+        f'cursor {rows}x{columns}': (server.handle(Endpoints.REQUEST_URL, {'id': '10'})[2], None),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark of json backends')
+    parser.add_argument('answers', nargs='*', help='files of saved answers, default - mock server answers')
+    parser.add_argument('--rows', type=int, default=10000, help='rows of mock cursor')
+    parser.add_argument('--columns', type=int, default=10, help='columns of mock cursor')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    if args.answers:
+        answers = {}
+        for path in args.answers:
+            with open(path, 'rb') as inp:
+                answers[path] = (inp.read(), None)
+    else:
+        answers = mock_answers(args.rows, args.columns)
+    results = benchmark(answers, args.repeat)
+    backends = available_backends()
+    print(f'{"answer":<30}{"size":>12}' + ''.join(f'{name:>12}' for name in backends))
+    for name, times in results.items():
+        size = len(answers[name][0])
+        print(f'{name:<30}{size:>12}' + ''.join(f'{times[using] * 1000:>10.2f}ms' for using in backends))
+
+
+if __name__ == '__main__':
+    main()
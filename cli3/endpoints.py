@@ -0,0 +1,17 @@
+"""
+Адреса api сервера профилей (общие для Qt и asyncio сессий)
+"""
+
+
+class Endpoints:
+    QUERY_API = '/api/docs/query'
+    TREE_API = '/api/docs/tree'
+    STYLE_API = '/api/docs/styles'
+    NCI_API = '/api/nci'
+    REQUEST_URL = '/api/docs/request'
+    BATCH_URL = '/api/docs/batch'
+    LOGIN_URL = '/api/auth/signin'
+    LOGOUT_URL = '/api/auth/signout'
+
+    # Metadata apis stored in cache
+    CACHED_APIS = (QUERY_API, TREE_API, STYLE_API)
@@ -0,0 +1,372 @@
+"""
+Фильтры таблицы.
+Predicates on columns (equality, IN set, range, contains/regex, null) give boolean row masks.
+Masks of predicates are cached, so adding or removing one predicate only ANDs cached masks again.
+Columns with few distinct values get lazy index: value -> row bitmap, other predicates are
+evaluated on distinct values only and spread to rows by value codes
+"""
+import abc
+import re
+import typing
+import warnings
+
+import numpy as np
+import pandas as pd
+
+
+class ValueIndex(object):
+    """
+    Codes of column values with row bitmaps made on demand
+    """
+    MAX_BITMAPS = 256
+
+    def __init__(self, codes: np.ndarray, uniques: pd.Index):
+        """
+        :param codes: value number of every row, -1 for null
+        :param uniques: distinct values
+        """
+        self.codes = codes
+        self.uniques = uniques
+        self._bitmaps = {}
+
+    @staticmethod
+    def build(values: np.ndarray, max_values: int) -> typing.Optional['ValueIndex']:
+        """
+        Index of low cardinality column
+        :param values: column array
+        :param max_values: max distinct values
+        :return: index or None if column has more distinct values
+        """
+        codes, uniques = pd.factorize(values)
+        if len(uniques) > max_values:
+            return None
+        return ValueIndex(codes, pd.Index(uniques))
+
+    def rows(self, value) -> np.ndarray:
+        """
+        Row bitmap of value
+        :param value: column value
+        :return: bool array
+        """
+        bitmap = self._bitmaps.get(value, None)
+        if bitmap is None:
+            try:
+                code = self.uniques.get_loc(value)
+            except (KeyError, TypeError):
+                code = None
+            bitmap = self.codes == code if isinstance(code, (int, np.integer)) else np.zeros(len(self.codes), bool)
+            if len(self._bitmaps) >= self.MAX_BITMAPS:
+                self._bitmaps.pop(next(iter(self._bitmaps)))
+            self._bitmaps[value] = bitmap
+        return bitmap
+
+    def spread(self, matches: np.ndarray) -> np.ndarray:
+        """
+        Row mask of predicate evaluated on distinct values
+        :param matches: bool array by distinct values
+        :return: bool array by rows (null rows do not match)
+        """
+        return np.append(matches, False)[self.codes]
+
+
+class Predicate(abc.ABC):
+    """
+    Condition on column values
+    """
+
+    def __init__(self, column: str):
+        self.column = column
+
+    def key(self) -> tuple:
+        """
+        Key of cached mask
+        :return:
+        """
+        return (type(self).__name__, self.column) + self._args()
+
+    def _args(self) -> tuple:
+        return ()
+
+    def evaluate(self, values, index: ValueIndex = None) -> np.ndarray:
+        """
+        Mask of rows matching predicate
+        :param values: column array
+        :param index: index of column, None - column has no index
+        :return: bool array
+        """
+        if index is not None:
+            return index.spread(self._match(pd.Series(index.uniques)))
+        return self._match(pd.Series(values, dtype=values.dtype))
+
+    @abc.abstractmethod
+    def _match(self, values: pd.Series) -> np.ndarray:
+        """
+        Mask of values matching predicate (column values or distinct values of index)
+        :param values: values
+        :return: bool array
+        """
+
+    def server_value(self):
+        """
+        Value of filter sent to server with paged cursor ({column: value}, None - is null)
+        :return:
+        """
+        raise ValueError(f'Filter {self} can not be sent to server')
+
+    def __str__(self):
+        return f'{type(self).__name__}{(self.column,) + self._args()}'
+
+
+def _is_null(value) -> bool:
+    return value is None or not isinstance(value, (str, bytes)) and np.ndim(value) == 0 and pd.isnull(value)
+
+
+class Equals(Predicate):
+    """
+    Column equals value (null value - column is null)
+    """
+
+    def __init__(self, column: str, value):
+        super().__init__(column)
+        self.value = None if _is_null(value) else value
+
+    def _args(self) -> tuple:
+        return (self.value,)
+
+    def evaluate(self, values, index: ValueIndex = None) -> np.ndarray:
+        if self.value is None:
+            return IsNull(self.column).evaluate(values, index)
+        if index is not None:
+            return index.rows(self.value)
+        return self._match(pd.Series(values, dtype=values.dtype))
+
+    def _match(self, values: pd.Series) -> np.ndarray:
+        return (values == self.value).to_numpy(dtype=bool)
+
+    def server_value(self):
+        return self.value
+
+
+class In(Predicate):
+    """
+    Column value is one of values
+    """
+
+    def __init__(self, column: str, values: typing.Iterable):
+        super().__init__(column)
+        self.values = tuple(values)
+
+    def _args(self) -> tuple:
+        return (frozenset(self.values),)
+
+    def evaluate(self, values, index: ValueIndex = None) -> np.ndarray:
+        if index is not None:
+            mask = np.zeros(len(index.codes), dtype=bool)
+            for value in self.values:
+                mask |= index.rows(value) if not _is_null(value) else index.codes < 0
+            return mask
+        return super().evaluate(values, index)
+
+    def _match(self, values: pd.Series) -> np.ndarray:
+        return values.isin(self.values).to_numpy(dtype=bool)
+
+
+class Range(Predicate):
+    """
+    Column value is between bounds (null never is)
+    """
+
+    def __init__(self, column: str, low=None, high=None, include_low: bool = True, include_high: bool = True):
+        """
+        :param column: column name
+        :param low: lower bound, None - no bound
+        :param high: upper bound, None - no bound
+        :param include_low: value may be equal to low
+        :param include_high: value may be equal to high
+        """
+        super().__init__(column)
+        self.low = low
+        self.high = high
+        self.include_low = include_low
+        self.include_high = include_high
+
+    def _args(self) -> tuple:
+        return self.low, self.high, self.include_low, self.include_high
+
+    def _match(self, values: pd.Series) -> np.ndarray:
+        mask = values.notnull()
+        if self.low is not None:
+            mask &= values >= self.low if self.include_low else values > self.low
+        if self.high is not None:
+            mask &= values <= self.high if self.include_high else values < self.high
+        return mask.to_numpy(dtype=bool)
+
+
+class Contains(Predicate):
+    """
+    Text of column value contains substring or matches regular expression
+    """
+
+    def __init__(self, column: str, pattern: str, regex: bool = False, case: bool = False):
+        """
+        :param column: column name
+        :param pattern: substring or regular expression
+        :param regex: pattern is regular expression
+        :param case: case sensitive
+        """
+        super().__init__(column)
+        if regex:
+            # Bad expression is reported at once
+            re.compile(pattern)
+        self.pattern = pattern
+        self.regex = regex
+        self.case = case
+
+    def _args(self) -> tuple:
+        return self.pattern, self.regex, self.case
+
+    def _match(self, values: pd.Series) -> np.ndarray:
+        if values.dtype != object:
+            # Text of numbers and dates
+            values = values.astype(str).where(values.notnull(), None).astype(object)
+        with warnings.catch_warnings():
+            # Groups of expression are not used
+            warnings.simplefilter('ignore', UserWarning)
+            matches = values.str.contains(self.pattern, case=self.case, regex=self.regex, na=False)
+        return matches.to_numpy(dtype=bool)
+
+
+class IsNull(Predicate):
+    """
+    Column is null (or is not null)
+    """
+
+    def __init__(self, column: str, null: bool = True):
+        super().__init__(column)
+        self.null = null
+
+    def _args(self) -> tuple:
+        return (self.null,)
+
+    def evaluate(self, values, index: ValueIndex = None) -> np.ndarray:
+        if index is not None:
+            return index.codes < 0 if self.null else index.codes >= 0
+        return super().evaluate(values, index)
+
+    def _match(self, values: pd.Series) -> np.ndarray:
+        return (values.isnull() if self.null else values.notnull()).to_numpy(dtype=bool)
+
+    def server_value(self):
+        if not self.null:
+            return super().server_value()
+        return None
+
+
+class FilterEngine(object):
+    """
+    Predicates on columns (one per column) and their combined row mask
+    """
+    # Columns with not more distinct values are indexed
+    LOW_CARDINALITY = 1000
+    MAX_MASKS = 32
+
+    def __init__(self, columns: typing.Mapping[str, np.ndarray], predicates: typing.Iterable[Predicate] = ()):
+        """
+        :param columns: column name -> values to filter
+        :param predicates: predicates set at once
+        """
+        self.columns = columns
+        self.predicates = {}
+        self._indexes = {}
+        self._masks = {}
+        self._combined = None
+        for predicate in predicates:
+            self.set(predicate)
+
+    def has(self, column: str) -> bool:
+        return column in self.predicates
+
+    def set(self, predicate: Predicate) -> None:
+        """
+        Set predicate of column, previous predicate of column is replaced
+        :param predicate: predicate
+        :return:
+        """
+        if predicate.column not in self.columns:
+            raise ValueError(f'Unknown filter column {predicate.column}')
+        replaced = predicate.column in self.predicates
+        self.predicates[predicate.column] = predicate
+        if replaced:
+            self._combined = None
+        elif self._combined is not None:
+            self._combined = self._combined & self.predicate_mask(predicate)
+
+    def remove(self, column: str) -> typing.Optional[Predicate]:
+        """
+        Remove predicate of column
+        :param column: column name
+        :return: removed predicate or None
+        """
+        predicate = self.predicates.pop(column, None)
+        if predicate is not None:
+            self._combined = None
+        return predicate
+
+    def clear(self) -> None:
+        self.predicates = {}
+        self._combined = None
+
+    def mask(self) -> typing.Optional[np.ndarray]:
+        """
+        Rows matching all predicates
+        :return: bool array, None if there are no predicates
+        """
+        if len(self.predicates) == 0:
+            return None
+        if self._combined is None:
+            masks = [self.predicate_mask(predicate) for predicate in self.predicates.values()]
+            self._combined = np.logical_and.reduce(masks) if len(masks) > 1 else masks[0].copy()
+        return self._combined
+
+    def predicate_mask(self, predicate: Predicate) -> np.ndarray:
+        """
+        Cached mask of predicate
+        :param predicate: predicate
+        :return: bool array
+        """
+        key = predicate.key()
+        try:
+            mask = self._masks.pop(key, None)
+        except TypeError:
+            # Not hashable value
+            return predicate.evaluate(self.columns[predicate.column], self.index(predicate.column))
+        if mask is None:
+            mask = predicate.evaluate(self.columns[predicate.column], self.index(predicate.column))
+            while len(self._masks) >= self.MAX_MASKS:
+                self._masks.pop(next(iter(self._masks)))
+        self._masks[key] = mask
+        return mask
+
+    def index(self, column: str) -> typing.Optional[ValueIndex]:
+        """
+        Index of column, made on first use
+        :param column: column name
+        :return: index or None for column with many distinct values
+        """
+        if column not in self._indexes:
+            self._indexes[column] = ValueIndex.build(self.columns[column], self.LOW_CARDINALITY)
+        return self._indexes[column]
+
+
+def runs(flags: np.ndarray, max_runs: int = None) -> typing.Optional[typing.List[typing.Tuple[int, int]]]:
+    """
+    Runs of set flags
+    :param flags: bool array
+    :param max_runs: max count of runs, None - no limit
+    :return: [(first, last)] positions of runs, None if there are more than max_runs
+    """
+    edges = np.diff(np.concatenate(([0], flags.astype(np.int8), [0])))
+    firsts = np.flatnonzero(edges == 1)
+    if max_runs is not None and len(firsts) > max_runs:
+        return None
+    return list(zip(firsts.tolist(), (np.flatnonzero(edges == -1) - 1).tolist()))
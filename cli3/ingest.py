@@ -0,0 +1,217 @@
+"""
+Загрузка курсора в датафрейм.
+Every column is parsed straight into its final dtype by Column.type and Column.format
+(no dtype=str frame converted column by column):
+NUMBER - float64 (null - NaN), INTEGER - int64 (null - 0) or nullable Int64, DATE/DATETIME/TIME - datetime64
+parsed with explicit formats (time zone is dropped), BOOL - bool (text of value is TRUE in any case),
+other types - python str (null - None)
+"""
+import re
+import typing
+
+import numpy as np
+import pandas as pd
+
+from cli3.arrow_ipc import ArrowColumns, to_numpy
+from cli3.models import Column
+from cli3.stream import ColumnBuffers
+
+DATE_TYPES = ('DATE', 'DATETIME', 'TIME')
+
+# Formats tried after Column.format
+DATE_FORMATS = {
+    'DATE': ('%Y-%m-%d', '%d.%m.%Y', 'ISO8601'),
+    'DATETIME': ('%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S', '%d.%m.%Y %H:%M:%S', 'ISO8601'),
+    'TIME': ('%H:%M:%S', '%H:%M'),
+}
+
+# Day of TIME values
+TIME_DAY = '1900-01-01'
+
+# Java/Qt date format tokens -> strptime directives
+_FORMAT_TOKENS = re.compile(r'yyyy|yy|MM|dd|HH|hh|mm|ss|SSS|zzz')
+_STRPTIME = {'yyyy': '%Y', 'yy': '%y', 'MM': '%m', 'dd': '%d', 'HH': '%H', 'hh': '%H', 'mm': '%M', 'ss': '%S',
+             'SSS': '%f', 'zzz': '%f'}
+# Time zone after time of value: Z, +03, +0300, +03:00
+_TIME_ZONE = re.compile(r'(\d{2}:\d{2}(?::\d{2}(?:[.,]\d*)?)?)\s*(?:Z|[+-]\d{2}(?::?\d{2})?)$')
+
+
+def strptime_format(format: typing.Optional[str]) -> typing.Optional[str]:
+    """
+    Column.format as strptime format
+    :param format: strptime format (with %) or like yyyy-MM-dd HH:mm:ss
+    :return: strptime format or None if column has no date format
+    """
+    if not format:
+        return None
+    if '%' in format:
+        return format
+    converted = _FORMAT_TOKENS.sub(lambda match: _STRPTIME[match.group(0)], format)
+    return converted if converted != format else None
+
+
+def parse_dates(values: list, type: str, format: str = None) -> np.ndarray:
+    """
+    Parse date column, formats are tried in turn for whole column
+    :param values: str values or None
+    :param type: DATE, DATETIME or TIME
+    :param format: Column.format
+    :return: datetime64[ns] array (local time of values with time zone), not parsed values are NaT
+    """
+    formats = [date_format for date_format in [strptime_format(format)] + list(DATE_FORMATS.get(type, ()))
+               if date_format is not None]
+    values = pd.Series(values, dtype=object)
+    if type == 'TIME':
+        # Time only formats are parsed by slow path, with day they are parsed like ISO dates
+        nulls = values.isnull() | values.eq('')
+        values = (TIME_DAY + ' ' + values.astype(str)).where(~nulls, None)
+        formats = [f'%Y-%m-%d {date_format}' for date_format in formats]
+    for date_format in formats:
+        try:
+            return _local_time(pd.to_datetime(values, format=date_format))
+        except (ValueError, TypeError):
+            continue
+    # Unknown or mixed formats are inferred value by value, time zones may differ
+    local = values.str.replace(_TIME_ZONE, r'\1', regex=True)
+    values = local.where(local.notnull(), values)
+    return _local_time(pd.to_datetime(values, format='mixed', errors='coerce'))
+
+
+def _local_time(dates: pd.Series) -> np.ndarray:
+    """
+    Dates without time zone
+    :param dates: parsed dates
+    :return: datetime64[ns] array, dates with time zone keep their local time
+    """
+    if dates.dt.tz is not None:
+        dates = dates.dt.tz_localize(None)
+    return dates.to_numpy('datetime64[ns]')
+
+
+def parse_numbers(values: list) -> np.ndarray:
+    """
+    Parse NUMBER column
+    :param values: numbers, numeric strings or None
+    :return: float64 array
+    """
+    try:
+        return np.array(values, dtype=np.float64)
+    except (ValueError, TypeError):
+        return pd.to_numeric(pd.Series(values, dtype=object), errors='coerce').to_numpy(np.float64)
+
+
+def parse_integers(values: list, nullable: bool = False) -> typing.Union[np.ndarray, pd.arrays.IntegerArray]:
+    """
+    Parse INTEGER column
+    :param values: integers, numeric strings or None
+    :param nullable: null is kept (Int64 array), else null is 0
+    :return: int64 array or Int64 array
+    """
+    try:
+        integers = np.array(values, dtype=np.int64)
+        return pd.arrays.IntegerArray(integers, np.zeros(len(integers), dtype=bool)) if nullable else integers
+    except (ValueError, TypeError, OverflowError):
+        numbers = parse_numbers(values)
+    nulls = ~np.isfinite(numbers)
+    integers = np.where(nulls, 0.0, numbers).astype(np.int64)
+    return pd.arrays.IntegerArray(integers, nulls) if nullable else integers
+
+
+def parse_bools(values: list) -> np.ndarray:
+    """
+    Parse BOOL column, value is true if its text is TRUE in any case
+    :param values: bools, strings or None
+    :return: bool array
+    """
+    return pd.Series(values, dtype=object).astype(str).str.upper().eq('TRUE').to_numpy(bool)
+
+
+def parse_strings(values: list) -> np.ndarray:
+    """
+    Parse column of other types
+    :param values: any values
+    :return: object array of str or None
+    """
+    array = np.empty(len(values), dtype=object)
+    if all(value is None or type(value) is str for value in values):
+        array[:] = values
+    else:
+        array[:] = [value if value is None or type(value) is str else str(value) for value in values]
+    return array
+
+
+def parse_column(values: list, column: Column, nullable: bool = False) -> np.ndarray:
+    """
+    Parse column values into numpy array of column type
+    :param values: column values from answer
+    :param column: column model
+    :param nullable: INTEGER column keeps nulls (Int64 array)
+    :return:
+    """
+    if column.type == 'NUMBER':
+        return parse_numbers(values)
+    if column.type == 'INTEGER':
+        return parse_integers(values, nullable)
+    if column.type in DATE_TYPES:
+        return parse_dates(values, column.type, column.format)
+    if column.type == 'BOOL':
+        return parse_bools(values)
+    return parse_strings(values)
+
+
+def make_columns(data, columns: typing.List[Column], nullable: bool = False) -> typing.Dict[str, np.ndarray]:
+    """
+    Typed arrays of cursor data, typed arrow columns are taken as is
+    :param data: array of arrays, ColumnBuffers or ArrowColumns
+    :param columns: column models in order of data
+    :param nullable: INTEGER columns keep nulls (Int64 arrays)
+    :return: column name -> array
+    """
+    if not isinstance(data, (ColumnBuffers, ArrowColumns)):
+        data = ColumnBuffers.from_rows(data)
+    return {column.name: make_column(data, i, column, nullable) for i, column in enumerate(columns)}
+
+
+def make_column(data: typing.Union[ColumnBuffers, ArrowColumns], i: int, column: Column,
+                nullable: bool = False) -> np.ndarray:
+    """
+    Typed array of one cursor column
+    :param data: ColumnBuffers or ArrowColumns
+    :param i: column index
+    :param column: column model
+    :param nullable: INTEGER column keeps nulls (Int64 array)
+    :return:
+    """
+    # Arrow INTEGER column has nulls as 0
+    typed = not (nullable and column.type == 'INTEGER')
+    values = to_numpy(data, i, column.type) if typed and isinstance(data, ArrowColumns) else None
+    if values is not None:
+        return values
+    values = data.column(i)
+    # Compacted ColumnBuffers column is typed already
+    return values if typed and isinstance(values, np.ndarray) else parse_column(values, column, nullable)
+
+
+def make_dataframe(data, columns: typing.List[Column], nullable: bool = False) -> pd.DataFrame:
+    """
+    Dataframe of cursor data with typed columns
+    :param data: array of arrays, ColumnBuffers or ArrowColumns
+    :param columns: column models in order of data
+    :param nullable: INTEGER columns keep nulls (Int64 columns)
+    :return:
+    """
+    return arrays_to_dataframe(make_columns(data, columns, nullable))
+
+
+def arrays_to_dataframe(arrays: typing.Dict[str, np.ndarray], index: pd.Index = None) -> pd.DataFrame:
+    """
+    Dataframe of typed arrays
+    :param arrays: column name -> array
+    :param index: row labels, None - range
+    :return:
+    """
+    if index is None:
+        index = pd.RangeIndex(max((len(values) for values in arrays.values()), default=0))
+    # Explicit dtype keeps str columns as python objects (not inferred string dtype)
+    series = {name: pd.Series(values, index=index, dtype=values.dtype) for name, values in arrays.items()}
+    return pd.DataFrame(series, index=index, columns=list(arrays))
@@ -152,7 +152,7 @@ class NciSelectField(QtWidgets.QComboBox, ParamMixin):
         """
         super(NciSelectField, self).__init__(parent=parent, param=param)
         self.table_view = NciTableView(self)
-        self.table_model = NciTableModel(Cli3App.instance().nci[param.field.nci['name']], 20)
+        self.table_model = NciTableModel(Cli3App.instance().get_nci(param.field.nci['name']), 20)
         self.setView(self.table_view)
         self.setModel(self.table_model)
         self.setModelColumn(1)
@@ -0,0 +1,269 @@
+"""
+Нагрузочный тест клиента.
+Fires N queries of given mix keeping C of them in flight and reports requests/s, latency percentiles,
+bytes/s and peak RSS. Drivers: asyncio (AsyncSession) and Qt (Session.send_query, see loadtest_qt).
+Run against stand-in server started in subprocess:
+python -m cli3.loadtest --spawn-mock --rows 10000 --mix 1:3,10:1 --requests 500 --concurrency 8
+"""
+import argparse
+import asyncio
+import json
+import random
+import subprocess
+import sys
+import time
+import typing
+import urllib.parse
+
+try:
+    import resource
+except ImportError:
+    # Windows
+    resource = None
+
+from cli3.aio import AsyncSession, HttpError
+
+
+class Mix(object):
+    """
+    Weighted queries of load: [(query id, params, weight)]
+    """
+
+    def __init__(self, entries: typing.List[typing.Tuple[int, dict, float]]):
+        if len(entries) == 0:
+            raise ValueError('Empty mix')
+        self.entries = entries
+        self._weights = [weight for query_id, params, weight in entries]
+
+    @staticmethod
+    def parse(value: str) -> 'Mix':
+        """
+        Mix from string like 1:3,10?P=2&Q=x:1 (query id, optional params, optional weight)
+        :param value: mix string
+        :return:
+        """
+        entries = []
+        for item in value.split(','):
+            item = item.strip()
+            if item == '':
+                continue
+            query, _, weight = item.rpartition(':')
+            if query == '':
+                query, weight = weight, '1'
+            query_id, _, params = query.partition('?')
+            entries.append((int(query_id), dict(urllib.parse.parse_qsl(params, keep_blank_values=True)),
+                            float(weight)))
+        return Mix(entries)
+
+    def query_ids(self) -> typing.List[int]:
+        return sorted({query_id for query_id, params, weight in self.entries})
+
+    def choose(self, rnd: random.Random) -> typing.Tuple[int, dict]:
+        query_id, params, weight = rnd.choices(self.entries, self._weights)[0]
+        return query_id, params
+
+
+def percentile(values: typing.Sequence[float], p: float) -> float:
+    """
+    Percentile with linear interpolation
+    :param values: samples
+    :param p: percent 0..100
+    :return: value, 0 for no samples
+    """
+    if len(values) == 0:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * p / 100
+    low = int(position)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+
+def peak_rss() -> typing.Optional[int]:
+    """
+    Peak resident set size of process
+    :return: bytes, None if unknown
+    """
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on linux, bytes on mac
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+class LoadReport(object):
+    """
+    Results of load test
+    """
+
+    def __init__(self, concurrency: int):
+        self.concurrency = concurrency
+        self.latencies = []
+        self.errors = 0
+        # Decompressed and transferred bytes
+        self.received = 0
+        self.transferred = 0
+        self.started = None
+        self.finished = None
+        self.peak_rss = None
+
+    def start(self) -> None:
+        self.started = time.monotonic()
+
+    def add(self, latency: float, error: bool = False) -> None:
+        """
+        Add finished request
+        :param latency: seconds from send to answer
+        :param error: request failed
+        :return:
+        """
+        self.latencies.append(latency)
+        if error:
+            self.errors += 1
+
+    def finish(self) -> None:
+        self.finished = time.monotonic()
+        self.peak_rss = peak_rss()
+
+    @property
+    def elapsed(self) -> float:
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.monotonic()) - self.started
+
+    def summary(self) -> dict:
+        """
+        Report values
+        :return: name -> value
+        """
+        elapsed = self.elapsed or float('inf')
+        return {
+            'requests': len(self.latencies),
+            'errors': self.errors,
+            'concurrency': self.concurrency,
+            'elapsed': self.elapsed,
+            'requests_per_second': len(self.latencies) / elapsed,
+            'p50': percentile(self.latencies, 50),
+            'p95': percentile(self.latencies, 95),
+            'p99': percentile(self.latencies, 99),
+            'max': max(self.latencies, default=0.0),
+            'bytes_per_second': self.received / elapsed,
+            'transferred_per_second': self.transferred / elapsed,
+            'peak_rss': self.peak_rss,
+        }
+
+    def __str__(self):
+        summary = self.summary()
+        rss = f'{summary["peak_rss"] / 2 ** 20:.1f} MB' if summary['peak_rss'] is not None else 'unknown'
+        return (f'{summary["requests"]} requests ({summary["errors"]} errors) by {self.concurrency} '
+                f'in {summary["elapsed"]:.2f} s: {summary["requests_per_second"]:.1f} req/s\n'
+                f'latency p50 {summary["p50"] * 1000:.1f} ms, p95 {summary["p95"] * 1000:.1f} ms, '
+                f'p99 {summary["p99"] * 1000:.1f} ms, max {summary["max"] * 1000:.1f} ms\n'
+                f'{summary["bytes_per_second"] / 2 ** 20:.2f} MB/s decoded, '
+                f'{summary["transferred_per_second"] / 2 ** 20:.2f} MB/s transferred, peak RSS {rss}')
+
+
+async def run_async(session: AsyncSession, mix: Mix, requests: int, concurrency: int,
+                    rnd: random.Random = None) -> LoadReport:
+    """
+    Load test with AsyncSession, query definitions are loaded before test
+    :param session: session (logged in if server requires)
+    :param mix: queries to send
+    :param requests: requests count
+    :param concurrency: requests in flight
+    :param rnd: random generator to choose queries
+    :return:
+    """
+    rnd = rnd or random.Random()
+    queries = {query_id: await session.query(query_id) for query_id in mix.query_ids()}
+    report = LoadReport(concurrency)
+    received, transferred = session.received_bytes, session.transferred_bytes
+    left = requests
+
+    async def worker():
+        nonlocal left
+        while left > 0:
+            left -= 1
+            query_id, params = mix.choose(rnd)
+            started = time.monotonic()
+            try:
+                await session.send_query(queries[query_id], params)
+                error = False
+            except (HttpError, OSError, asyncio.TimeoutError, ValueError):
+                error = True
+            report.add(time.monotonic() - started, error)
+
+    report.start()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    report.finish()
+    report.received = session.received_bytes - received
+    report.transferred = session.transferred_bytes - transferred
+    return report
+
+
+def spawn_mock(args: typing.List[str]) -> typing.Tuple[subprocess.Popen, str]:
+    """
+    Start mock server in subprocess, so its memory and cpu are not counted
+    :param args: mock_server arguments
+    :return: (process, server url)
+    """
+    process = subprocess.Popen([sys.executable, '-m', 'cli3.mock_server', '--port', '0'] + args,
+                               stdout=subprocess.PIPE, text=True)
+    line = process.stdout.readline()
+    if not line.startswith('Mock server at '):
+        process.kill()
+        raise RuntimeError('Mock server is not started')
+    url = urllib.parse.urlsplit(line[len('Mock server at '):].strip())
+    return process, f'{url.scheme}://{url.netloc}'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Cli3 client load test')
+    parser.add_argument('--server', default='http://127.0.0.1:8000')
+    parser.add_argument('--schema', default='mock')
+    parser.add_argument('--username', default=None)
+    parser.add_argument('--password', default='')
+    parser.add_argument('--driver', choices=['async', 'qt'], default='async')
+    parser.add_argument('--mix', default='1', help='like 1:3,10?P=2:1 (query id, params, weight)')
+    parser.add_argument('--requests', type=int, default=100)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--json', action='store_true', help='print report as json')
+    parser.add_argument('--spawn-mock', action='store_true', help='start mock server in subprocess')
+    parser.add_argument('--rows', type=int, default=10000, help='rows of spawned mock server')
+    parser.add_argument('--columns', type=int, default=10, help='columns of spawned mock server')
+    parser.add_argument('--profile', default='local', help='network profile of spawned mock server')
+    parser.add_argument('--compress', action='store_true', help='spawned mock server gzips answers')
+    args = parser.parse_args()
+    mix = Mix.parse(args.mix)
+    rnd = random.Random(args.seed)
+    process = None
+    server, schema = args.server, args.schema
+    if args.spawn_mock:
+        process, server = spawn_mock(['--rows', str(args.rows), '--columns', str(args.columns),
+                                      '--profile', args.profile, '--schema', schema] +
+                                     (['--compress'] if args.compress else []))
+    try:
+        if args.driver == 'qt':
+            from cli3.loadtest_qt import run_qt
+            report = run_qt(server, schema, mix, args.requests, args.concurrency, args.username, args.password, rnd)
+        else:
+            report = asyncio.run(_run_async(server, schema, mix, args.requests, args.concurrency,
+                                            args.username, args.password, rnd))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+    print(json.dumps(report.summary()) if args.json else report)
+
+
+async def _run_async(server: str, schema: str, mix: Mix, requests: int, concurrency: int,
+                     username: typing.Optional[str], password: str, rnd: random.Random) -> LoadReport:
+    async with AsyncSession(server, schema, max_connections=concurrency) as session:
+        if username is not None:
+            await session.login(username, password)
+        return await run_async(session, mix, requests, concurrency, rnd)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""
+Нагрузочный тест Qt сессии.
+Queries are sent with Session.send_query like windows do (scheduler, coalescing of identical
+queries in flight, retries), result cache is bypassed
+"""
+import random
+import typing
+
+from PyQt5 import QtNetwork
+from PyQt5.QtCore import QObject, pyqtSignal, QCoreApplication, QTimer
+
+from cli3.loadtest import LoadReport, Mix
+from cli3.models import Query
+from cli3.network import Session, Request, NetworkException
+
+
+class QtLoadTest(QObject):
+    """
+    Keeps concurrency requests in flight until requests are sent
+    """
+    finishedSignal = pyqtSignal()
+
+    def __init__(self, session: Session, queries: typing.Dict[int, Query], mix: Mix, requests: int,
+                 concurrency: int, rnd: random.Random = None):
+        """
+        :param session: session (logged in if server requires)
+        :param queries: query id -> definition
+        :param mix: queries to send
+        :param requests: requests count
+        :param concurrency: requests in flight
+        :param rnd: random generator to choose queries
+        """
+        super().__init__()
+        self.session = session
+        self.queries = queries
+        self.mix = mix
+        self.requests = requests
+        self.report = LoadReport(concurrency)
+        self._random = rnd or random.Random()
+        self._sent = 0
+
+    def start(self) -> None:
+        self.report.start()
+        if self.requests == 0:
+            self._finish()
+            return
+        for _ in range(min(self.report.concurrency, self.requests)):
+            self._send()
+
+    def _send(self) -> None:
+        query_id, params = self.mix.choose(self._random)
+        self._sent += 1
+        request = self.session.send_query(self.queries[query_id], params, source=self, use_cache=False)
+        request.getDoneSignal.connect(self._request_done)
+
+    def _request_done(self, request: Request) -> None:
+        request.getDoneSignal.disconnect(self._request_done)
+        self.report.add(request.total_time(), request.error != QtNetwork.QNetworkReply.NoError)
+        self.report.received += request.size
+        self.report.transferred += request.transferred
+        if self._sent < self.requests:
+            self._send()
+        elif len(self.report.latencies) == self.requests:
+            self._finish()
+
+    def _finish(self) -> None:
+        self.report.finish()
+        self.finishedSignal.emit()
+
+
+def run_qt(server: str, schema: str, mix: Mix, requests: int, concurrency: int, username: str = None,
+           password: str = '', rnd: random.Random = None) -> LoadReport:
+    """
+    Load test with Session in Qt event loop
+    :param server: server url
+    :param schema: schema
+    :param mix: queries to send
+    :param requests: requests count
+    :param concurrency: requests in flight (and max requests per host)
+    :param username: user to sign in, None - no sign in
+    :param password: password of user
+    :param rnd: random generator to choose queries
+    :return:
+    """
+    app = QCoreApplication.instance() or QCoreApplication([])
+    session = Session(server, schema, max_requests_per_host=concurrency)
+    if username is not None:
+        err, message = session.get(f'{session.LOGIN_URL}?username={username}&password={password}')
+        if err != QtNetwork.QNetworkReply.NoError:
+            raise NetworkException(err, message)
+    queries = {}
+    for query_id in mix.query_ids():
+        reply = session.get_async(f'{session.QUERY_API}?id={query_id}')
+        err, message = reply.wait()
+        if err != QtNetwork.QNetworkReply.NoError:
+            raise NetworkException(err, message)
+        queries[query_id] = Query(reply.json('query'))
+    test = QtLoadTest(session, queries, mix, requests, concurrency, rnd)
+    test.finishedSignal.connect(app.quit)
+    QTimer.singleShot(0, test.start)
+    app.exec_()
+    return test.report
@@ -1,11 +1,14 @@
 import datetime
+from collections import OrderedDict
 
 import qtawesome as qta
-from PyQt5.QtCore import pyqtSignal
-from PyQt5.QtWidgets import QWidget, QTableWidget, QHeaderView, QTableWidgetItem
+from PyQt5.QtCore import pyqtSignal, Qt
+from PyQt5.QtWidgets import QWidget, QTableWidget, QHeaderView, QTableWidgetItem, QMenu, QFileDialog
 
 from cli3.app import Cli3App
-from cli3.network import Request
+from cli3.network import Request, RequestState
+from cli3.scheduler import Priority
+from cli3.tracing import Phase, save_chrome_trace
 from ui.log_pane import Ui_logPane
 
 
@@ -17,6 +20,8 @@ class RequestTableColumns:
     DONE = (4, 'done')
     ERROR = (5, 'error')
     INFO = (6, 'info')
+    # Phase durations (ms)
+    PHASES = [(7 + i, phase) for i, phase in enumerate(Phase.ALL)]
 
 
 class LogPane(QWidget, Ui_logPane):
@@ -28,11 +33,24 @@ class LogPane(QWidget, Ui_logPane):
         self.requestTableWidget.setSelectionBehavior(QTableWidget.SelectRows)
         self.requestTableWidget.horizontalHeaderItem(RequestTableColumns.STATUS[0]).setText('')
         self.requestTableWidget.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeToContents)
+        self.requestTableWidget.setContextMenuPolicy(Qt.CustomContextMenu)
+        self.requestTableWidget.customContextMenuRequested.connect(self._show_context_menu)
         Cli3App.instance().session.requestSentSignal.connect(self.insert_request)
         Cli3App.instance().session.requestDoneSignal.connect(self.update_request)
+        Cli3App.instance().session.queueChangedSignal.connect(self.update_queue)
+        Cli3App.instance().session.requestTracedSignal.connect(self.update_phases)
+        # Requests waiting for answer uuid -> request
+        self._running = dict()
+        # Phase spans of logged requests uuid -> (name, spans)
+        self._traces = OrderedDict()
 
     def setupUi(self, logPane):
         super().setupUi(logPane)
+        self.requestTableWidget.setColumnCount(RequestTableColumns.PHASES[-1][0] + 1)
+        for column, phase in RequestTableColumns.PHASES:
+            item = QTableWidgetItem(phase)
+            item.setToolTip(f'{phase} time, ms')
+            self.requestTableWidget.setHorizontalHeaderItem(column, item)
 
     def insert_request(self, request: Request) -> None:
         """
@@ -41,6 +59,8 @@ class LogPane(QWidget, Ui_logPane):
         :param request: Sent request
         :return:
         """
+        self._running[str(request.uuid)] = request
+        self._traces[str(request.uuid)] = (request.query.get_full_name(request.params), request.spans)
         self.requestTableWidget.insertRow(0)
         status_widget = qta.IconWidget()
         spin_icon = qta.icon('fa5s.spinner', color='blue', animation=qta.Spin(status_widget))
@@ -52,8 +72,38 @@ class LogPane(QWidget, Ui_logPane):
                                         QTableWidgetItem(str(request.query.name)))
         self.requestTableWidget.setItem(0, RequestTableColumns.SENT[0],
                                         QTableWidgetItem(str(datetime.datetime.now())))
+        self.requestTableWidget.setItem(0, RequestTableColumns.INFO[0],
+                                        QTableWidgetItem(self._state_info(request)))
         self.requestTableWidget.resizeColumnsToContents()
 
+    def _state_info(self, request: Request) -> str:
+        """
+        Info text for running request
+        :param request: running request
+        :return:
+        """
+        if request.state == RequestState.QUEUED:
+            position = Cli3App.instance().session.queue_position(request)
+            return f'queued #{position} ({Priority.NAMES.get(request.priority, request.priority)})'
+        elif request.state == RequestState.RETRY:
+            attempt = request.attempts[-1]
+            return f'retry in {attempt.delay:.2f} s after error {attempt.error} ' \
+                   f'(attempt {len(request.attempts)} failed)'
+        elif request.leader is not None:
+            return 'waiting for identical query'
+        return request.state
+
+    def update_queue(self) -> None:
+        """
+        Update queue positions of waiting requests
+        :return:
+        """
+        for idx in range(self.requestTableWidget.rowCount()):
+            request = self._running.get(self.requestTableWidget.item(idx, RequestTableColumns.UUID[0]).text(), None)
+            if request is not None:
+                self.requestTableWidget.setItem(idx, RequestTableColumns.INFO[0],
+                                                QTableWidgetItem(self._state_info(request)))
+
     def update_request(self, request: Request) -> None:
         """
         Update request info to log pane
@@ -61,6 +111,7 @@ class LogPane(QWidget, Ui_logPane):
         :param request: Done request
         :return:
         """
+        self._running.pop(str(request.uuid), None)
         idx = 0
         found = False
         for idx in range(self.requestTableWidget.rowCount()):
@@ -76,10 +127,75 @@ class LogPane(QWidget, Ui_logPane):
             status_widget = self.requestTableWidget.cellWidget(idx, RequestTableColumns.STATUS[0])
             if request.error == 0:
                 status_widget.setIcon(Cli3App.instance().icons.get('success'))
-                self.requestTableWidget.setItem(idx, RequestTableColumns.INFO[0],
-                                                QTableWidgetItem(f'{len(request.answer)} bytes received'))
+                if request.from_cache:
+                    info = f'{request.size} bytes from cache, age {request.cache_age():.0f} s'
+                else:
+                    info = f'{request.size} bytes received'
+                    if request.encoding is not None:
+                        info += f' ({request.transferred} {request.encoding}, ratio {request.compression_ratio():.1f})'
+                    info += f', queue {request.queue_time():.2f} s, server {request.server_time():.2f} s'
+                    if len(request.attempts) > 1:
+                        info += f', {len(request.attempts)} attempts, total {request.total_time():.2f} s'
+                self.requestTableWidget.setItem(idx, RequestTableColumns.INFO[0], QTableWidgetItem(info))
             else:
-                status_widget.setIcon(Cli3App.instance().icons.get('error'))
-                self.requestTableWidget.setItem(idx, RequestTableColumns.INFO[0],
-                                                QTableWidgetItem(str(request.answer)))
+                if request.state == RequestState.CANCELLED:
+                    status_widget.setIcon(Cli3App.instance().icons.get('cancel'))
+                elif request.state == RequestState.TIMEOUT:
+                    status_widget.setIcon(Cli3App.instance().icons.get('timeout'))
+                else:
+                    status_widget.setIcon(Cli3App.instance().icons.get('error'))
+                info = str(request.answer)
+                if len(request.attempts) > 1:
+                    info += f' ({len(request.attempts)} attempts, total {request.total_time():.2f} s)'
+                self.requestTableWidget.setItem(idx, RequestTableColumns.INFO[0], QTableWidgetItem(info))
+            status_widget.setToolTip(request.state)
+            self._set_phases(idx, request)
             self.requestTableWidget.resizeColumnsToContents()
+
+    def update_phases(self, request: Request) -> None:
+        """
+        Update phase durations of request
+        :param request: traced request
+        :return:
+        """
+        for idx in range(self.requestTableWidget.rowCount()):
+            if self.requestTableWidget.item(idx, RequestTableColumns.UUID[0]).text() == str(request.uuid):
+                self._set_phases(idx, request)
+                self.requestTableWidget.resizeColumnsToContents()
+                break
+
+    def _set_phases(self, idx: int, request: Request) -> None:
+        # Spans object is replaced when request is resent
+        self._traces[str(request.uuid)] = (request.query.get_full_name(request.params), request.spans)
+        for column, phase in RequestTableColumns.PHASES:
+            text = f'{request.spans.duration(phase) * 1000:.1f}' if request.spans.has(phase) else ''
+            self.requestTableWidget.setItem(idx, column, QTableWidgetItem(text))
+
+    def export_trace(self) -> None:
+        """
+        Save phase spans of logged requests as Chrome trace-event json
+        :return:
+        """
+        filename, _ = QFileDialog.getSaveFileName(self, 'Export trace', 'trace.json', 'Trace (*.json)')
+        if filename:
+            save_chrome_trace(filename, list(self._traces.values()))
+
+    def _show_context_menu(self, point) -> None:
+        """
+        Context menu to cancel running request and export trace
+        :param point:
+        :return:
+        """
+        item = self.requestTableWidget.item(self.requestTableWidget.rowAt(point.y()), RequestTableColumns.UUID[0])
+        request = self._running.get(item.text(), None) if item is not None else None
+        menu = QMenu()
+        action = menu.addAction("Cancel request")
+        action.setIcon(Cli3App.instance().icons.get('cancel'))
+        action.setEnabled(request is not None and request.is_running())
+        action.triggered.connect(lambda x: request.cancel())
+        menu.addSeparator()
+        export_action = menu.addAction("Export trace...")
+        export_action.setIcon(Cli3App.instance().icons.get('save'))
+        export_action.setEnabled(len(self._traces) > 0)
+        export_action.triggered.connect(lambda x: self.export_trace())
+        menu.exec_(self.requestTableWidget.viewport().mapToGlobal(point))
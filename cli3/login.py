@@ -1,8 +1,5 @@
-import json
-import os
 import pathlib
 
-import pandas as pd
 from PyQt5 import QtWidgets, QtNetwork
 from PyQt5.QtCore import pyqtSignal, pyqtSlot, QCoreApplication, QSettings
 from PyQt5.QtWidgets import QApplication
@@ -73,68 +70,49 @@ class LoginDialog(QtWidgets.QDialog, Ui_dlgLogin):
             self._write_settings()
             self.labelStatus.setStyleSheet("color: green")
             self.labelStatus.setText('Success')
+            styles_reply = Cli3App.instance().session.get_async(f'{Cli3App.instance().session.STYLE_API}')
             self._load_nci()
-            self._load_styles()
+            self._load_styles(styles_reply)
+            Cli3App.instance().nci_loader.progressSignal.disconnect(self._nci_progress)
             self.loggedSignal.emit(0)
             self.accept()
         else:
             self.labelStatus.setStyleSheet("color: red")
             self.labelStatus.setText(message)
 
-    def _load_nci_table(self, name) -> None:
-        """
-        Load nci table into Globals nci dictionary
-        :param name: name associated with table
-        :return:
-        """
-        err, message = Cli3App.instance().session.get(f'{Cli3App.instance().session.NCI_API}/{name}')
-        if err == QtNetwork.QNetworkReply.NoError:
-            json_message = json.loads(message)
-            Cli3App.instance().nci[name] = pd.DataFrame(data=json_message['rows'],
-                                                        columns=[column.upper() for column in json_message['columns']])
-        else:
-            raise NetworkException(err, message)
-
     def _load_nci(self) -> None:
         """
-        Load all nci tables into Globals nci dictionary
+        Start loading all nci tables into Globals nci dictionary.
+        Tables are loaded in background from file if exists, else from server
         TODO добавить проверку изменились ли НСИ из метки версии
-        from file if exists, else from server
         :return:
         """
-        self.loadProgressBar.setMaximum(len(Cli3App.instance().nci.keys()))
-        step = 0
-        self.loadProgressBar.setValue(step)
-        err, message = Cli3App.instance().session.get(Cli3App.instance().session.NCI_API)
-        ncis = json.loads(message)
-        for nci in ncis:
-            progress_message = f"Loading {nci['name']} ..."
-            self.loadProgressBar.setFormat(progress_message)
-            self.labelStatus.setText(progress_message)
-            path = str(str(Cli3App.get_app_path())) + '/data'
-            os.makedirs(path, exist_ok=True)
-            data_file = f"{path}/{nci['name']}.csv"
-            if os.path.exists(data_file):
-                Cli3App.instance().nci[nci['name']] = pd.read_csv(data_file, dtype=str)
-            else:
-                self._load_nci_table(nci['name'])
-                Cli3App.instance().nci[nci['name']].to_csv(data_file, index=False)
-            # Prevent convert index to int
-            Cli3App.instance()
-            Cli3App.instance().nci[nci['name']].set_index(Cli3App.instance().nci[nci['name']].columns[0], drop=False,
-                                                          inplace=True)
-            self.loadProgressBar.setValue(++step)
+        session = Cli3App.instance().session
+        reply = session.get_async(session.NCI_API)
+        err, message = reply.wait()
+        if err != QtNetwork.QNetworkReply.NoError:
+            raise NetworkException(err, message)
+        ncis = reply.json()
+        Cli3App.instance().nci_loader.progressSignal.connect(self._nci_progress)
+        Cli3App.instance().nci_loader.load([nci['name'] for nci in ncis])
+
+    @pyqtSlot(int, int)
+    def _nci_progress(self, done, total):
+        self.loadProgressBar.setMaximum(total)
+        self.loadProgressBar.setValue(done)
+        self.loadProgressBar.setFormat(f"Loading nci {done}/{total} ...")
 
-    def _load_styles(self) -> None:
+    def _load_styles(self, reply) -> None:
         """
         Loade styles from server
+        :param reply: reply for styles request
         :return:
         """
         progress_message = f"Loading styles ..."
         self.loadProgressBar.setFormat(progress_message)
         self.labelStatus.setText(progress_message)
-        err, message = Cli3App.instance().session.get(f'{Cli3App.instance().session.STYLE_API}')
+        err, message = reply.wait()
         if err == QtNetwork.QNetworkReply.NoError:
-            Cli3App.instance().styles = json.loads(message)
+            Cli3App.instance().styles = reply.json()
         else:
             raise NetworkException(err, message)
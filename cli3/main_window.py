@@ -1,7 +1,6 @@
-import json
-import json
 import pickle
 import sys
+import typing
 from functools import partial
 
 from PyQt5 import QtWidgets, QtNetwork, QtGui
@@ -62,6 +61,10 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
         self.navigatorPane = NavigatorPane(self)
         self.navDockWidget.setWidget(self.navigatorPane)
         self.navigatorPane.sendRequestSignal.connect(self._send_query)
+        self.navigatorPane.sendRequestsSignal.connect(self._send_queries)
+        self.navigatorPane.contentsChangedSignal.connect(self._create_query_menu)
+        # Tree is requested after its signals are connected
+        self.navigatorPane.fill_contents()
         self.logPane = LogPane(self)
         self.logDocWidget.setWidget(self.logPane)
         # init actions
@@ -77,7 +80,7 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
         self.actionNavigator.triggered.connect(self._invert_nav_visable)
         self.actionLog.triggered.connect(self._invert_log_visable)
         self.actionUpdateFolders.setIcon(Cli3App.instance().icons.get('sync'))
-        self.actionUpdateFolders.triggered.connect(self.navigatorPane.fill_contents)
+        self.actionUpdateFolders.triggered.connect(lambda: self.navigatorPane.fill_contents(revalidate=True))
         self.actionPrint.setIcon(Cli3App.instance().icons.get('print'))
         self.actionPrint.triggered.connect(self._print_answer)
         self.actionToExcel.setIcon(Cli3App.instance().icons.get('excel'))
@@ -86,10 +89,11 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
         self.actionToPdf.triggered.connect(self._export_answer_to_pdf)
         # Menu
         self.menuWindow.aboutToShow.connect(self._update_window_list)
-        self._create_query_menu()
         # Toolbar
         self._fill_toolbar()
         Cli3App.instance().session.answerReceivedSignal.connect(self.answer_received)
+        Cli3App.instance().nci_loader.progressSignal.connect(self._nci_progress)
+        Cli3App.instance().nci_loader.tableErrorSignal.connect(self._nci_error)
 
     def _create_query_menu(self):
         self.menuQuery.clear()
@@ -226,6 +230,21 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
         if window is not None and isinstance(window.widget(), MdiWindow):
             window.widget().refresh()
 
+    def _nci_progress(self, done, total):
+        """
+        Show nci loading progress in status bar
+        :param done: loaded tables count
+        :param total: all tables count
+        :return:
+        """
+        if done < total:
+            self.statusbar.showMessage(f'Loading nci {done}/{total} ...')
+        else:
+            self.statusbar.showMessage(f'{total} nci tables loaded', 5000)
+
+    def _nci_error(self, name, message):
+        self.statusbar.showMessage(f'Can not load nci {name}: {message}')
+
     def _invert_nav_visable(self):
         """
         Show/Hide navigator
@@ -247,6 +266,9 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
         :return:
         """
         self.write_settings()
+        Cli3App.instance().session.cache.save()
+        if Cli3App.instance().session.result_cache is not None:
+            print('Result cache', Cli3App.instance().session.result_cache.stats())
         super(MainWindow, self).closeEvent(a0)
 
     def write_settings(self) -> None:
@@ -299,15 +321,54 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
                 window.set_request(request=request)
             self.mdiArea.addSubWindow(window).show()
 
-    def _send_query(self, query: Query) -> Query:
+    def _send_query(self, query: Query) -> None:
         """
-        Send query
+        Request query definition from server and send query when it is received
         :param query: Query for send
-        :return: Query from server
+        :return:
+        """
+        Cli3App.instance().session.get_async(f'{Cli3App.instance().session.QUERY_API}?id={query.id}') \
+            .add_done_callback(partial(self._query_received, query))
+
+    def _send_queries(self, queries: typing.List[Query]) -> None:
+        """
+        Request definitions of queries and send them in one batch
+        :param queries: Queries from navigator
+        :return:
+        """
+        session = Cli3App.instance().session
+        session.gather([f'{session.QUERY_API}?id={query.id}' for query in queries]) \
+            .add_done_callback(partial(self._queries_received, queries))
+
+    def _queries_received(self, queries: typing.List[Query], group) -> None:
+        """
+        Send queries without input params in batch, ask params for others
+        :param queries: Queries from navigator
+        :param group: Replies with query definitions
+        :return:
+        """
+        batch = []
+        for query, reply in zip(queries, group.replies):
+            err, message = reply.result()
+            if err == QtNetwork.QNetworkReply.NoError:
+                query = Query(reply.json('query'))
+            if query.has_in_params():
+                self._query_received(query, reply)
+            else:
+                batch.append((query, None))
+        if len(batch) > 0:
+            Cli3App.instance().session.send_batch(batch)
+
+    def _query_received(self, query: Query, reply) -> None:
+        """
+        Send query with definition from server
+        :param query: Query from navigator
+        :param reply: Reply with query definition
+        :return:
         """
-        err, message = Cli3App.instance().session.get(f'{Cli3App.instance().session.QUERY_API}?id={query.id}')
+        err, message = reply.result()
         if err == QtNetwork.QNetworkReply.NoError:
-            json_query = json.loads(message)
+            json_query = reply.json('query')
             query = Query(json_query)
         if query.has_in_params():
             input_dialog = InputDialog(query, self)
@@ -315,4 +376,3 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
             input_dialog.show()
         else:
             Cli3App.instance().session.send_query(query)
-        return query
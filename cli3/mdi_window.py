@@ -1,10 +1,13 @@
 import pickle
+import time
 
 from PyQt5 import QtWidgets
-from PyQt5.QtCore import QSize, Qt
+from PyQt5.QtCore import QSize, Qt, QEvent, QTimer, QObject
 
 from cli3.app import Cli3App
 from cli3.network import Request
+from cli3.scheduler import Priority
+from cli3.tracing import Phase
 
 
 class MdiWindow(QtWidgets.QFrame):
@@ -13,13 +16,53 @@ class MdiWindow(QtWidgets.QFrame):
         self.setAttribute(Qt.WA_DeleteOnClose)
         # preffered szie 3/4 from mdi
         self._preffered_size = QSize(parent.size().width() // 4 * 3, parent.size().height() // 4 * 3)
+        # Request waiting for first paint of its answer
+        self._paint_request = None
+        self._paint_started = None
 
     def sizeHint(self):
         return self._preffered_size
 
     def set_request(self, request: Request):
         self._request = request
-        self.setWindowTitle(request.query.get_full_name(request.params))
+        title = request.query.get_full_name(request.params)
+        if request.from_cache:
+            title += f' (from cache, {self._format_age(request.cache_age())} old)'
+        self.setWindowTitle(title)
+
+    def trace_first_paint(self, request: Request, widget: QtWidgets.QWidget = None) -> None:
+        """
+        Record paint phase of request: from now to the end of first paint of widget
+        :param request: shown request
+        :param widget: widget showing answer, None - window
+        :return:
+        """
+        widget = widget or self
+        if self._paint_request is None:
+            widget.installEventFilter(self)
+        self._paint_request = request
+        self._paint_started = time.monotonic()
+
+    def eventFilter(self, watched: QObject, event: QEvent) -> bool:
+        if event.type() == QEvent.Paint and self._paint_request is not None:
+            watched.removeEventFilter(self)
+            # Paint is finished when event loop gets control
+            QTimer.singleShot(0, self._first_painted)
+        return super().eventFilter(watched, event)
+
+    def _first_painted(self) -> None:
+        request, self._paint_request = self._paint_request, None
+        if request is not None:
+            request.spans.add(Phase.PAINT, self._paint_started)
+            Cli3App.instance().session.requestTracedSignal.emit(request)
+
+    @staticmethod
+    def _format_age(seconds: float) -> str:
+        if seconds < 60:
+            return f'{seconds:.0f} s'
+        elif seconds < 3600:
+            return f'{seconds // 60:.0f} min'
+        return f'{seconds // 3600:.0f} h {seconds % 3600 // 60:.0f} min'
 
     locked = False
 
@@ -35,7 +78,7 @@ class MdiWindow(QtWidgets.QFrame):
         :return:
         """
         self._request.getDoneSignal.connect(self._model_refreshed)
-        Cli3App.instance().session.send_request(self._request)
+        Cli3App.instance().session.send_request(self._request, Priority.REFRESH, self)
         Cli3App.instance().session.requestSentSignal.emit(self._request)
         self.locked = True
         Cli3App.instance().updateMainWindiwSignal.emit()
@@ -54,6 +97,13 @@ class MdiWindow(QtWidgets.QFrame):
             self.set_request(request=request)
         Cli3App.instance().updateMainWindiwSignal.emit()
 
+    def cancel(self) -> bool:
+        """
+        Cancel running refresh of window
+        :return: True if request was cancelled
+        """
+        return self.locked and self._request.cancel()
+
     def save(self, filename):
         with open(filename, 'wb') as outp:
             pickle.dump(self._request, outp, pickle.HIGHEST_PROTOCOL)
@@ -0,0 +1,530 @@
+"""
+Локальный сервер-заглушка для тестов.
+Serves login, folders tree, query definitions, styles, nci tables and query answers
+(whole or paged with sort and filter pushdown, several queries in one batch, json or arrow stream)
+like profile server does, with latency and bandwidth of chosen network profile.
+Run: python -m cli3.mock_server --port 8000 --rows 100000 --columns 20 --profile wan
+"""
+import argparse
+import gzip
+import http.cookies
+import json
+import random
+import threading
+import time
+import typing
+import urllib.parse
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from cli3.arrow_ipc import ARROW_STREAM, accepts_arrow, encode_answer
+from cli3.endpoints import Endpoints
+from cli3.paging import Pager, decode_filters, decode_sort
+from cli3.synthetic import Generator, make_specs, TYPES
+
+
+class MockQuery(object):
+    """
+    Query served by mock server with its data
+    """
+
+    def __init__(self, id: int, name: str, columns: typing.List[dict], rows: typing.List[list],
+                 params: dict = None, paging: dict = None, type: str = 'TABLE', folder: str = 'Mock'):
+        self.id = id
+        self.name = name
+        self.columns = columns
+        self.rows = rows
+        self.params = params or {}
+        self.paging = paging
+        self.type = type
+        # Folder path in tree like "Mock/Paged"
+        self.folder = folder
+        # Row orders by (sort, filters)
+        self._orders = {}
+        self._lock = threading.Lock()
+
+    def definition(self) -> dict:
+        """
+        Query definition like /api/docs/query answers
+        :return:
+        """
+        definition = dict(id=self.id, name=self.name, url=f'/query/{self.id}', type=self.type,
+                          params=self.params)
+        if self.paging is not None:
+            definition['paging'] = self.paging
+        return definition
+
+    def order(self, sort: typing.List[typing.Tuple[str, bool]], filters: dict) -> typing.List[int]:
+        """
+        Indexes of filtered rows in sort order (cached)
+        :param sort: [(column name, ascending)]
+        :param filters: column name -> value (None - is null)
+        :return:
+        """
+        key = (tuple(sort), json.dumps(filters, sort_keys=True, default=str))
+        with self._lock:
+            order = self._orders.get(key, None)
+        if order is not None:
+            return order
+        names = [column['name'].upper() for column in self.columns]
+        predicates = []
+        for name, value in filters.items():
+            if name not in names:
+                raise ValueError(f'Unknown filter column {name}')
+            predicates.append((names.index(name), value))
+        order = [i for i, row in enumerate(self.rows)
+                 if all(_matches(row[position], value) for position, value in predicates)]
+        # Stable sorts from last key to first
+        for name, ascending in reversed(sort):
+            if name not in names:
+                raise ValueError(f'Unknown sort column {name}')
+            position = names.index(name)
+            order.sort(key=lambda i: _sort_key(self.rows[i][position]), reverse=not ascending)
+        with self._lock:
+            self._orders[key] = order
+        return order
+
+
+def _matches(value, filter_value) -> bool:
+    if filter_value is None:
+        return value is None
+    return value == filter_value or value is not None and str(value) == str(filter_value)
+
+
+def _sort_key(value):
+    # None is the last in ascending order
+    return (value is None, value if value is not None else 0)
+
+
+class NetworkProfile(object):
+    """
+    Delay before answer and bandwidth of answer body
+    """
+
+    def __init__(self, latency: float = 0.0, bandwidth: float = None, jitter: float = 0.0):
+        """
+        :param latency: seconds before answer headers
+        :param bandwidth: bytes per second of body, None - unlimited
+        :param jitter: random addition to latency up to jitter seconds
+        """
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.jitter = jitter
+
+    def delay(self) -> float:
+        return self.latency + (random.uniform(0, self.jitter) if self.jitter > 0 else 0.0)
+
+
+PROFILES = {
+    'local': NetworkProfile(),
+    'lan': NetworkProfile(0.001, 100e6),
+    'wan': NetworkProfile(0.04, 2.5e6, 0.01),
+    'slow': NetworkProfile(0.2, 250e3, 0.1),
+}
+
+SESSION_COOKIE = 'session'
+
+# Api handler result: (status, headers, body)
+Answer = typing.Tuple[int, dict, bytes]
+
+
+class MockServer(object):
+    """
+    Http server with mock api in background thread
+    """
+
+    def __init__(self, queries: typing.List[MockQuery] = None, host: str = '127.0.0.1', port: int = 0,
+                 schema: str = 'mock', generator: Generator = None, nci_tables: typing.List[str] = None,
+                 profile: NetworkProfile = None, compress: bool = False, users: typing.Dict[str, str] = None,
+                 require_auth: bool = False, arrow: bool = True):
+        """
+        :param queries: served queries
+        :param host: host to listen
+        :param port: port to listen, 0 - any free port
+        :param schema: first path segment of urls
+        :param generator: generator of styles and nci tables
+        :param nci_tables: names of served nci tables
+        :param profile: network profile, None - local
+        :param compress: gzip answers if client accepts
+        :param users: user name -> password, None - any user and password
+        :param require_auth: apis except login answer 401 without session cookie
+        :param arrow: answer with arrow stream if client accepts it and pyarrow is installed
+        """
+        self.queries = {query.id: query for query in queries or []}
+        self.schema = schema
+        self.generator = generator or Generator()
+        self.nci_tables = list(nci_tables or [])
+        self.profile = profile or PROFILES['local']
+        self.compress = compress
+        self.users = users
+        self.require_auth = require_auth
+        self.arrow = arrow
+        self.routes = {
+            Endpoints.LOGIN_URL: self.login,
+            Endpoints.LOGOUT_URL: self.logout,
+            Endpoints.TREE_API: self.tree,
+            Endpoints.QUERY_API: self.query_definition,
+            Endpoints.STYLE_API: self.styles,
+            Endpoints.NCI_API: self.nci_list,
+            Endpoints.REQUEST_URL: self.query_answer,
+            Endpoints.BATCH_URL: self.batch_answer,
+        }
+        # Apis with name in path like /api/nci/<name>
+        self.prefix_routes = {
+            Endpoints.NCI_API + '/': self.nci_table,
+        }
+        self.sessions = set()
+        self.requests_count = 0
+        self.connections_count = 0
+        self._httpd = ThreadingHTTPServer((host, port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.mock = self
+        self._thread = None
+
+    @property
+    def server(self) -> str:
+        """
+        Server url for Session
+        :return: like http://127.0.0.1:8000
+        """
+        host, port = self._httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    @property
+    def url(self) -> str:
+        """
+        Base url of api (server and schema)
+        :return:
+        """
+        return f'{self.server}/{self.schema}'
+
+    def add_query(self, query: MockQuery) -> None:
+        self.queries[query.id] = query
+
+    def start(self) -> 'MockServer':
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name='mock-server', daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self) -> None:
+        self._httpd.serve_forever()
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def handle(self, path: str, params: typing.Dict[str, str], body: bytes = None,
+               headers: typing.Mapping[str, str] = None) -> Answer:
+        """
+        Route request to api handler
+        :param path: url path without schema
+        :param params: url query params
+        :param body: body of post request
+        :param headers: request headers
+        :return: (status, headers, body)
+        """
+        headers = headers or {}
+        self.requests_count += 1
+        handler = self.routes.get(path, None)
+        if handler is None:
+            for prefix, prefix_handler in self.prefix_routes.items():
+                if path.startswith(prefix):
+                    params = dict(params, name=urllib.parse.unquote(path[len(prefix):]))
+                    handler = prefix_handler
+                    break
+            else:
+                return _error(404, f'Unknown api {path}')
+        if self.require_auth and path != Endpoints.LOGIN_URL and _session(headers) not in self.sessions:
+            return _error(401, 'Not authorized')
+        try:
+            return handler(params, body, headers)
+        except (KeyError, ValueError) as e:
+            return _error(400, f'Bad request: {e}')
+
+    def login(self, params: dict, body: bytes = None, headers: dict = None) -> Answer:
+        """
+        Check user and password, new session is set to cookie
+        :param params: username, password
+        :return:
+        """
+        username = params.get('username', '')
+        if self.users is not None and self.users.get(username, None) != params.get('password', None):
+            return _error(401, 'Invalid user name or password')
+        session = uuid.uuid4().hex
+        self.sessions.add(session)
+        return 200, {'Content-Type': 'text/plain', 'Set-Cookie': f'{SESSION_COOKIE}={session}; Path=/'}, \
+            f'Logged in as {username}'.encode()
+
+    def logout(self, params: dict, body: bytes = None, headers: dict = None) -> Answer:
+        self.sessions.discard(_session(headers or {}))
+        return 200, {'Content-Type': 'text/plain', 'Set-Cookie': f'{SESSION_COOKIE}=; Path=/; Max-Age=0'}, \
+            b'Logged out'
+
+    def tree(self, params: dict, body: bytes = None, headers: dict = None) -> Answer:
+        """
+        Folders tree of queries by MockQuery.folder paths
+        :return:
+        """
+        root = {'name': '', 'folders': [], 'queries': []}
+        for query in self.queries.values():
+            folder = root
+            for name in query.folder.split('/'):
+                child = next((item for item in folder['folders'] if item['name'] == name), None)
+                if child is None:
+                    child = {'name': name, 'folders': [], 'queries': []}
+                    folder['folders'].append(child)
+                folder = child
+            folder['queries'].append(query.definition())
+        return _json({'folders': root['folders']})
+
+    def styles(self, params: dict, body: bytes = None, headers: dict = None) -> Answer:
+        return _json(self.generator.styles())
+
+    def nci_list(self, params: dict, body: bytes = None, headers: dict = None) -> Answer:
+        return _json([{'name': name} for name in self.nci_tables])
+
+    def nci_table(self, params: dict, body: bytes = None, headers: dict = None) -> Answer:
+        if params['name'] not in self.nci_tables:
+            return _error(404, f'Unknown nci {params["name"]}')
+        return _json(self.generator.nci_table(params['name']))
+
+    def _query(self, params: dict) -> MockQuery:
+        query = self.queries.get(int(params['id']), None)
+        if query is None:
+            raise KeyError(f'query {params["id"]}')
+        return query
+
+    def query_definition(self, params: dict, body: bytes = None, headers: dict = None) -> Answer:
+        return _json(self._query(params).definition())
+
+    def query_answer(self, params: dict, body: bytes = None, headers: dict = None) -> Answer:
+        """
+        Query answer, paged if limit is set.
+        Offset paging: offset, limit. Keyset paging: after (key of last row of previous page), limit.
+        sort like A:asc,B:desc and filter as json object are applied before paging.
+        Answer is arrow stream if client accepts it
+        :param params: url query params
+        :param headers: request headers
+        :return:
+        """
+        answer = {'cursor': self.cursor(self._query(params), params)}
+        if self.arrow and accepts_arrow(headers.get('Accept', None) if headers else None):
+            body = encode_answer(answer)
+            if body is not None:
+                return 200, {'Content-Type': ARROW_STREAM}, body
+        return _json(answer)
+
+    def batch_answer(self, params: dict, body: bytes = None, headers: dict = None) -> Answer:
+        """
+        Answers of several queries. Body is {"requests": ["id=1&P=1", ...]},
+        answer is json lines {"index": i, "status": 200, "answer": {...}} or {"index": i, "status": 400, "error": ""}
+        :param params: url query params
+        :param body: json body
+        :return:
+        """
+        if body is None:
+            raise ValueError('Batch must be posted')
+        lines = []
+        for index, request in enumerate(json.loads(body)['requests']):
+            request_params = dict(urllib.parse.parse_qsl(request, keep_blank_values=True))
+            try:
+                part = {'index': index, 'status': 200,
+                        'answer': {'cursor': self.cursor(self._query(request_params), request_params)}}
+            except (KeyError, ValueError) as e:
+                part = {'index': index, 'status': 400, 'error': f'Bad request: {e}'}
+            lines.append(json.dumps(part, default=str).encode())
+        return 200, {'Content-Type': 'application/x-ndjson'}, b'\n'.join(lines) + b'\n'
+
+    def cursor(self, query: MockQuery, params: dict) -> dict:
+        """
+        Cursor of query answer for params
+        :param query: mock query
+        :param params: url query params
+        :return:
+        """
+        order = query.order(decode_sort(params.get('sort', None)), decode_filters(params.get('filter', None)))
+        cursor = {'type': 'cursor', 'columns': query.columns}
+        if 'limit' not in params:
+            cursor['data'] = [query.rows[i] for i in order]
+            return cursor
+        limit = int(params['limit'])
+        if 'after' in params:
+            # Keyset: rows after row with key (row number) from previous page, empty key - first page
+            start = 0
+            if params['after'] != '':
+                start = {row: position for position, row in enumerate(order)}[int(params['after'])] + 1
+            mode = Pager.KEYSET
+        else:
+            start = int(params.get('offset', 0))
+            mode = Pager.OFFSET
+        page = order[start:start + limit]
+        cursor['data'] = [query.rows[i] for i in page]
+        cursor['page'] = {'offset': start, 'limit': limit, 'total': len(order)}
+        if mode == Pager.KEYSET:
+            cursor['page']['next'] = str(page[-1]) if start + limit < len(order) and len(page) > 0 else None
+        return cursor
+
+
+def _json(answer) -> Answer:
+    return 200, {'Content-Type': 'application/json'}, json.dumps(answer, default=str).encode()
+
+
+def _error(status: int, message: str) -> Answer:
+    return status, {'Content-Type': 'text/plain'}, message.encode()
+
+
+def _session(headers: typing.Mapping[str, str]) -> typing.Optional[str]:
+    cookies = http.cookies.SimpleCookie(headers.get('Cookie', ''))
+    return cookies[SESSION_COOKIE].value if SESSION_COOKIE in cookies else None
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Bytes written at once with limited bandwidth
+    CHUNK_SIZE = 16384
+
+    def setup(self):
+        super().setup()
+        self.server.mock.connections_count += 1
+
+    def do_GET(self):
+        self._respond(None)
+
+    def do_POST(self):
+        self._respond(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+
+    def _respond(self, request_body: typing.Optional[bytes]):
+        url = urllib.parse.urlsplit(self.path)
+        mock = self.server.mock
+        path = url.path
+        prefix = f'/{mock.schema}'
+        if path.startswith(prefix + '/'):
+            path = path[len(prefix):]
+        params = dict(urllib.parse.parse_qsl(url.query, keep_blank_values=True))
+        status, headers, body = mock.handle(path, params, request_body, self.headers)
+        if mock.compress and len(body) > 0 and 'gzip' in self.headers.get('Accept-Encoding', ''):
+            body = gzip.compress(body, 6)
+            headers = dict(headers, **{'Content-Encoding': 'gzip'})
+        profile = mock.profile
+        delay = profile.delay()
+        if delay > 0:
+            time.sleep(delay)
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if profile.bandwidth is None:
+            self.wfile.write(body)
+            return
+        started = time.monotonic()
+        for start in range(0, len(body), self.CHUNK_SIZE):
+            self.wfile.write(body[start:start + self.CHUNK_SIZE])
+            self.wfile.flush()
+            # Sleep until sent bytes fit the bandwidth
+            wait = started + (start + self.CHUNK_SIZE) / profile.bandwidth - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_rows(count: int) -> typing.List[list]:
+    """
+    Synthetic rows for demo query: ID, NAME, VALUE, DAY
+    :param count: rows count
+    :return:
+    """
+    return [[i, f'Item {i % 1000}', round((i * 7919) % 100000 / 100, 2),
+             f'2022-{i % 12 + 1:02d}-{i % 28 + 1:02d}'] for i in range(count)]
+
+
+DEMO_COLUMNS = [
+    {'name': 'ID', 'title': 'Id', 'type': 'INTEGER', 'visable': True},
+    {'name': 'NAME', 'title': 'Name', 'type': 'STRING', 'visable': True},
+    {'name': 'VALUE', 'title': 'Value', 'type': 'NUMBER', 'visable': True},
+    {'name': 'DAY', 'title': 'Day', 'type': 'DATE', 'visable': True},
+]
+
+
+def demo_queries(rows: int) -> typing.List[MockQuery]:
+    data = make_rows(rows)
+    return [MockQuery(1, 'Demo table', DEMO_COLUMNS, data),
+            MockQuery(2, 'Demo paged table', DEMO_COLUMNS, data, paging={'mode': Pager.OFFSET, 'page_size': 1000},
+                      folder='Mock/Paged'),
+            MockQuery(3, 'Demo keyset table', DEMO_COLUMNS, data, paging={'mode': Pager.KEYSET, 'page_size': 1000},
+                      folder='Mock/Paged')]
+
+
+def synthetic_query(id: int, generator: Generator, rows: int, columns: int, types: typing.Sequence[str] = TYPES,
+                    nci_columns: int = 0, style_columns: int = 0, nci_tables: typing.Sequence[str] = ('NCI_1',),
+                    nulls: float = 0.0, row_style: bool = False) -> MockQuery:
+    """
+    Query with synthetic cursor, see synthetic.make_specs
+    :param id: query id
+    :param generator: data generator
+    :param rows: rows count
+    :param columns: data columns count
+    :param types: types of columns by turn
+    :param nci_columns: count of NCI-coded columns
+    :param style_columns: count of columns with STYLE_<name> column
+    :param nci_tables: nci tables of NCI-coded columns
+    :param nulls: fraction of nulls
+    :param row_style: add STYLE column of whole row
+    :return:
+    """
+    specs = make_specs(columns, types, nci_columns, style_columns, nci_tables, nulls)
+    column_defs, data = generator.cursor(specs, rows, row_style)
+    return MockQuery(id, f'Synthetic {rows}x{len(specs)}', column_defs, data, folder='Synthetic')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Cli3 mock server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--schema', default='mock')
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--columns', type=int, default=10, help='columns of synthetic query')
+    parser.add_argument('--types', default=','.join(TYPES), help='column types by turn')
+    parser.add_argument('--nci-columns', type=int, default=2)
+    parser.add_argument('--nci-tables', type=int, default=2)
+    parser.add_argument('--nci-size', type=int, default=100, help='rows in nci table')
+    parser.add_argument('--style-columns', type=int, default=2)
+    parser.add_argument('--nulls', type=float, default=0.0, help='fraction of null values')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--profile', choices=sorted(PROFILES), default='local')
+    parser.add_argument('--latency', type=float, default=None, help='seconds, overrides profile')
+    parser.add_argument('--bandwidth', type=float, default=None, help='bytes/s, overrides profile')
+    parser.add_argument('--compress', action='store_true', help='gzip answers')
+    parser.add_argument('--require-auth', action='store_true')
+    parser.add_argument('--no-arrow', action='store_true', help='answer with json only')
+    args = parser.parse_args()
+    profile = PROFILES[args.profile]
+    profile = NetworkProfile(profile.latency if args.latency is None else args.latency,
+                             profile.bandwidth if args.bandwidth is None else args.bandwidth, profile.jitter)
+    generator = Generator(args.seed, nci_size=args.nci_size)
+    nci_tables = [f'NCI_{i + 1}' for i in range(max(1, args.nci_tables))]
+    queries = demo_queries(args.rows)
+    queries.append(synthetic_query(10, generator, args.rows, args.columns, args.types.upper().split(','),
+                                   args.nci_columns, args.style_columns, nci_tables, args.nulls, row_style=True))
+    server = MockServer(queries, args.host, args.port, args.schema, generator, nci_tables, profile,
+                        args.compress, require_auth=args.require_auth, arrow=not args.no_arrow)
+    print(f'Mock server at {server.url}', flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
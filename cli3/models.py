@@ -103,6 +103,10 @@ class Query(object):
         self._name = query['name']
         self._url = query['url']
         self._type = query.get('type', 'TABLE')
+        # Time to live of cached result (sec), None - cache default, 0 - not cached
+        self._cache_ttl = query.get('cache_ttl', None)
+        # Cursor is loaded by pages like {"mode": "offset", "page_size": 1000}, None - at once
+        self._paging = query.get('paging', None)
         self._params = []
         for param, value in query.get('params', {}).items():
             self._params.append(Param(value))
@@ -133,6 +137,14 @@ class Query(object):
     def params(self):
         return self._params
 
+    @property
+    def cache_ttl(self):
+        return self._cache_ttl
+
+    @property
+    def paging(self):
+        return self._paging
+
     @property
     def in_params(self):
         return [param for param in self._params if param.type not in ['CURSOR', 'TEXT']]
@@ -158,6 +170,16 @@ class Query(object):
                 request += f'&{param.name}={param.value}'
         return request
 
+    def get_values(self, params=None):
+        """
+        Values of all params, given params override defaults
+        :param params: param name -> value
+        :return: param name -> value
+        """
+        if params is None:
+            params = {}
+        return {param.name: params.get(param.name, param.value) for param in self._params}
+
     def get_full_name(self, params):
         if params is None:
             params = {}
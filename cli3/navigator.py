@@ -1,4 +1,3 @@
-import json
 import typing
 
 from PyQt5 import QtNetwork, QtWidgets
@@ -196,12 +195,12 @@ class FoldersTreeModel(QAbstractItemModel):
 
 class NavigatorPane(QWidget, Ui_navigatorPane):
     sendRequestSignal = pyqtSignal(object)
+    sendRequestsSignal = pyqtSignal(list)
+    contentsChangedSignal = pyqtSignal()
 
     def __init__(self, parent: QWidget):
         super().__init__(parent)
         self.setupUi(self)
-        self.fill_contents()
-        self.navTreeView.expandAll()
         self.navTreeView.customContextMenuRequested.connect(self._folders_tree_context_menu)
         self.navTreeView.doubleClicked.connect(self._folders_tree_dbl_click)
         self.navTreeView.collapsed.connect(self._folder_collapsed)
@@ -210,12 +209,23 @@ class NavigatorPane(QWidget, Ui_navigatorPane):
     def setupUi(self, navigatorPane):
         super().setupUi(navigatorPane)
 
-    def fill_contents(self):
-        err, message = Cli3App.instance().session.get(f'{Cli3App.instance().session.TREE_API}')
+    def fill_contents(self, revalidate: bool = False):
+        """
+        Request folders tree, model is filled when answer is received
+        :param revalidate: check cached tree on server
+        :return:
+        """
+        Cli3App.instance().session.get_async(f'{Cli3App.instance().session.TREE_API}', revalidate) \
+            .add_done_callback(self._contents_received)
+
+    def _contents_received(self, reply):
+        err, message = reply.result()
         if err == QtNetwork.QNetworkReply.NoError:
-            json_tree = json.loads(message)
+            json_tree = reply.json('tree')
             tree_model = FoldersTreeModel(json_tree['folders'], None)
             self.navTreeView.setModel(tree_model)
+            self.navTreeView.expandAll()
+            self.contentsChangedSignal.emit()
         else:
             print("Error occurred: ", err, message)
 
@@ -249,7 +259,20 @@ class NavigatorPane(QWidget, Ui_navigatorPane):
             action.setIcon(Cli3App.instance().icons.get('send'))
             action.triggered.connect(lambda x: self.sendRequestSignal.emit(item.query()))
             menu.addSeparator()
-            menu.addAction("Cancel")
+            cancel_action = menu.addAction("Cancel")
+            cancel_action.setIcon(Cli3App.instance().icons.get('cancel'))
+            cancel_action.setEnabled(len(Cli3App.instance().session.running_requests(item.query())) > 0)
+            cancel_action.triggered.connect(lambda x: Cli3App.instance().session.cancel_query(item.query()))
+            menu.exec_(self.navTreeView.mapToGlobal(point))
+        elif isinstance(item, FolderTreeItem):
+            queries = [item.child(row).query() for row in range(item.child_count())
+                       if isinstance(item.child(row), QueryTreeItem)]
+            if len(queries) == 0:
+                return
+            menu = QtWidgets.QMenu()
+            action = menu.addAction("Open all")
+            action.setIcon(Cli3App.instance().icons.get('send'))
+            action.triggered.connect(lambda x: self.sendRequestsSignal.emit(queries))
             menu.exec_(self.navTreeView.mapToGlobal(point))
 
     def _folders_tree_dbl_click(self, index) -> None:
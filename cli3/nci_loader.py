@@ -0,0 +1,186 @@
+import os
+import typing
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+from PyQt5 import QtNetwork
+from PyQt5.QtCore import QObject, pyqtSignal, QEventLoop
+
+from cli3.decoding import Data, decode
+from cli3.network import Session, Reply
+
+
+def parse_nci_table(message: Data, data_file: str) -> pd.DataFrame:
+    """
+    Build nci dataframe from server answer and save it to file (runs in worker thread)
+    :param message: json answer with columns and rows (bytes or text)
+    :param data_file: csv file to save table
+    :return: nci dataframe
+    """
+    json_message = decode(message)
+    df = pd.DataFrame(data=json_message['rows'], columns=[column.upper() for column in json_message['columns']])
+    df.to_csv(data_file, index=False)
+    return _index_nci_table(df)
+
+
+def read_nci_table(data_file: str) -> pd.DataFrame:
+    """
+    Read saved nci dataframe (runs in worker thread)
+    :param data_file: csv file with table
+    :return: nci dataframe
+    """
+    return _index_nci_table(pd.read_csv(data_file, dtype=str))
+
+
+def _index_nci_table(df: pd.DataFrame) -> pd.DataFrame:
+    # Prevent convert index to int
+    df.set_index(df.columns[0], drop=False, inplace=True)
+    return df
+
+
+def translate_codes(codes: np.ndarray, table: typing.Optional[pd.DataFrame], column: str) -> np.ndarray:
+    """
+    Translate column of nci codes by hash lookup of codes in table index
+    :param codes: str codes or None, codes of other types are converted to str
+    :param table: nci dataframe indexed by code, None - table is not loaded
+    :param column: nci column with translation
+    :return: object array of translations, codes missing in table are kept
+    """
+    keys = codes if codes.dtype.kind == 'O' else codes.astype(str).astype(object)
+    if table is None or column not in table.columns:
+        return keys.copy()
+    names = table[column]
+    names = pd.Series(names.to_numpy(dtype=object), index=names.index.astype(str), dtype=object)
+    names = names[~names.index.duplicated()]
+    translated = pd.Series(keys, dtype=object).map(names).to_numpy(dtype=object, copy=True)
+    missing = pd.isnull(translated)
+    translated[missing] = keys[missing]
+    return translated
+
+
+class NciLoader(QObject):
+    """
+    Загрузка таблиц НСИ.
+    Tables are downloaded not more than max_workers at once,
+    parsed and saved on worker threads. Table requested by request/wait
+    is moved to the head of the queue
+    """
+    tableLoadedSignal = pyqtSignal(str)
+    tableErrorSignal = pyqtSignal(str, str)
+    progressSignal = pyqtSignal(int, int)
+    finishedSignal = pyqtSignal()
+    # Worker thread -> gui thread
+    _parsedSignal = pyqtSignal(str, object, object)
+
+    def __init__(self, session: Session, path: str, tables: dict, max_workers: int = 4):
+        """
+        :param session: session to download tables
+        :param path: directory of saved tables
+        :param tables: dict to put loaded tables into (name -> dataframe)
+        :param max_workers: max tables downloaded and parsed at once
+        """
+        super().__init__()
+        self._session = session
+        self._path = path
+        self._tables = tables
+        self._max_workers = max(1, max_workers)
+        self._executor = ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix='nci')
+        self._queue = deque()
+        self._running = set()
+        self._total = 0
+        self._done = 0
+        self._parsedSignal.connect(self._table_parsed)
+
+    def load(self, names: typing.List[str]) -> None:
+        """
+        Load tables
+        :param names: names of nci tables
+        :return:
+        """
+        os.makedirs(self._path, exist_ok=True)
+        for name in names:
+            if name not in self._tables and name not in self._queue and name not in self._running:
+                self._queue.append(name)
+                self._total += 1
+        self.progressSignal.emit(self._done, self._total)
+        self._start_next()
+        if self.is_finished():
+            self.finishedSignal.emit()
+
+    def is_finished(self) -> bool:
+        return len(self._queue) == 0 and len(self._running) == 0
+
+    def is_pending(self, name: str) -> bool:
+        return name in self._queue or name in self._running
+
+    def request(self, name: str) -> None:
+        """
+        Load table before others in queue
+        :param name: nci table name
+        :return:
+        """
+        if name in self._queue:
+            self._queue.remove(name)
+            self._queue.appendleft(name)
+
+    def wait(self, name: str) -> typing.Optional[pd.DataFrame]:
+        """
+        Wait for table in local event loop
+        :param name: nci table name
+        :return: table or None if it is not loaded
+        """
+        if self.is_pending(name):
+            self.request(name)
+            loop = QEventLoop()
+
+            def quit_on(loaded_name, *args):
+                if loaded_name == name:
+                    loop.quit()
+
+            self.tableLoadedSignal.connect(quit_on)
+            self.tableErrorSignal.connect(quit_on)
+            loop.exec_()
+            self.tableLoadedSignal.disconnect(quit_on)
+            self.tableErrorSignal.disconnect(quit_on)
+        return self._tables.get(name, None)
+
+    def _data_file(self, name: str) -> str:
+        return f"{self._path}/{name}.csv"
+
+    def _start_next(self) -> None:
+        while len(self._queue) > 0 and len(self._running) < self._max_workers:
+            name = self._queue.popleft()
+            self._running.add(name)
+            if os.path.exists(self._data_file(name)):
+                self._submit(name, read_nci_table, self._data_file(name))
+            else:
+                self._session.get_async(f'{self._session.NCI_API}/{name}') \
+                    .add_done_callback(lambda reply, name=name: self._table_received(name, reply))
+
+    def _table_received(self, name: str, reply: Reply) -> None:
+        err, message = reply.result()
+        if err == QtNetwork.QNetworkReply.NoError:
+            self._submit(name, parse_nci_table, reply.body, self._data_file(name))
+        else:
+            self._table_parsed(name, None, message)
+
+    def _submit(self, name: str, func, *args) -> None:
+        future = self._executor.submit(func, *args)
+        future.add_done_callback(
+            lambda f: self._parsedSignal.emit(name, None if f.exception() else f.result(),
+                                              str(f.exception()) if f.exception() else None))
+
+    def _table_parsed(self, name: str, df: typing.Optional[pd.DataFrame], error: typing.Optional[str]) -> None:
+        self._running.discard(name)
+        self._done += 1
+        if df is not None:
+            self._tables[name] = df
+            self.tableLoadedSignal.emit(name)
+        else:
+            self.tableErrorSignal.emit(name, error)
+        self.progressSignal.emit(self._done, self._total)
+        self._start_next()
+        if self.is_finished():
+            self.finishedSignal.emit()
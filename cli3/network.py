@@ -1,10 +1,23 @@
+import json
+import pickle
+import time
+import typing
 import uuid
-from threading import Lock
 
 from PyQt5 import QtNetwork, QtCore
-from PyQt5.QtCore import QObject, pyqtSignal, QEventLoop
+from PyQt5.QtCore import QObject, pyqtSignal, QEventLoop, QTimer
 
+from cli3.arrow_ipc import AnswerParser, accept_header
+from cli3.cache import MetadataCache, CacheEntry, ResultCache, ResultEntry, result_key
+from cli3.decoding import decode, to_text
+from cli3.compression import StreamDecoder, accept_encoding
+from cli3.endpoints import Endpoints
 from cli3.models import Query
+from cli3.paging import Pager, encode_page
+from cli3.retry import RetryPolicy, Attempt, parse_retry_after, RETRY_STATUSES
+from cli3.scheduler import RequestScheduler, Priority
+from cli3.stream import columnize
+from cli3.tracing import Spans, Phase
 
 
 class NetworkException(Exception):
@@ -12,39 +25,426 @@ class NetworkException(Exception):
         super().__init__(f"Network error {err} - {message}")
 
 
+class RequestState:
+    NEW = 'new'
+    QUEUED = 'queued'
+    RETRY = 'retry'
+    SENT = 'sent'
+    DONE = 'done'
+    ERROR = 'error'
+    CANCELLED = 'cancelled'
+    TIMEOUT = 'timeout'
+
+
+class ReplyWatchdog(QObject):
+    """
+    Aborts QNetworkReply if server does not answer in time
+    """
+
+    def __init__(self, reply: QtNetwork.QNetworkReply, connect_timeout: float = None, total_timeout: float = None):
+        """
+        :param reply: reply to watch (watchdog is deleted with it)
+        :param connect_timeout: seconds to wait for answer headers, None or 0 - no limit
+        :param total_timeout: seconds to wait for whole answer, None or 0 - no limit
+        """
+        super().__init__(reply)
+        self._reply = reply
+        # Expired timeout description
+        self.reason = None
+        self._connect_timer = self._start_timer(connect_timeout, 'no answer')
+        self._total_timer = self._start_timer(total_timeout, 'answer is not received')
+        if self._connect_timer is not None:
+            reply.metaDataChanged.connect(self._connect_timer.stop)
+
+    def _start_timer(self, timeout, reason):
+        if not timeout:
+            return None
+        timer = QTimer(self)
+        timer.setSingleShot(True)
+        timer.timeout.connect(lambda: self._expired(f'{reason} in {timeout:g} s'))
+        timer.start(int(timeout * 1000))
+        return timer
+
+    def _expired(self, reason: str) -> None:
+        self.reason = reason
+        self.stop()
+        self._reply.abort()
+
+    def stop(self) -> None:
+        for timer in (self._connect_timer, self._total_timer):
+            if timer is not None:
+                timer.stop()
+
+
 class Request(QObject):
     """
     Класс запроса по http
     """
     getDoneSignal = pyqtSignal(object)
 
-    def __init__(self, query: Query, params: dict = None):
+    def __init__(self, query: Query, params: dict = None, page: typing.Dict[str, str] = None):
         super().__init__()
         self.uuid = uuid.uuid4()
         self.query = query
         self.params = params
+        # Page params of paged cursor (Pager.page_params), None - whole answer
+        self.page = page
+        # BatchRequest which answer contains answer of request
+        self.batch = None
         self.error = 0
+        self.state = RequestState.NEW
+        # Timeouts in seconds (None - no limit)
+        self.connect_timeout = None
+        self.total_timeout = None
+        # Error string (answer text for requests saved by old versions)
         self.answer = None
+        # Parsed answer, cursors data are ColumnBuffers
+        self.content = None
+        # Received bytes (decompressed)
+        self.size = 0
+        # Transferred bytes and content encoding
+        self.transferred = 0
+        self.encoding = None
         self.url = None
         self.request = None
         self.reply = None
+        self._parser = None
+        self._decoder = None
+        self._watchdog = None
+        self._cancelled = False
+        # Request sending the same query for this one and requests waiting for its answer
+        self.leader = None
+        self.followers = []
+        # Scheduling
+        self.priority = Priority.INTERACTIVE
+        self.source = None
+        self.queued_at = None
+        self.sent_at = None
+        self.finished_at = None
+        self.wait_time = 0.0
+        self._enqueued_at = None
+        # Attempts to get answer, http status and Retry-After of last one
+        self.attempts = []
+        self.status = None
+        self.retry_after = None
+        # Session hook, returns True if failed attempt is retried
+        self.retry_handler = None
+        # Result is taken from ResultCache, unix time when it was stored
+        self.from_cache = False
+        self.cached_at = None
+        # Phase spans (queue, ttfb, download, decode, parse, model, paint)
+        self.spans = Spans()
+        self._first_byte_at = None
+
+    def result_key(self, scope: str = '') -> str:
+        """
+        Key of request result in ResultCache
+        :param scope: Session.get_cache_scope()
+        :return:
+        """
+        return result_key(self.query.id, self.query.get_values(self.params), scope)
+
+    def set_cached(self, content: dict, entry: ResultEntry) -> None:
+        """
+        Complete request with cached result
+        :param content: parsed answer
+        :param entry: cache entry of result
+        :return:
+        """
+        self.content = content
+        self.answer = None
+        self.error = QtNetwork.QNetworkReply.NoError
+        self.state = RequestState.DONE
+        self.size = entry.size
+        self.transferred = 0
+        self.encoding = None
+        self.from_cache = True
+        self.cached_at = entry.stored_at
+        self.queued_at = self.sent_at = self.finished_at = time.monotonic()
+
+    def cache_age(self) -> typing.Optional[float]:
+        """
+        Seconds since cached result was received from server
+        :return: age or None if result is not from cache
+        """
+        return time.time() - self.cached_at if self.from_cache else None
+
+    def key(self) -> str:
+        """
+        Canonical query string, same for identical requests
+        :return:
+        """
+        return self.query.make_request(params=self.params) + encode_page(self.page)
+
+    def follow(self, leader: 'Request') -> None:
+        """
+        Wait for answer of identical request instead of sending this one
+        :param leader: running request
+        :return:
+        """
+        self.leader = leader
+        self.url = leader.url
+        self.state = RequestState.SENT
+        leader.followers.append(self)
+
+    def enqueue(self) -> None:
+        """
+        Request is put to scheduler queue
+        :return:
+        """
+        now = time.monotonic()
+        if self.queued_at is None:
+            self.queued_at = now
+        self._enqueued_at = now
+        self.state = RequestState.QUEUED
+
+    def queue_time(self) -> float:
+        """
+        Seconds waited in scheduler queue (all attempts)
+        :return:
+        """
+        if self._enqueued_at is not None:
+            return self.wait_time + time.monotonic() - self._enqueued_at
+        return self.wait_time
+
+    def total_time(self) -> float:
+        """
+        Seconds from first queuing to answer
+        :return:
+        """
+        started = self.queued_at or self.sent_at
+        if started is None:
+            return 0.0
+        return (self.finished_at or time.monotonic()) - started
+
+    def server_time(self) -> float:
+        """
+        Seconds from send to answer
+        :return:
+        """
+        if self.sent_at is None:
+            return 0.0
+        return (self.finished_at or time.monotonic()) - self.sent_at
+
+    def share_result(self, leader: 'Request') -> None:
+        """
+        Take answer of leader request
+        :param leader: finished request
+        :return:
+        """
+        self.leader = None
+        self.error = leader.error
+        self.answer = leader.answer
+        self.content = leader.content
+        self.size = leader.size
+        self.transferred = leader.transferred
+        self.encoding = leader.encoding
+        self.state = leader.state
+        self.sent_at = leader.sent_at
+        self.finished_at = leader.finished_at
+        self.spans = leader.spans.copy()
+        self.getDoneSignal.emit(self)
 
     def send_get(self, nam: QtNetwork.QNetworkAccessManager, base_url):
-        self.url = base_url + '?' + self.query.make_request(params=self.params)
+        self.url = base_url + '?' + self.key()
         print('Send query', self.url)
+        self._parser = AnswerParser()
+        self._decoder = None
         self.request = QtNetwork.QNetworkRequest(QtCore.QUrl(self.url))
+        # Qt does not decode answer itself when Accept-Encoding is set
+        self.request.setRawHeader(b'Accept-Encoding', accept_encoding().encode())
+        # Arrow stream if pyarrow is installed and server supports it
+        self.request.setRawHeader(b'Accept', accept_header().encode())
+        self._cancelled = False
+        self.mark_sent(time.monotonic())
         self.reply = nam.get(self.request)
+        self._watchdog = ReplyWatchdog(self.reply, self.connect_timeout, self.total_timeout)
+        self.reply.metaDataChanged.connect(self.first_byte)
+        self.reply.readyRead.connect(self.read_chunk)
         self.reply.finished.connect(self.get_done)
 
+    def mark_sent(self, now: float) -> None:
+        """
+        Request is sent (itself or in batch)
+        :param now: time.monotonic of sending
+        :return:
+        """
+        self.state = RequestState.SENT
+        self.sent_at = now
+        if self._enqueued_at is not None:
+            self.wait_time += now - self._enqueued_at
+            self.spans.add(Phase.QUEUE, self._enqueued_at, now)
+            self._enqueued_at = None
+        self.finished_at = None
+        self.status = None
+        self.retry_after = None
+        self._first_byte_at = None
+
+    def first_byte(self, now: float = None) -> None:
+        """
+        Answer headers (first bytes) are received
+        :param now: time.monotonic, None - now
+        :return:
+        """
+        if self._first_byte_at is None:
+            self._first_byte_at = time.monotonic() if now is None else now
+            self.spans.add(Phase.TTFB, self.sent_at, self._first_byte_at)
+
+    def is_running(self) -> bool:
+        return self.reply is not None or self.leader is not None or self.batch is not None or \
+               self.state in (RequestState.QUEUED, RequestState.RETRY)
+
+    def cancel(self) -> bool:
+        """
+        Abort request
+        :return: True if request was running
+        """
+        if self.leader is not None or self.batch is not None or \
+                self.state in (RequestState.QUEUED, RequestState.RETRY):
+            # Stop waiting, leader (batch) goes on for others
+            if self.leader is not None:
+                self.leader.followers.remove(self)
+            self.leader = None
+            if self.batch is not None:
+                batch, self.batch = self.batch, None
+                batch.part_cancelled(self)
+            self.finished_at = time.monotonic()
+            self._enqueued_at = None
+            self.state = RequestState.CANCELLED
+            self.error = QtNetwork.QNetworkReply.OperationCanceledError
+            self.answer = 'Cancelled'
+            self.getDoneSignal.emit(self)
+            return True
+        if self.reply is None:
+            return False
+        self._cancelled = True
+        self.reply.abort()
+        return True
+
+    def read_chunk(self):
+        """
+        Parse received part of answer
+        :return:
+        """
+        if self.reply.error() == QtNetwork.QNetworkReply.NoError and self._parser is not None:
+            try:
+                self._feed(self.reply.readAll().data())
+            except ValueError as e:
+                # Stop parsing, error is reported when reply is finished
+                self._parser = None
+                self.answer = f'Bad answer: {e}'
+
+    def _feed(self, chunk: bytes) -> None:
+        self.first_byte()
+        if self._decoder is None:
+            self.encoding = bytes(self.reply.rawHeader(b'Content-Encoding')).decode() or None
+            self._decoder = StreamDecoder(self.encoding)
+            self._parser.set_content_type(bytes(self.reply.rawHeader(b'Content-Type')).decode() or None)
+        with self.spans.measure(Phase.DECODE):
+            data = self._decoder.decompress(chunk)
+        with self.spans.measure(Phase.PARSE):
+            self._parser.feed(data)
+
     def get_done(self):
+        self.reply.metaDataChanged.disconnect(self.first_byte)
+        self.reply.readyRead.disconnect(self.read_chunk)
         self.reply.finished.disconnect(self.get_done)
+        self._watchdog.stop()
+        self.finished_at = time.monotonic()
+        self.spans.add(Phase.DOWNLOAD, self._first_byte_at, self.finished_at)
         self.error = self.reply.error()
-        if self.error == QtNetwork.QNetworkReply.NoError:
-            buffer = self.reply.readAll()
-            self.answer = buffer.data().decode()
+        self.status = self.reply.attribute(QtNetwork.QNetworkRequest.HttpStatusCodeAttribute)
+        self.retry_after = bytes(self.reply.rawHeader(b'Retry-After')).decode() or None
+        if self._cancelled:
+            self.state = RequestState.CANCELLED
+            self.answer = 'Cancelled'
+        elif self._watchdog.reason is not None:
+            self.state = RequestState.TIMEOUT
+            self.error = QtNetwork.QNetworkReply.TimeoutError
+            self.answer = f'Timeout: {self._watchdog.reason}'
+        elif self.error == QtNetwork.QNetworkReply.NoError:
+            try:
+                if self._parser is None:
+                    raise ValueError(self.answer)
+                self._feed(self.reply.readAll().data())
+                with self.spans.measure(Phase.DECODE):
+                    data = self._decoder.flush()
+                with self.spans.measure(Phase.PARSE):
+                    self._parser.feed(data)
+                    self.content = self._parser.close()
+                self.answer = None
+            except ValueError as e:
+                self.error = QtNetwork.QNetworkReply.ProtocolFailure
+                self.answer = f'Bad answer: {e}'
+            if self._decoder is not None:
+                self.size = self._decoder.size
+                self.transferred = self._decoder.compressed_size
+                print(f'Query {self.query.name} received {self.transferred} bytes, '
+                      f'{self.size} decoded ({self.encoding or "identity"}, ratio {self.compression_ratio():.1f})')
         else:
             self.answer = self.reply.errorString()
+        if self.state == RequestState.SENT:
+            self.state = RequestState.DONE if self.error == QtNetwork.QNetworkReply.NoError else RequestState.ERROR
+        self._parser = None
+        self._decoder = None
+        self._watchdog = None
+        self.reply.deleteLater()
+        self.reply = None
+        self._complete()
+
+    def _complete(self) -> None:
+        """
+        Attempt is finished: retry it or deliver result to subscribers and followers
+        :return:
+        """
+        self.attempts.append(Attempt(self.sent_at, self.finished_at, self.error, self.status))
+        if self.retry_handler is not None and self.retry_handler(self):
+            return
         self.getDoneSignal.emit(self)
+        if self.state != RequestState.CANCELLED:
+            followers, self.followers = self.followers, []
+            for follower in followers:
+                follower.share_result(self)
+
+    def part_received(self, error: int, content: typing.Optional[dict], answer: typing.Optional[str],
+                      size: int, status: int = None) -> None:
+        """
+        Complete request with its part of batch answer
+        :param error: QNetworkReply error
+        :param content: parsed answer
+        :param answer: error message
+        :param size: size of part
+        :param status: http status of part
+        :return:
+        """
+        self.batch = None
+        self.finished_at = time.monotonic()
+        self.spans.add(Phase.DOWNLOAD, self._first_byte_at, self.finished_at)
+        self.error = error
+        self.content = content
+        self.answer = answer
+        self.status = status
+        self.size = self.transferred = size
+        self.state = RequestState.DONE if error == QtNetwork.QNetworkReply.NoError else RequestState.ERROR
+        self._complete()
+
+    def compression_ratio(self) -> float:
+        """
+        Decoded size / transferred size
+        :return:
+        """
+        return self.size / self.transferred if self.transferred > 0 else 1.0
+
+    def get_content(self) -> dict:
+        """
+        Parsed answer
+        :return: answer dict
+        """
+        if self.content is None and self.answer is not None and self.error == 0:
+            with self.spans.measure(Phase.PARSE):
+                self.content = decode(self.answer)
+            self.answer = None
+        return self.content
 
     def __str__(self):
         return self.query.name
@@ -57,30 +457,429 @@ class Request(QObject):
         # Remove the unpicklable entries.
         del state['request']
         del state['reply']
+        state.pop('_parser', None)
+        state.pop('_decoder', None)
+        state.pop('_watchdog', None)
+        state['leader'] = None
+        state['followers'] = []
+        state['retry_handler'] = None
+        state['source'] = None
+        state['batch'] = None
+        state['_first_byte_at'] = None
         return state
 
     def __setstate__(self, state):
         # Restore instance attributes (i.e., filename and lineno).
+        state.setdefault('content', None)
+        state.setdefault('size', len(state.get('answer', None) or ''))
+        state.setdefault('transferred', state['size'])
+        state.setdefault('encoding', None)
+        state.setdefault('_parser', None)
+        state.setdefault('_decoder', None)
+        state.setdefault('_watchdog', None)
+        state.setdefault('_cancelled', False)
+        state.setdefault('state', RequestState.DONE if state.get('error', 0) == 0 else RequestState.ERROR)
+        state.setdefault('leader', None)
+        state.setdefault('followers', [])
+        for name in ('source', 'queued_at', 'sent_at', 'finished_at', '_enqueued_at', 'status', 'retry_after',
+                     'retry_handler', 'connect_timeout', 'total_timeout'):
+            state.setdefault(name, None)
+        state.setdefault('priority', Priority.INTERACTIVE)
+        state.setdefault('wait_time', 0.0)
+        state.setdefault('attempts', [])
+        state.setdefault('page', None)
+        state.setdefault('batch', None)
+        state.setdefault('from_cache', False)
+        state.setdefault('cached_at', None)
+        state.setdefault('spans', Spans())
+        state.setdefault('_first_byte_at', None)
+        state.setdefault('request', None)
+        state.setdefault('reply', None)
         self.__dict__.update(state)
         # Restore the previously opened file's state. To do so, we need to
         # reopen it and read from it until the line count is restored.
         super().__init__()
 
 
-class Session(QObject):
+class BatchRequest(QObject):
+    """
+    Several query requests sent in one http request.
+    Answer is json lines {"index": i, "status": 200, "answer": {...}} (or "error": "message"),
+    every part is delivered to its Request as soon as it is received
+    """
+    getDoneSignal = pyqtSignal(object)
+
+    def __init__(self, requests: typing.List[Request]):
+        super().__init__()
+        self.requests = list(requests)
+        self.error = 0
+        self.url = None
+        self.reply = None
+        self.connect_timeout = None
+        self.total_timeout = None
+        self.size = 0
+        self.transferred = 0
+        self._lines = b''
+        self._decoder = None
+        self._watchdog = None
+        self._parts = 0
+        # Requests by index of part (cancelled ones too)
+        self._all = list(requests)
+        for request in self.requests:
+            request.batch = self
+
+    def send_post(self, nam: QtNetwork.QNetworkAccessManager, url: str) -> None:
+        self.url = url
+        print(f'Send batch of {len(self.requests)} queries', url)
+        http_request = QtNetwork.QNetworkRequest(QtCore.QUrl(url))
+        http_request.setHeader(QtNetwork.QNetworkRequest.ContentTypeHeader, 'application/json')
+        http_request.setRawHeader(b'Accept-Encoding', accept_encoding().encode())
+        body = json.dumps({'requests': [request.key() for request in self.requests]}).encode()
+        now = time.monotonic()
+        for part in self.requests:
+            part.url = url
+            part.mark_sent(now)
+        self.reply = nam.post(http_request, body)
+        self._watchdog = ReplyWatchdog(self.reply, self.connect_timeout, self.total_timeout)
+        self.reply.metaDataChanged.connect(self.first_byte)
+        self.reply.readyRead.connect(self.read_chunk)
+        self.reply.finished.connect(self.get_done)
+
+    def part_cancelled(self, request: Request) -> None:
+        """
+        Request does not wait for its part any more, batch is aborted if nobody waits
+        :param request: cancelled request
+        :return:
+        """
+        if request in self.requests:
+            self.requests.remove(request)
+        if len(self.requests) == 0:
+            if self.reply is not None:
+                self.reply.abort()
+            else:
+                # Batch is still queued
+                self.error = QtNetwork.QNetworkReply.OperationCanceledError
+                self.getDoneSignal.emit(self)
+
+    def first_byte(self) -> None:
+        now = time.monotonic()
+        for request in self.requests:
+            request.first_byte(now)
+
+    def read_chunk(self) -> None:
+        if self.reply.error() == QtNetwork.QNetworkReply.NoError:
+            self._feed(self.reply.readAll().data())
+
+    def _feed(self, chunk: bytes) -> None:
+        self.first_byte()
+        if self._decoder is None:
+            self._decoder = StreamDecoder(bytes(self.reply.rawHeader(b'Content-Encoding')).decode() or None)
+        try:
+            self._lines += self._decoder.decompress(chunk)
+        except ValueError as e:
+            self.error = QtNetwork.QNetworkReply.ProtocolFailure
+            print(f'Bad batch answer: {e}')
+            return
+        *lines, self._lines = self._lines.split(b'\n')
+        for line in lines:
+            self._part(line)
+
+    def _part(self, line: bytes) -> None:
+        """
+        Deliver answer part to its request
+        :param line: json line of part
+        :return:
+        """
+        if line.strip() == b'':
+            return
+        start = time.monotonic()
+        try:
+            part = decode(line)
+            request = self._request(part['index'])
+        except (ValueError, KeyError, TypeError, IndexError) as e:
+            print(f'Bad batch answer part: {e}')
+            return
+        self._parts += 1
+        if request.batch is not self:
+            # Cancelled
+            return
+        status = part.get('status', 200)
+        if status == 200 and isinstance(part.get('answer', None), dict):
+            content = columnize(part['answer'])
+            request.spans.add(Phase.PARSE, start)
+            request.part_received(QtNetwork.QNetworkReply.NoError, content, None, len(line), status)
+        else:
+            request.part_received(QtNetwork.QNetworkReply.UnknownServerError, None,
+                                  str(part.get('error', f'Bad answer part, status {status}')), len(line), status)
+
+    def _request(self, index: int) -> Request:
+        if not 0 <= index < len(self._all):
+            raise IndexError(f'No request {index} in batch')
+        return self._all[index]
+
+    def get_done(self) -> None:
+        self.reply.metaDataChanged.disconnect(self.first_byte)
+        self.reply.readyRead.disconnect(self.read_chunk)
+        self.reply.finished.disconnect(self.get_done)
+        self._watchdog.stop()
+        if self.error == QtNetwork.QNetworkReply.NoError:
+            self.error = self.reply.error()
+        if self._watchdog.reason is not None:
+            self.error = QtNetwork.QNetworkReply.TimeoutError
+            answer = f'Timeout: {self._watchdog.reason}'
+        else:
+            answer = self.reply.errorString()
+        if self.error == QtNetwork.QNetworkReply.NoError:
+            self._feed(self.reply.readAll().data())
+            try:
+                self._lines += self._decoder.flush() if self._decoder is not None else b''
+            except ValueError as e:
+                self.error = QtNetwork.QNetworkReply.ProtocolFailure
+                answer = f'Bad answer: {e}'
+            self._part(self._lines)
+            self._lines = b''
+        if self._decoder is not None:
+            self.size = self._decoder.size
+            self.transferred = self._decoder.compressed_size
+        print(f'Batch received {self._parts} parts of {len(self._all)}, {self.transferred} bytes')
+        self._watchdog = None
+        self.reply.deleteLater()
+        self.reply = None
+        # Requests without answer
+        for request in self.requests:
+            if request.batch is self:
+                if self.error == QtNetwork.QNetworkReply.NoError:
+                    request.part_received(QtNetwork.QNetworkReply.ProtocolFailure, None,
+                                          'No answer in batch', 0)
+                else:
+                    request.part_received(self.error, None, answer, 0)
+        self.getDoneSignal.emit(self)
+
+
+class Reply(QObject):
+    """
+    Ответ на асинхронный запрос метаданных (future)
+    Each call of Session.get_async owns its reply object, so many
+    requests may be in flight at once
+    """
+    finishedSignal = pyqtSignal(object)
+
+    def __init__(self, url: str, headers: typing.Dict[str, str] = None, timeout: float = None):
+        super().__init__()
+        self.url = url
+        self.request_headers = headers or {}
+        self.timeout = timeout
+        self.error = 0
+        # Answer bytes as received, text is decoded only if asked
+        self.body = None
+        self._answer = None
+        self.status = None
+        self.headers = {}
+        self.from_cache = False
+        self.reply = None
+        self._watchdog = None
+        self._finished = False
+        # Attempts made and Session hook, returns True if failed attempt is retried
+        self.attempts = 0
+        self.retry_handler = None
+        self._callbacks = []
+
+    def send_get(self, nam: QtNetwork.QNetworkAccessManager) -> None:
+        """
+        Send get request for url
+        :param nam: network access manager
+        :return:
+        """
+        request = QtNetwork.QNetworkRequest(QtCore.QUrl(self.url))
+        for name, value in self.request_headers.items():
+            request.setRawHeader(name.encode(), value.encode())
+        self.reply = nam.get(request)
+        self._watchdog = ReplyWatchdog(self.reply, total_timeout=self.timeout)
+        self.reply.finished.connect(self.get_done)
+
+    def cancel(self) -> bool:
+        """
+        Abort reply
+        :return: True if reply was running
+        """
+        if self.reply is None:
+            return False
+        self.reply.abort()
+        return True
+
+    def get_done(self) -> None:
+        """
+        Handle finished QNetworkReply
+        :return:
+        """
+        self.reply.finished.disconnect(self.get_done)
+        self._watchdog.stop()
+        self.attempts += 1
+        err = self.reply.error()
+        self.status = self.reply.attribute(QtNetwork.QNetworkRequest.HttpStatusCodeAttribute)
+        self.headers = {bytes(name).decode().lower(): bytes(value).decode()
+                        for name, value in self.reply.rawHeaderPairs()}
+        if self._watchdog.reason is not None:
+            err = QtNetwork.QNetworkReply.TimeoutError
+            answer = f'Timeout: {self._watchdog.reason}'
+        elif err == QtNetwork.QNetworkReply.NoError:
+            answer = self.reply.readAll().data()
+        else:
+            answer = self.reply.errorString()
+        self._watchdog = None
+        self.reply.deleteLater()
+        self.reply = None
+        if err != QtNetwork.QNetworkReply.NoError and self.retry_handler is not None and self.retry_handler(self, err):
+            return
+        self.set_result(err, answer)
+
+    def set_result(self, error: int, answer: typing.Union[str, bytes]) -> None:
+        """
+        Complete reply and call all subscribers
+        :param error: network error code
+        :param answer: answer bytes or text, error string
+        :return:
+        """
+        self.error = error
+        self.body = answer
+        self._answer = None
+        self._finished = True
+        callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback(self)
+        self.finishedSignal.emit(self)
+
+    def is_finished(self) -> bool:
+        return self._finished
+
+    @property
+    def answer(self) -> typing.Optional[str]:
+        if self._answer is None and self.body is not None:
+            self._answer = to_text(self.body)
+        return self._answer
+
+    def json(self, schema: str = None) -> typing.Any:
+        """
+        Parsed answer of finished reply, bytes are parsed without decoding to text
+        :param schema: typed schema name (see decoding.SCHEMAS)
+        :return:
+        """
+        return decode(self.body, schema)
+
+    def result(self) -> (int, str):
+        """
+        Result of finished reply
+        :return: tuple (err, answer)
+        """
+        if not self._finished:
+            raise RuntimeError(f'Reply for {self.url} is not finished')
+        return self.error, self.answer
+
+    def add_done_callback(self, callback: typing.Callable[['Reply'], None]) -> 'Reply':
+        """
+        Call callback(reply) when reply is finished (at once if it already is)
+        :param callback: callable with reply argument
+        :return: self
+        """
+        if self._finished:
+            callback(self)
+        else:
+            self._callbacks.append(callback)
+        return self
+
+    def wait(self) -> (int, str):
+        """
+        Wait for reply in local event loop.
+        Every call has own loop, so nested waits do not block each other
+        :return: tuple (err, answer)
+        """
+        if not self._finished:
+            loop = QEventLoop()
+            self.finishedSignal.connect(loop.quit)
+            loop.exec_()
+        return self.result()
+
+
+class CachedReply(Reply):
+    """
+    Reply stored to metadata cache.
+    Sends conditional request when stale cache entry exists
+    """
+
+    def __init__(self, url: str, cache: MetadataCache, entry: CacheEntry = None, timeout: float = None,
+                 scope: str = ''):
+        self.cache = cache
+        self.scope = scope
+        self._entry = entry
+        super().__init__(url, self._entry.validators() if self._entry is not None else None, timeout)
+
+    def set_result(self, error: int, answer: typing.Union[str, bytes]) -> None:
+        if error == QtNetwork.QNetworkReply.NoError:
+            if self.status == 304 and self._entry is not None:
+                # Not modified - answer from cache
+                self.cache.revalidate(self.url, self.headers, self.scope)
+                answer = self._entry.body
+                self.from_cache = True
+            else:
+                self.cache.put(self.url, to_text(answer), self.headers, self.scope)
+        super().set_result(error, answer)
+
+
+class ReplyGroup(QObject):
+    """
+    Group of replies, finished when all replies are finished
+    """
+    finishedSignal = pyqtSignal(object)
+
+    def __init__(self, replies: typing.List[Reply]):
+        super().__init__()
+        self.replies = list(replies)
+        self._pending = len(self.replies)
+        self._callbacks = []
+        for reply in self.replies:
+            reply.add_done_callback(self._reply_done)
+
+    def _reply_done(self, reply: Reply) -> None:
+        self._pending -= 1
+        if self._pending == 0:
+            callbacks, self._callbacks = self._callbacks, []
+            for callback in callbacks:
+                callback(self)
+            self.finishedSignal.emit(self)
+
+    def is_finished(self) -> bool:
+        return self._pending == 0
+
+    def add_done_callback(self, callback: typing.Callable[['ReplyGroup'], None]) -> 'ReplyGroup':
+        """
+        Call callback(group) when all replies are finished
+        :param callback: callable with group argument
+        :return: self
+        """
+        if self.is_finished():
+            callback(self)
+        else:
+            self._callbacks.append(callback)
+        return self
+
+    def wait(self) -> typing.List[Reply]:
+        """
+        Wait for all replies in local event loop
+        :return: finished replies
+        """
+        if not self.is_finished():
+            loop = QEventLoop()
+            self.finishedSignal.connect(loop.quit)
+            loop.exec_()
+        return self.replies
+
+
+class Session(QObject, Endpoints):
     """
     Класс дла хранения сессии связи с сервером профилей пользователей
     """
     _nam = QtNetwork.QNetworkAccessManager()
 
-    QUERY_API = '/api/docs/query'
-    TREE_API = '/api/docs/tree'
-    STYLE_API = '/api/docs/styles'
-    NCI_API = '/api/nci'
-    REQUEST_URL = '/api/docs/request'
-    LOGIN_URL = '/api/auth/signin'
-    LOGOUT_URL = '/api/auth/signout'
-
     loggedInSignal = pyqtSignal(int, str)
     loggedOutSignal = pyqtSignal(int, str)
     getDoneSignal = pyqtSignal(int, str)
@@ -88,13 +887,20 @@ class Session(QObject):
     requestDoneSignal = pyqtSignal(object)
     answerReceivedSignal = pyqtSignal(object)
     answerErrorSignal = pyqtSignal(object)
-
-    loop = QEventLoop()
-
-    query_lock = Lock()
+    queueChangedSignal = pyqtSignal()
+    # Phase spans of request are added (model build, first paint)
+    requestTracedSignal = pyqtSignal(object)
 
     requests = dict()
 
+    # Network errors worth to retry if server did not answer
+    TRANSIENT_ERRORS = (QtNetwork.QNetworkReply.ConnectionRefusedError,
+                        QtNetwork.QNetworkReply.RemoteHostClosedError,
+                        QtNetwork.QNetworkReply.TimeoutError,
+                        QtNetwork.QNetworkReply.TemporaryNetworkFailureError,
+                        QtNetwork.QNetworkReply.NetworkSessionFailedError,
+                        QtNetwork.QNetworkReply.ProxyTimeoutError)
+
     def _make_url(self, path) -> str:
         """
         Constructs url to session host and schema
@@ -104,19 +910,47 @@ class Session(QObject):
         return self._server + self._schema + path
 
     # server like http://host:port
-    def __init__(self, server, schema):
+    def __init__(self, server, schema, cache: MetadataCache = None,
+                 connect_timeout: float = None, total_timeout: float = None, max_requests_per_host: int = 4,
+                 retry_policy: RetryPolicy = None, result_cache: ResultCache = None):
         """
         Session for specified server and schema
         :param server: server like http://host:port
         :param schema: schema where user will work
+        :param cache: cache for metadata apis, None - memory cache with default settings
+        :param connect_timeout: seconds to wait for answer headers, None - no limit
+        :param total_timeout: seconds to wait for whole answer, None - no limit
+        :param max_requests_per_host: queries sent to server at once, others wait in queue
+        :param retry_policy: retries of failed idempotent requests, None - no retries
+        :param result_cache: cache of query results, None - results are not cached
         """
         super().__init__()
+        self.scheduler = RequestScheduler(self._dispatch, max_requests_per_host,
+                                          on_change=self.queueChangedSignal.emit)
+        self.cache = cache if cache is not None else MetadataCache()
+        self.connect_timeout = connect_timeout
+        self.total_timeout = total_timeout
+        self.retry_policy = retry_policy
+        self.result_cache = result_cache
         self._server = server if server.endswith('/') else server + '/'
         self._schema = schema[:-1] if schema.endswith('/') else schema
+        # Replies in flight (keep them alive until finished)
+        self._replies = set()
+        # Requests in flight by Request.key
+        self._inflight = dict()
+        # User of last login, None - not logged in
+        self._username = None
 
     def get_base_url(self):
         return self._make_url('')
 
+    def get_cache_scope(self) -> str:
+        """
+        Scope of cached metadata and results: server, schema and user
+        :return:
+        """
+        return json.dumps([self.get_base_url(), self._username])
+
     def login(self, username, password) -> None:
         """
         Send login query
@@ -125,23 +959,16 @@ class Session(QObject):
         :return:
         """
         uri = f'{self.LOGIN_URL}?username={username}&password={password}'
-        req = QtNetwork.QNetworkRequest(QtCore.QUrl(self._make_url(uri)))
-        self._nam.finished.connect(self.handle_login)
-        self._nam.get(req)
+        self._username = username
+        self.get_async(uri, retry=False).add_done_callback(self.handle_login)
 
-    def handle_login(self, reply) -> None:
+    def handle_login(self, reply: Reply) -> None:
         """
         Handle login answer
         :param reply: answer for login
         :return:
         """
-        self._nam.finished.disconnect(self.handle_login)
-        err = reply.error()
-        if err == QtNetwork.QNetworkReply.NoError:
-            bytes_string = reply.readAll()
-            self.loggedInSignal.emit(err, str(bytes_string, 'utf-8'))
-        else:
-            self.loggedInSignal.emit(err, reply.errorString())
+        self.loggedInSignal.emit(*reply.result())
 
     def logout(self) -> None:
         """
@@ -149,65 +976,336 @@ class Session(QObject):
         :return:
         """
         uri = f'{self.LOGOUT_URL}'
-        req = QtNetwork.QNetworkRequest(QtCore.QUrl(self._make_url(uri)))
-        self._nam.finished.connect(self.handle_logout)
-        self._nam.get(req)
+        self._username = None
+        self.get_async(uri, retry=False).add_done_callback(self.handle_logout)
 
-    def handle_logout(self, reply) -> None:
+    def handle_logout(self, reply: Reply) -> None:
         """
         Handle logout answer
-        :param reply: answer for login
+        :param reply: answer for logout
         :return:
         """
-        self._nam.finished.disconnect(self.handle_logout)
-        err = reply.error()
-        if err == QtNetwork.QNetworkReply.NoError:
-            bytes_string = reply.readAll()
-            self.loggedOutSignal.emit(err, str(bytes_string, 'utf-8'))
+        self.loggedOutSignal.emit(*reply.result())
+
+    def get_async(self, uri, revalidate: bool = False, retry: bool = True) -> Reply:
+        """
+        Async get url.
+        Metadata apis answers are taken from cache while fresh (reply is completed from event loop
+        like result cache answers, so callbacks never run inside the caller),
+        stale answers are revalidated with conditional request
+        :param uri: url to get
+        :param revalidate: do not use fresh cache entry, ask server if it is modified
+        :param retry: retry on transient errors (uri must be idempotent)
+        :return: reply (future) for uri
+        """
+        url = self._make_url(uri)
+        if not uri.startswith(self.CACHED_APIS):
+            reply = Reply(url, timeout=self.total_timeout)
         else:
-            self.loggedOutSignal.emit(err, reply.errorString())
+            scope = self.get_cache_scope()
+            entry = self.cache.get(url, scope)
+            if entry is not None and entry.is_fresh() and not revalidate:
+                reply = Reply(url)
+                reply.from_cache = True
+                QTimer.singleShot(0, lambda: reply.set_result(QtNetwork.QNetworkReply.NoError, entry.body))
+                return reply
+            reply = CachedReply(url, self.cache, entry, self.total_timeout, scope)
+        if retry and self.retry_policy is not None:
+            self.retry_policy.request_started()
+            reply.retry_handler = self._retry_reply
+        self._replies.add(reply)
+        reply.add_done_callback(self._replies.discard)
+        reply.send_get(self._nam)
+        return reply
+
+    def gather(self, uris: typing.List[str]) -> ReplyGroup:
+        """
+        Get several urls at once
+        :param uris: urls to get
+        :return: group of replies in order of uris
+        """
+        return ReplyGroup([self.get_async(uri) for uri in uris])
 
     def get(self, uri) -> (int, str):
         """
-        Sync get url
+        Sync get url (waits in local event loop)
         :param uri: url to get
         :return: tuple (err, answer)
         """
-        with self.query_lock:
-            req = QtNetwork.QNetworkRequest(QtCore.QUrl(self._make_url(uri)))
-            self._nam.finished.connect(self.loop.quit)
-            reply = self._nam.get(req)
-            self.loop.exec_()
-            self._nam.finished.disconnect(self.loop.quit)
-            err = reply.error()
-            if err == QtNetwork.QNetworkReply.NoError:
-                buffer = reply.readAll()
-                return err, buffer.data().decode()
-            else:
-                return err, reply.errorString()
+        return self.get_async(uri).wait()
 
-    def send_request(self, request: Request) -> None:
+    def _is_transient(self, error: int, status: typing.Optional[int]) -> bool:
         """
-        Async get request (helper func)
+        Failure may pass if request is repeated: network error first
+        (timeout after answer headers has status 200), then http status
+        :param error: QNetworkReply error
+        :param status: http status, None - server did not answer
+        :return:
+        """
+        if error in self.TRANSIENT_ERRORS:
+            return True
+        return status is not None and status in RETRY_STATUSES
+
+    def _retry_delay(self, attempts: int, error: int, status: typing.Optional[int],
+                     retry_after: typing.Optional[str]) -> typing.Optional[float]:
+        """
+        Delay before next attempt of failed request
+        :return: seconds or None if request is not retried
+        """
+        if self.retry_policy is None or not self._is_transient(error, status):
+            return None
+        return self.retry_policy.delay(attempts, parse_retry_after(retry_after))
+
+    def _retry_reply(self, reply: Reply, error: int) -> bool:
+        """
+        Resend metadata reply after backoff delay
+        :param reply: failed reply
+        :param error: QNetworkReply error
+        :return: True if reply will be resent
+        """
+        delay = self._retry_delay(reply.attempts, error, reply.status, reply.headers.get('retry-after', None))
+        if delay is None:
+            return False
+        print(f'Retry {reply.url} in {delay:.2f} s (attempt {reply.attempts + 1})')
+        QTimer.singleShot(int(delay * 1000), lambda: reply.send_get(self._nam))
+        return True
+
+    def _retry_request(self, request: Request) -> bool:
+        """
+        Queue failed request again after backoff delay
+        :param request: failed request
+        :return: True if request will be resent
+        """
+        if request.state not in (RequestState.ERROR, RequestState.TIMEOUT):
+            return False
+        delay = self._retry_delay(len(request.attempts), request.error, request.status, request.retry_after)
+        if delay is None:
+            return False
+        request.attempts[-1].delay = delay
+        request.state = RequestState.RETRY
+        # Free slot while waiting
+        self.scheduler.done(request)
+        print(f'Retry query {request.url} in {delay:.2f} s (attempt {len(request.attempts) + 1})')
+        QTimer.singleShot(int(delay * 1000), lambda: self._resubmit(request))
+        return True
+
+    def _resubmit(self, request: Request) -> None:
+        if request.state != RequestState.RETRY:
+            # Cancelled while waiting
+            return
+        request.enqueue()
+        self.scheduler.submit(request, self._server, request.priority, request.source)
+
+    def send_request(self, request: Request, priority: int = Priority.INTERACTIVE, source=None) -> None:
+        """
+        Async get request (helper func).
+        If identical request is running, request waits for its answer,
+        else request is queued by scheduler
+        :param request: Request to get
+        :param priority: scheduler Priority
+        :param source: request owner for fair queuing (window)
+        :return:
+        """
+        leader = self._inflight.get(request.key(), None)
+        if leader is not None and leader is not request and leader.is_running():
+            print('Join running query', leader.url or leader.query.name)
+            request.follow(leader)
+            return
+        self._inflight[request.key()] = request
+        request.getDoneSignal.connect(self._request_finished)
+        request.priority = priority
+        request.source = source
+        request.queued_at = None
+        request.sent_at = None
+        request.finished_at = None
+        request.wait_time = 0.0
+        request.attempts = []
+        request.from_cache = False
+        request.cached_at = None
+        request.spans = Spans()
+        if self.retry_policy is not None:
+            self.retry_policy.request_started()
+            request.retry_handler = self._retry_request
+        request.enqueue()
+        self.scheduler.submit(request, self._server, priority, source)
+
+    def _dispatch(self, request: Request) -> None:
+        """
+        Send request taken from scheduler queue
         :param request: Request to get
         :return:
         """
-        request.send_get(self._nam, self._make_url(self.REQUEST_URL))
+        request.connect_timeout = self.connect_timeout
+        request.total_timeout = self.total_timeout
+        if isinstance(request, BatchRequest):
+            request.send_post(self._nam, self._make_url(self.BATCH_URL))
+        else:
+            request.send_get(self._nam, self._make_url(self.REQUEST_URL))
+
+    def queue_position(self, request: Request) -> typing.Optional[int]:
+        """
+        Position of request in scheduler queue
+        :param request: queued request
+        :return: position (1 - next) or None if request is not queued
+        """
+        if request.batch is not None:
+            return self.scheduler.position(request.batch)
+        return self.scheduler.position(request)
 
-    def send_query(self, query: Query, params: dict = None) -> None:
+    def send_query(self, query: Query, params: dict = None, priority: int = Priority.INTERACTIVE,
+                   source=None, use_cache: bool = True) -> Request:
         """
         Send query.
-        Construct request, save request to dict, and send
+        Construct request, save request to dict, and send.
+        Fresh result from result cache is returned without sending
+        :param query: Query model
+        :param params: Params for query
+        :param priority: scheduler Priority
+        :param source: request owner for fair queuing (window)
+        :param use_cache: take result from result cache if it is there
+        :return: sent request
+        """
+        request = self._make_request(query, params)
+        if not (use_cache and self._answer_from_cache(request)):
+            self.send_request(request, priority, source)
+        self.requestSentSignal.emit(request)
+        return request
+
+    def _make_request(self, query: Query, params: dict = None) -> Request:
+        """
+        Request for query (first page of paged query) handled by query_done
         :param query: Query model
         :param params: Params for query
         :return:
         """
-        with self.query_lock:
-            request = Request(query=query, params=params)
-            self.requests[request.uuid] = request
-            request.getDoneSignal.connect(self.query_done)
-            self.send_request(request)
+        pager = Pager.from_definition(query.paging)
+        request = Request(query=query, params=params, page=pager.page_params() if pager is not None else None)
+        self.requests[request.uuid] = request
+        request.getDoneSignal.connect(self.query_done)
+        return request
+
+    def send_batch(self, queries: typing.List[typing.Tuple[Query, dict]], priority: int = Priority.INTERACTIVE,
+                   source=None) -> typing.List[Request]:
+        """
+        Send several queries in one http request.
+        Every query has its own Request and answer signals, cached results are not sent
+        :param queries: [(query, params)]
+        :param priority: scheduler Priority
+        :param source: request owner for fair queuing (window)
+        :return: requests in order of queries
+        """
+        requests = []
+        to_send = []
+        for query, params in queries:
+            request = self._make_request(query, params)
+            if not self._answer_from_cache(request):
+                to_send.append(request)
+            requests.append(request)
+        if len(to_send) == 1:
+            self.send_request(to_send[0], priority, source)
+        elif len(to_send) > 1:
+            batch = BatchRequest(to_send)
+            for request in to_send:
+                request.priority = priority
+                request.source = source
+                request.enqueue()
+            batch.getDoneSignal.connect(self._batch_finished)
+            self.scheduler.submit(batch, self._server, priority, source)
+        for request in requests:
             self.requestSentSignal.emit(request)
+        return requests
+
+    def _batch_finished(self, batch: BatchRequest) -> None:
+        """
+        Free scheduler slot of batch and cache results of its requests
+        :param batch: finished batch
+        :return:
+        """
+        batch.getDoneSignal.disconnect(self._batch_finished)
+        self.scheduler.done(batch)
+        for request in batch.requests:
+            self._cache_result(request)
+
+    def _answer_from_cache(self, request: Request) -> bool:
+        """
+        Complete request with cached result (done signal is emitted from event loop)
+        :param request: new request
+        :return: True if result is found
+        """
+        if self.result_cache is None or request.query.cache_ttl == 0 or request.page is not None:
+            return False
+        cached = self.result_cache.get(request.result_key(self.get_cache_scope()))
+        if cached is None:
+            return False
+        entry, content = cached
+        request.set_cached(content, entry)
+        print(f'Query {request.query.name} answered from cache, age {entry.age():.0f} s')
+        QTimer.singleShot(0, lambda: request.getDoneSignal.emit(request))
+        return True
+
+    def _cache_result(self, request: Request) -> None:
+        """
+        Store received result in result cache
+        :param request: done request
+        :return:
+        """
+        if self.result_cache is None or request.state != RequestState.DONE or request.content is None \
+                or request.page is not None:
+            # Pages are not cached, next pages must be of the same snapshot
+            return
+        try:
+            self.result_cache.put(request.result_key(self.get_cache_scope()), request.content, request.query.cache_ttl,
+                                  request.query.id)
+        except (OSError, pickle.PicklingError) as e:
+            print(f'Can not cache result of {request.query.name}: {e}')
+
+    def _request_finished(self, request: Request) -> None:
+        """
+        Remove request from running, resend cancelled request for its followers
+        :param request: finished request
+        :return:
+        """
+        request.getDoneSignal.disconnect(self._request_finished)
+        request.retry_handler = None
+        self.scheduler.done(request)
+        if self._inflight.get(request.key(), None) is request:
+            del self._inflight[request.key()]
+        self._cache_result(request)
+        if request.state == RequestState.CANCELLED and len(request.followers) > 0:
+            leader, followers = request.followers[0], request.followers[1:]
+            request.followers = []
+            leader.leader = None
+            self.send_request(leader, request.priority, request.source)
+            for follower in followers:
+                follower.follow(leader)
+
+    def running_requests(self, query: Query = None) -> typing.List[Request]:
+        """
+        Requests waiting for answer
+        :param query: only requests of query (by id), None - all
+        :return: list of requests
+        """
+        return [request for request in self.requests.values()
+                if query is None or request.query.id == query.id]
+
+    def cancel(self, request_uuid) -> bool:
+        """
+        Cancel request
+        :param request_uuid: uuid of sent request
+        :return: True if request was cancelled
+        """
+        request = self.requests.get(request_uuid, None)
+        return request is not None and request.cancel()
+
+    def cancel_query(self, query: Query) -> int:
+        """
+        Cancel all requests of query
+        :param query: query model
+        :return: count of cancelled requests
+        """
+        # Followers first, so cancelled leader is not resent for them
+        requests = sorted(self.running_requests(query), key=lambda request: request.leader is None)
+        return len([request for request in requests if request.cancel()])
 
     def query_done(self, request: Request) -> None:
         """
@@ -215,12 +1313,11 @@ class Session(QObject):
         :param request: Sent request
         :return:
         """
-        with self.query_lock:
-            request.getDoneSignal.disconnect(self.query_done)
-            self.requestDoneSignal.emit(request)
-            if request.error == QtNetwork.QNetworkReply.NoError:
-                self.answerReceivedSignal.emit(request)
-            else:
-                self.answerErrorSignal.emit(request)
-            if request.uuid in self.requests.keys():
-                del self.requests[request.uuid]
+        request.getDoneSignal.disconnect(self.query_done)
+        if request.uuid in self.requests.keys():
+            del self.requests[request.uuid]
+        self.requestDoneSignal.emit(request)
+        if request.error == QtNetwork.QNetworkReply.NoError:
+            self.answerReceivedSignal.emit(request)
+        else:
+            self.answerErrorSignal.emit(request)
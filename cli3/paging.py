@@ -0,0 +1,173 @@
+"""
+Постраничная загрузка курсоров.
+Paged cursor answer has "page" section:
+{"type": "cursor", "columns": [...], "data": [...],
+ "page": {"offset": 0, "limit": 1000, "total": 12345, "next": "token"}}.
+Next page is requested with offset/limit (offset mode) or after/limit (keyset mode),
+sort and filters are pushed down to server with the same request
+"""
+import json
+import typing
+import urllib.parse
+
+import numpy as np
+import pandas as pd
+
+from cli3.ingest import DATE_FORMATS, DATE_TYPES, strptime_format
+from cli3.models import Column
+
+
+class Pager(object):
+    """
+    State of paged cursor: loaded rows, next page position, server side sort and filters
+    """
+    OFFSET = 'offset'
+    KEYSET = 'keyset'
+
+    def __init__(self, mode: str = OFFSET, page_size: int = 1000):
+        """
+        :param mode: OFFSET or KEYSET
+        :param page_size: rows in one page
+        """
+        if mode not in (self.OFFSET, self.KEYSET):
+            raise ValueError(f'Unknown paging mode {mode}')
+        self.mode = mode
+        self.page_size = max(1, page_size)
+        # Sort columns [(name, ascending)], filters {name: value (None - is null)}
+        self.sort = []
+        self.filters = {}
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Start loading from first page
+        :return:
+        """
+        self.rows = 0
+        self.total = None
+        self.next_key = None
+        self.exhausted = False
+        self.loading = False
+        self.error = None
+
+    @staticmethod
+    def from_definition(paging: typing.Optional[dict]) -> typing.Optional['Pager']:
+        """
+        Pager from query "paging" definition like {"mode": "keyset", "page_size": 500}
+        :param paging: definition, None - query is not paged
+        :return: pager or None
+        """
+        if not paging:
+            return None
+        return Pager(paging.get('mode', Pager.OFFSET), int(paging.get('page_size', 1000)))
+
+    def has_more(self) -> bool:
+        return not self.exhausted
+
+    def failed(self, error: str) -> None:
+        """
+        Page was not received, stop loading until reset
+        :param error: error message
+        :return:
+        """
+        self.loading = False
+        self.exhausted = True
+        self.error = error
+
+    def set_sort(self, sort: typing.List[typing.Tuple[str, bool]]) -> None:
+        self.sort = list(sort)
+        self.reset()
+
+    def set_filters(self, filters: dict) -> None:
+        self.filters = dict(filters)
+        self.reset()
+
+    def page_params(self) -> typing.Dict[str, str]:
+        """
+        Params of request for next page
+        :return: name -> value
+        """
+        params = {'limit': str(self.page_size)}
+        if self.mode == self.KEYSET:
+            # Empty key - first page
+            params['after'] = self.next_key or ''
+        else:
+            params['offset'] = str(self.rows)
+        if len(self.sort) > 0:
+            params['sort'] = encode_sort(self.sort)
+        if len(self.filters) > 0:
+            params['filter'] = encode_filters(self.filters)
+        return params
+
+    def page_received(self, page: typing.Optional[dict], rows: int) -> None:
+        """
+        Update state with received page
+        :param page: "page" section of answer, None - whole result is received
+        :param rows: rows in page
+        :return:
+        """
+        self.loading = False
+        self.rows += rows
+        if page is None:
+            self.exhausted = True
+            return
+        self.total = page.get('total', self.total)
+        if self.mode == self.KEYSET:
+            self.next_key = page.get('next', None)
+            self.exhausted = self.next_key is None or rows == 0
+        elif self.total is not None:
+            self.exhausted = self.rows >= self.total
+        else:
+            self.exhausted = rows < self.page_size
+
+
+def encode_page(params: typing.Dict[str, str]) -> str:
+    """
+    Page params as url query part
+    :param params: Pager.page_params
+    :return: like &offset=0&limit=1000
+    """
+    return '&' + urllib.parse.urlencode(params) if params else ''
+
+
+def encode_sort(sort: typing.List[typing.Tuple[str, bool]]) -> str:
+    return ','.join(f'{name}:{"asc" if ascending else "desc"}' for name, ascending in sort)
+
+
+def decode_sort(value: str) -> typing.List[typing.Tuple[str, bool]]:
+    sort = []
+    for item in (value or '').split(','):
+        if item.strip() == '':
+            continue
+        name, _, order = item.partition(':')
+        sort.append((name.strip().upper(), order.strip().lower() != 'desc'))
+    return sort
+
+
+def encode_filters(filters: dict) -> str:
+    return json.dumps(filters, sort_keys=True, default=str, separators=(',', ':'))
+
+
+def filter_value(value, column: Column = None):
+    """
+    Filter value in answer format of column: dates are formatted by Column.format
+    (or first format of DATE_FORMATS), numpy scalars are python values
+    :param value: typed value of column (datetime64, Timestamp, numpy scalar, ...)
+    :param column: column model, None - type is unknown
+    :return: json value, None for null
+    """
+    if value is None or not isinstance(value, (str, bytes)) and np.ndim(value) == 0 and pd.isnull(value):
+        return None
+    if column is not None and column.type in DATE_TYPES:
+        date_format = strptime_format(column.format) or DATE_FORMATS[column.type][0]
+        return pd.Timestamp(value).strftime(date_format)
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def decode_filters(value: str) -> dict:
+    filters = json.loads(value) if value else {}
+    if not isinstance(filters, dict):
+        raise ValueError('Filter must be json object')
+    return {name.upper(): filter_value for name, filter_value in filters.items()}
@@ -0,0 +1,121 @@
+"""
+Повтор запросов при временных ошибках.
+Capped exponential backoff with jitter, Retry-After and retry budget
+"""
+import email.utils
+import random
+import time
+import typing
+
+# Http statuses worth to retry
+RETRY_STATUSES = (429, 502, 503, 504)
+
+
+class Attempt(object):
+    """
+    One attempt to get answer
+    """
+
+    def __init__(self, started: float, finished: float, error: int = 0, status: int = None, delay: float = None):
+        self.started = started
+        self.finished = finished
+        self.error = error
+        self.status = status
+        # Backoff before next attempt (None - no retry)
+        self.delay = delay
+
+    @property
+    def duration(self) -> float:
+        return self.finished - self.started
+
+    def __str__(self):
+        return f'Attempt error {self.error} status {self.status} in {self.duration:.2f} s'
+
+
+def parse_retry_after(value: typing.Optional[str], now: float = None) -> typing.Optional[float]:
+    """
+    Parse Retry-After header
+    :param value: delay seconds or http date
+    :param now: current unix time
+    :return: seconds to wait or None
+    """
+    if value is None or value.strip() == '':
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, date.timestamp() - (time.time() if now is None else now))
+
+
+class RetryBudget(object):
+    """
+    Retries are allowed while budget has tokens.
+    Every new request adds ratio of token, every retry takes one token
+    """
+
+    def __init__(self, ratio: float = 0.2, initial: float = 10, max_tokens: float = 100):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.tokens = min(initial, max_tokens)
+
+    def deposit(self) -> None:
+        self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class RetryPolicy(object):
+    """
+    When and after what delay to retry failed request
+    """
+
+    def __init__(self, max_attempts: int = 3, base_delay: float = 0.5, max_delay: float = 10,
+                 budget: RetryBudget = None, rnd: random.Random = None):
+        """
+        :param max_attempts: attempts including first one
+        :param base_delay: delay before second attempt (seconds)
+        :param max_delay: max delay, larger Retry-After stops retries
+        :param budget: retry budget, None - unlimited
+        :param rnd: random generator for jitter
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget
+        self._random = rnd or random.Random()
+
+    def delay(self, attempts: int, retry_after: float = None) -> typing.Optional[float]:
+        """
+        Delay before next attempt
+        :param attempts: attempts made
+        :param retry_after: delay asked by server
+        :return: seconds or None if request must not be retried
+        """
+        if attempts >= self.max_attempts:
+            return None
+        if retry_after is not None:
+            if retry_after > self.max_delay:
+                return None
+            delay = retry_after
+        else:
+            # Full jitter
+            delay = self._random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempts - 1)))
+        if self.budget is not None and not self.budget.withdraw():
+            return None
+        return delay
+
+    def request_started(self) -> None:
+        """
+        New (not retried) request is sent
+        :return:
+        """
+        if self.budget is not None:
+            self.budget.deposit()
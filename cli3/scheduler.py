@@ -0,0 +1,166 @@
+"""
+Планировщик запросов.
+Requests wait in queues by priority, not more than max_per_host
+requests are sent to one host at once
+"""
+import typing
+from collections import OrderedDict, deque
+
+
+class Priority:
+    INTERACTIVE = 0
+    REFRESH = 1
+    PREFETCH = 2
+
+    NAMES = {INTERACTIVE: 'interactive', REFRESH: 'refresh', PREFETCH: 'prefetch'}
+
+
+class _HostQueue(object):
+    """
+    Queues of one host: priority -> source -> items
+    """
+
+    def __init__(self):
+        self.running = set()
+        self.queues = {priority: OrderedDict() for priority in Priority.NAMES.keys()}
+
+    def push(self, item, priority: int, source) -> None:
+        queue = self.queues.setdefault(priority, OrderedDict())
+        queue.setdefault(source, deque()).append(item)
+
+    def pop(self, max_priority: int):
+        """
+        Take item of highest priority, sources of one priority take turns
+        :param max_priority: lowest allowed priority
+        :return: item or None
+        """
+        for priority in sorted(self.queues.keys()):
+            if priority > max_priority:
+                break
+            queue = self.queues[priority]
+            if len(queue) > 0:
+                source, items = next(iter(queue.items()))
+                item = items.popleft()
+                del queue[source]
+                if len(items) > 0:
+                    # Source goes to the end of turn
+                    queue[source] = items
+                return item
+        return None
+
+    def remove(self, item) -> bool:
+        for queue in self.queues.values():
+            for source, items in queue.items():
+                if item in items:
+                    items.remove(item)
+                    if len(items) == 0:
+                        del queue[source]
+                    return True
+        return False
+
+    def ordered(self) -> list:
+        """
+        Queued items in order they will be taken
+        :return:
+        """
+        result = []
+        for priority in sorted(self.queues.keys()):
+            items = [list(items) for items in self.queues[priority].values()]
+            for i in range(max((len(source_items) for source_items in items), default=0)):
+                result.extend(source_items[i] for source_items in items if i < len(source_items))
+        return result
+
+
+class RequestScheduler(object):
+    """
+    Queue of requests by priority with limit of running requests per host.
+    Requests of one priority from different sources are taken in turn
+    """
+
+    def __init__(self, dispatch: typing.Callable[[typing.Any], None], max_per_host: int = 4,
+                 reserved_interactive: int = 1, on_change: typing.Callable[[], None] = None):
+        """
+        :param dispatch: called to send item
+        :param max_per_host: max running items for one host
+        :param reserved_interactive: slots of host used by interactive items only
+        :param on_change: called when queues are changed
+        """
+        self._dispatch = dispatch
+        self.max_per_host = max(1, max_per_host)
+        self.reserved_interactive = min(max(0, reserved_interactive), self.max_per_host - 1)
+        self._on_change = on_change
+        self._hosts = dict()
+        self._item_hosts = dict()
+
+    def submit(self, item, host: str, priority: int = Priority.INTERACTIVE, source=None) -> None:
+        """
+        Put item into queue and send it if host has free slot
+        :param item: request
+        :param host: host of request
+        :param priority: Priority value
+        :param source: owner of request (window, user) for fair turns
+        :return:
+        """
+        host_queue = self._hosts.setdefault(host, _HostQueue())
+        self._item_hosts[id(item)] = host
+        host_queue.push(item, priority, source)
+        self._next(host)
+
+    def done(self, item) -> None:
+        """
+        Item is finished or cancelled, free its slot
+        :param item: request
+        :return:
+        """
+        host = self._item_hosts.pop(id(item), None)
+        if host is None:
+            return
+        host_queue = self._hosts[host]
+        if item in host_queue.running:
+            host_queue.running.discard(item)
+        else:
+            host_queue.remove(item)
+        self._next(host)
+
+    def is_queued(self, item) -> bool:
+        host = self._item_hosts.get(id(item), None)
+        return host is not None and item not in self._hosts[host].running
+
+    def position(self, item) -> typing.Optional[int]:
+        """
+        Position of queued item (1 - next to send)
+        :param item: request
+        :return: position or None if item is not queued
+        """
+        host = self._item_hosts.get(id(item), None)
+        if host is None:
+            return None
+        queued = self._hosts[host].ordered()
+        return queued.index(item) + 1 if item in queued else None
+
+    def queued(self, host: str = None) -> list:
+        """
+        Queued items in order they will be sent
+        :param host: host, None - all hosts
+        :return:
+        """
+        return [item for name, host_queue in self._hosts.items() if host is None or name == host
+                for item in host_queue.ordered()]
+
+    def running(self, host: str = None) -> list:
+        return [item for name, host_queue in self._hosts.items() if host is None or name == host
+                for item in host_queue.running]
+
+    def _next(self, host: str) -> None:
+        host_queue = self._hosts[host]
+        while len(host_queue.running) < self.max_per_host:
+            # Last slots are kept for interactive requests
+            free = self.max_per_host - len(host_queue.running)
+            max_priority = Priority.INTERACTIVE if free <= self.reserved_interactive else max(host_queue.queues)
+            item = host_queue.pop(max_priority)
+            if item is None:
+                break
+            host_queue.running.add(item)
+            self._dispatch(item)
+        if self._on_change is not None:
+            self._on_change()
@@ -1,13 +1,13 @@
-import json
-
 import pandas as pd
 from PyQt5 import QtWidgets, QtCore
 from PyQt5.QtCore import QObject
 from PyQt5.QtWidgets import QTableWidget, QTableWidgetItem
 
+from cli3.ingest import make_dataframe
 from cli3.mdi_window import MdiWindow
 from cli3.models import Column
 from cli3.network import Request
+from cli3.tracing import Phase
 from ui.series_window import Ui_SeriesWindow
 
 
@@ -21,21 +21,14 @@ class Cli3SeriesModel(QObject):
         Creqte source datafram(data, columns) (can not be changed),
         cast columns to column.type,
         create datafram for view (may be changed)
-        :param data: arra of arrays data
+        :param data: arra of arrays data or ColumnBuffers
         :param columns: columns json list
         """
         super().__init__()
         self._filters = {}
         self._columns = [Column(column) for column in columns]
-        self._source = pd.DataFrame(data, columns=[column.name for column in self._columns], dtype=str)
-        # Change columns datatypes
-        for name, type in [(column.name, column.type) for column in self._columns]:
-            if type == 'NUMBER':
-                self._source[name] = self._source[name].astype('float')
-            elif type in ['DATE', 'DATETIME', 'TIME']:
-                self._source[name] = pd.to_datetime(self._source[name])
-            elif type == 'BOOL':
-                self._source[name] = self._source[name].apply(lambda x: str(x).upper() == 'TRUE').astype('bool')
+        # Null INTEGER cells stay empty
+        self._source = make_dataframe(data, self._columns, nullable=True)
 
         self._visable_columns = [column.name for column in self._columns if
                                  column.title is not None and column.visable == True]
@@ -68,12 +61,14 @@ class SeriesWindow(MdiWindow, Ui_SeriesWindow):
 
     def set_request(self, request: Request):
         super().set_request(request)
-        self._answer = json.loads(request.answer)
+        self._answer = request.get_content()
         for attribute, value in self._answer.items():
             if value['type'] == 'cursor':
                 columns = value['columns']
                 data = value['data']
-                model = Cli3SeriesModel(data, columns)
+                with request.spans.measure(Phase.MODEL):
+                    model = Cli3SeriesModel(data, columns)
+                self.trace_first_paint(request)
                 self.set_model(model)
                 break
 
@@ -128,6 +123,7 @@ class SeriesWindow(MdiWindow, Ui_SeriesWindow):
             else:
                 table.setItem(row, 0, QTableWidgetItem(index))
 
-            table.setItem(row, 1, QTableWidgetItem(value))
+            # Typed values are shown as text
+            table.setItem(row, 1, QTableWidgetItem('' if pd.isnull(value) else str(value)))
             row += 1
         table.resizeColumnToContents(0)
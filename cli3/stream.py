@@ -0,0 +1,224 @@
+"""
+Потоковый разбор ответа на запрос.
+Rows of cursors ("data" arrays) are parsed as soon as they arrive
+and put into per-column buffers, the rest of answer is parsed at the end
+"""
+import codecs
+import json
+import re
+import typing
+
+from cli3.decoding import decode
+
+# Head token: string, structural char or literal (number, true, null ...)
+_TOKEN = re.compile(r'\s*(?:("[^"\\]*(?:\\.[^"\\]*)*")|([{}\[\]:,])|([^\s{}\[\]:,"]+))', re.DOTALL)
+_SKIP = re.compile(r'[\s,]*')
+
+
+class ColumnBuffers(object):
+    """
+    Cursor data stored by columns
+    """
+
+    def __init__(self, columns: typing.List[list] = None):
+        self.columns = columns if columns is not None else []
+        self.row_count = max((len(column) for column in self.columns), default=0)
+
+    def append_row(self, row: list) -> None:
+        """
+        Append row values to columns
+        :param row: row values
+        :return:
+        """
+        for i in range(len(self.columns), len(row)):
+            self.columns.append([None] * self.row_count)
+        for column, value in zip(self.columns, row):
+            column.append(value)
+        for i in range(len(row), len(self.columns)):
+            self.columns[i].append(None)
+        self.row_count += 1
+
+    def extend(self, other: 'ColumnBuffers') -> None:
+        """
+        Append rows of other buffers
+        :param other: buffers with next rows
+        :return:
+        """
+        for i in range(len(self.columns), len(other.columns)):
+            self.columns.append([None] * self.row_count)
+        for i, column in enumerate(self.columns):
+            if not isinstance(column, list):
+                # Compacted column
+                column = self.columns[i] = list(column)
+            column.extend(other.column(i))
+        self.row_count += other.row_count
+
+    def __len__(self):
+        return self.row_count
+
+    def compact(self, i: int, values) -> None:
+        """
+        Replace raw values of column by typed array of them, raw values are released
+        (buffers are complete, rows are not appended any more)
+        :param i: column index
+        :param values: typed array of column
+        :return:
+        """
+        if i < len(self.columns):
+            self.columns[i] = values
+
+    def column(self, i: int) -> list:
+        """
+        Column values
+        :param i: column index
+        :return: values (None for missing column)
+        """
+        if i < len(self.columns):
+            return self.columns[i]
+        return [None] * self.row_count
+
+    def to_dict(self, names: typing.List[str]) -> typing.Dict[str, list]:
+        """
+        Columns by names
+        :param names: column names in order of data
+        :return: name -> values dict
+        """
+        return {name: self.column(i) for i, name in enumerate(names)}
+
+    def rows(self) -> typing.Iterator[list]:
+        """
+        Iterate rows (for consumers of row oriented data)
+        :return:
+        """
+        for i in range(self.row_count):
+            yield [column[i] for column in self.columns]
+
+    @staticmethod
+    def from_rows(rows: typing.Iterable[list]) -> 'ColumnBuffers':
+        buffers = ColumnBuffers()
+        for row in rows:
+            buffers.append_row(row)
+        return buffers
+
+
+def columnize(answer: dict) -> dict:
+    """
+    Put ColumnBuffers in place of "data" arrays of already parsed answer
+    (same result as AnswerStreamParser gives)
+    :param answer: parsed answer
+    :return: answer
+    """
+    for value in answer.values():
+        if isinstance(value, dict) and isinstance(value.get('data', None), list):
+            value['data'] = ColumnBuffers.from_rows(value['data'])
+    return answer
+
+
+class AnswerStreamParser(object):
+    """
+    Incremental parser of answer like
+    {"name": {"type": "cursor", "columns": [...], "data": [[...], ...]}, ...}.
+    Every "data" array of arrays at second level becomes ColumnBuffers
+    """
+
+    def __init__(self):
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self._json = json.JSONDecoder()
+        self._buf = ''
+        self._pos = 0
+        self._head = []
+        self._depth = 0
+        self._keys = {}
+        self._last_string = None
+        self._rows = None
+        self._buffers = {}
+        self.size = 0
+
+    def feed(self, chunk: bytes) -> None:
+        """
+        Parse next part of answer
+        :param chunk: answer bytes
+        :return:
+        """
+        self.size += len(chunk)
+        self._buf = self._buf[self._pos:] + self._decoder.decode(chunk)
+        self._pos = 0
+        self._parse()
+
+    def close(self) -> dict:
+        """
+        Finish parsing
+        :return: answer with ColumnBuffers in place of cursors data
+        """
+        self._buf = self._buf[self._pos:] + self._decoder.decode(b'', final=True)
+        self._pos = 0
+        self._parse()
+        if self._rows is not None or self._buf[self._pos:].strip() != '':
+            raise ValueError(f'Unexpected end of answer at {self.size} bytes')
+        answer = decode(''.join(self._head))
+        for name, buffers in self._buffers.items():
+            answer[name]['data'] = buffers
+        return answer
+
+    def _parse(self) -> None:
+        while True:
+            if self._rows is not None:
+                if not self._parse_rows():
+                    return
+            elif not self._parse_head():
+                return
+
+    def _parse_head(self) -> bool:
+        """
+        Parse tokens until data array start or buffer end
+        :return: True if rows section started
+        """
+        buf = self._buf
+        while True:
+            match = _TOKEN.match(buf, self._pos)
+            if match is None or match.end() == len(buf) and match.group(3) is not None:
+                # Incomplete token (literal may continue in next chunk)
+                return False
+            self._pos = match.end()
+            string, char, literal = match.groups()
+            self._head.append(match.group(0))
+            if string is not None:
+                self._last_string = string
+            elif literal is not None:
+                continue
+            elif char in '{[':
+                if char == '[' and self._depth == 2 and self._keys.get(2) == '"data"':
+                    self._rows = ColumnBuffers()
+                    self._buffers[json.loads(self._keys[1])] = self._rows
+                    return True
+                self._depth += 1
+            elif char in '}]':
+                self._depth -= 1
+            elif char == ':':
+                self._keys[self._depth] = self._last_string
+
+    def _parse_rows(self) -> bool:
+        """
+        Parse rows of data array until its end or buffer end
+        :return: True if data array is finished
+        """
+        buf = self._buf
+        length = len(buf)
+        while True:
+            self._pos = _SKIP.match(buf, self._pos).end()
+            if self._pos >= length:
+                return False
+            if buf[self._pos] == ']':
+                self._pos += 1
+                self._head.append(']')
+                self._rows = None
+                return True
+            try:
+                row, end = self._json.raw_decode(buf, self._pos)
+            except json.JSONDecodeError:
+                # Row is not received completely
+                return False
+            if not isinstance(row, list):
+                raise ValueError(f'Row expected in data at {self.size} bytes')
+            self._rows.append_row(row)
+            self._pos = end
@@ -0,0 +1,51 @@
+"""
+Стили ячеек таблиц.
+Styles from /api/docs/styles are numbered and their brushes are made once,
+style columns of result are resolved into arrays of style numbers
+"""
+import typing
+
+import numpy as np
+import pandas as pd
+from PyQt5 import QtGui
+
+# Number of cell without style
+NO_STYLE = -1
+
+
+def _hex2rgb(hex_color: str) -> typing.Tuple[int, int, int]:
+    color = hex_color[-6:]
+    return tuple(int(color[i:i + 2], 16) for i in (0, 2, 4))
+
+
+class StyleTable(object):
+    """
+    Numbered styles with text (foreground) and background brushes
+    """
+
+    def __init__(self, styles: typing.Dict[str, dict]):
+        """
+        :param styles: style name -> {"text_color": "#rrggbb", "background_color": "#rrggbb"}
+        """
+        self.styles = styles
+        self.names = pd.Index(list(styles.keys()), dtype=object)
+        self.foreground = []
+        self.background = []
+        for style in styles.values():
+            self.foreground.append(QtGui.QBrush(QtGui.QColor(*_hex2rgb(style['text_color']))))
+            color = QtGui.QColor(*_hex2rgb(style['background_color']))
+            color.setAlphaF(0.5)
+            self.background.append(QtGui.QBrush(color))
+
+    def __len__(self):
+        return len(self.names)
+
+    def encode(self, values: np.ndarray) -> np.ndarray:
+        """
+        Style numbers of style column
+        :param values: style names or None
+        :return: int16 array (int32 for many styles), NO_STYLE for null and unknown styles
+        """
+        codes = self.names.get_indexer(pd.Index(values, dtype=object)) if len(self.names) > 0 else \
+            np.full(len(values), NO_STYLE)
+        return codes.astype(np.int16 if len(self.names) < np.iinfo(np.int16).max else np.int32)
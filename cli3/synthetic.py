@@ -0,0 +1,164 @@
+"""
+Генератор синтетических данных для сервера-заглушки.
+Cursors of given size and column types with STYLE columns and NCI-coded columns,
+nci tables and styles they refer to. Data is reproducible for the same seed
+"""
+import datetime
+import random
+import typing
+
+TYPES = ('INTEGER', 'NUMBER', 'STRING', 'DATE', 'DATETIME', 'TIME', 'BOOL')
+
+_EPOCH = datetime.datetime(2020, 1, 1)
+_WORDS = ('alpha', 'bravo', 'charlie', 'delta', 'echo', 'foxtrot', 'golf', 'hotel', 'india', 'juliet')
+
+
+class ColumnSpec(object):
+    """
+    Column of synthetic cursor
+    """
+
+    def __init__(self, name: str, type: str = 'STRING', nci: str = None, styled: bool = False,
+                 nulls: float = 0.0, visable: bool = True):
+        """
+        :param name: column name
+        :param type: one of TYPES
+        :param nci: name of nci table, column values are its codes
+        :param styled: column has STYLE_<name> column
+        :param nulls: fraction of null values
+        :param visable: column is shown
+        """
+        if type not in TYPES:
+            raise ValueError(f'Unknown column type {type}')
+        self.name = name.upper()
+        self.type = type
+        self.nci = nci
+        self.styled = styled
+        self.nulls = nulls
+        self.visable = visable
+
+    def definition(self) -> dict:
+        """
+        Column json like in cursor answer
+        :return:
+        """
+        definition = {'name': self.name, 'title': self.name.title(), 'type': self.type, 'visable': self.visable}
+        if self.type == 'NUMBER':
+            definition['format'] = '{:.2f}'
+        if self.nci is not None:
+            definition['nci'] = {'name': self.nci}
+            definition['nci_column'] = 'NAME'
+        return definition
+
+
+def make_specs(columns: int, types: typing.Sequence[str] = TYPES, nci_columns: int = 0,
+               style_columns: int = 0, nci_tables: typing.Sequence[str] = ('NCI_1',),
+               nulls: float = 0.0) -> typing.List[ColumnSpec]:
+    """
+    Specs of columns, first column is INTEGER key ID, then types by turn
+    :param columns: count of data columns including ID
+    :param types: types of columns by turn
+    :param nci_columns: count of NCI-coded STRING columns (added to columns)
+    :param style_columns: count of first data columns with STYLE_<name> column
+    :param nci_tables: nci tables used by NCI-coded columns by turn
+    :param nulls: fraction of null values in not key columns
+    :return:
+    """
+    specs = [ColumnSpec('ID', 'INTEGER')]
+    for i in range(1, columns):
+        specs.append(ColumnSpec(f'C{i}', types[(i - 1) % len(types)], nulls=nulls))
+    for i in range(nci_columns):
+        specs.append(ColumnSpec(f'N{i + 1}', 'STRING', nci=nci_tables[i % len(nci_tables)], nulls=nulls))
+    for spec in specs[1:style_columns + 1]:
+        spec.styled = True
+    return specs
+
+
+class Generator(object):
+    """
+    Generator of synthetic cursors, nci tables and styles
+    """
+
+    def __init__(self, seed: int = 0, styles: int = 8, nci_size: int = 100):
+        """
+        :param seed: random seed
+        :param styles: count of styles
+        :param nci_size: rows in nci table
+        """
+        self.seed = seed
+        self.nci_size = nci_size
+        self.style_names = [f'STYLE_{i}' for i in range(styles)]
+
+    def styles(self) -> dict:
+        """
+        Styles like /api/docs/styles answers
+        :return: style name -> colors
+        """
+        rnd = random.Random(self.seed)
+        return {name: {'text_color': f'#{rnd.randrange(0x1000000):06x}',
+                       'background_color': f'#{rnd.randrange(0x1000000):06x}'} for name in self.style_names}
+
+    def nci_code(self, number: int) -> str:
+        return f'{number % self.nci_size:05d}'
+
+    def nci_table(self, name: str) -> dict:
+        """
+        Nci table like /api/nci/<name> answers, first column is the code
+        :param name: table name
+        :return: {"columns": [...], "rows": [...]}
+        """
+        return {'columns': ['CODE', 'NAME'],
+                'rows': [[self.nci_code(i), f'{name.title()} {_WORDS[i % len(_WORDS)]} {i}']
+                         for i in range(self.nci_size)]}
+
+    def cursor(self, specs: typing.List[ColumnSpec], rows: int, row_style: bool = False) \
+            -> typing.Tuple[typing.List[dict], typing.List[list]]:
+        """
+        Columns and rows of cursor. Style columns are hidden and go after data columns
+        :param specs: data columns
+        :param rows: rows count
+        :param row_style: add STYLE column of whole row
+        :return: (columns json, rows)
+        """
+        columns = [spec.definition() for spec in specs]
+        styled = [spec for spec in specs if spec.styled]
+        columns += [{'name': f'STYLE_{spec.name}', 'type': 'STRING', 'visable': False} for spec in styled]
+        if row_style:
+            columns.append({'name': 'STYLE', 'type': 'STRING', 'visable': False})
+        rnd = random.Random(self.seed)
+        makers = [self._maker(spec, rnd) for spec in specs]
+        styles = self.style_names + [None]
+        data = []
+        for i in range(rows):
+            row = [make(i) for make in makers]
+            row += [rnd.choice(styles) for _ in styled]
+            if row_style:
+                row.append(styles[i % len(styles)])
+            data.append(row)
+        return columns, data
+
+    def _maker(self, spec: ColumnSpec, rnd: random.Random) -> typing.Callable[[int], typing.Any]:
+        make = self._value_maker(spec, rnd)
+        if spec.nulls <= 0:
+            return make
+        return lambda i: None if rnd.random() < spec.nulls else make(i)
+
+    def _value_maker(self, spec: ColumnSpec, rnd: random.Random) -> typing.Callable[[int], typing.Any]:
+        if spec.name == 'ID':
+            return lambda i: i
+        if spec.nci is not None:
+            return lambda i: self.nci_code(rnd.randrange(self.nci_size))
+        if spec.type == 'INTEGER':
+            return lambda i: rnd.randrange(-10000, 10000)
+        if spec.type == 'NUMBER':
+            return lambda i: round(rnd.uniform(-10000, 10000), 2)
+        if spec.type == 'DATE':
+            return lambda i: (_EPOCH + datetime.timedelta(days=rnd.randrange(2000))).strftime('%Y-%m-%d')
+        if spec.type == 'DATETIME':
+            return lambda i: (_EPOCH + datetime.timedelta(seconds=rnd.randrange(2000 * 86400))) \
+                .strftime('%Y-%m-%d %H:%M:%S')
+        if spec.type == 'TIME':
+            return lambda i: (_EPOCH + datetime.timedelta(seconds=rnd.randrange(86400))).strftime('%H:%M:%S')
+        if spec.type == 'BOOL':
+            return lambda i: rnd.random() < 0.5
+        return lambda i: f'{_WORDS[rnd.randrange(len(_WORDS))]} {rnd.randrange(1000)}'
@@ -1,59 +1,240 @@
-import json
+import typing
 from functools import partial
 
+import numpy as np
 import pandas as pd
-from PyQt5 import QtWidgets, QtCore, QtNetwork, QtGui
-from PyQt5.QtCore import QAbstractTableModel, Qt, QDateTime, QDate, QModelIndex, \
+from PyQt5 import QtWidgets, QtCore, QtNetwork
+from PyQt5.QtCore import QAbstractTableModel, Qt, QDateTime, QDate, QTime, QModelIndex, \
     QItemSelectionModel
 from PyQt5.QtGui import QPainter, QTextDocument
-from PyQt5.QtWidgets import QAbstractItemView
+from PyQt5.QtWidgets import QAbstractItemView, QApplication
 from openpyxl import Workbook
 from openpyxl.utils.dataframe import dataframe_to_rows
 
 from cli3.app import Cli3App
+from cli3.column_store import ColumnStore, ColumnValues, RowSorter
+from cli3.filters import Equals, FilterEngine, Predicate, runs
+from cli3.ingest import DATE_TYPES, arrays_to_dataframe
 from cli3.mdi_window import MdiWindow
 from cli3.models import Query, Column
+from cli3.nci_loader import translate_codes
 from cli3.network import Request
+from cli3.paging import Pager, filter_value
+from cli3.scheduler import Priority
+from cli3.styles import NO_STYLE
+from cli3.tracing import Phase
 from ui.table import Ui_TableWindow
 
 
+# Null of datetime64 as int64
+_NAT = np.iinfo(np.int64).min
+_DAY_NS = 86400 * 10 ** 9
+_EPOCH_DATE = QDate(1970, 1, 1)
+# Display value of BOOL cell (column shows check box)
+_NO_VALUE = QtCore.QVariant()
+# Style numbers of column are not resolved yet
+_UNRESOLVED = object()
+# Nci codes are translated in columns of other types only
+_NOT_TRANSLATED_TYPES = ('NUMBER', 'BOOL') + DATE_TYPES
+
+
 class Cli3TableModel(QAbstractTableModel):
     """
-    Модель таблицы для представления датафрейма pandas
+    Модель таблицы для представления результата.
+    Cells are read from typed column arrays through row permutation (visible row -> source row),
+    sort and filters change only the permutation
     """
+    # Filter changing more separate runs of rows resets model
+    MAX_ROW_RUNS = 32
 
-    def __init__(self, data, columns):
+    def __init__(self, data, columns, request: Request = None, page: dict = None):
         """
-        Creqte source datafram(data, columns) (can not be changed),
-        cast columns to column.type,
-        create datafram for view (may be changed)
-        :param data: arra of arrays data
+        Create column store of data (can not be changed) with columns cast to column.type
+        and row permutation for view (may be changed).
+        Hidden columns (styles, subquery params) are cast on first use
+        :param data: arra of arrays data or ColumnBuffers
         :param columns: columns json list
+        :param request: request of paged cursor (its first page)
+        :param page: "page" section of paged cursor answer, None - all rows are received
         """
         super().__init__()
-        self._filters = {}
+        self._filter_engine = None
+        # Rows left by filters (source rows mask), None - all rows
+        self._mask = None
+        # Sort keys [(visible column, ascending)], first is the main one
+        self._sort = []
         self._columns = [Column(column) for column in columns]
-        self._source = pd.DataFrame(data, columns=[column.name for column in self._columns], dtype=str)
-        # Change columns datatypes
-        for name, type in [(column.name, column.type) for column in self._columns]:
-            if type == 'NUMBER':
-                self._source[name] = self._source[name].astype('float')
-            elif type == 'INTEGER':
-                #                self._source[name] = self._source[name].round()
-                self._source[name] = self._source[name].astype('float')
-                self._source[name].fillna(float(0), inplace=True)
-                self._source[name] = self._source[name].astype(int)
-            elif type in ['DATE', 'DATETIME', 'TIME']:
-                self._source[name] = pd.to_datetime(self._source[name])
-            elif type == 'BOOL':
-                self._source[name] = self._source[name].apply(lambda x: str(x).upper() == 'TRUE').astype('bool')
-
         self._visable_columns = [column.name for column in self._columns if
                                  column.title is not None and column.visable == True]
-        self._dataframe = self._source.loc[:, self._visable_columns]
+        self._store = ColumnStore.from_data(data, self._columns, self._visable_columns)
+        # Visible column -> source column
+        self._visible = [self._store.position(name) for name in self._visable_columns]
+        self._order = np.arange(len(self._store))
+        self._bind_columns()
+        # Paged cursor: next pages are fetched from server, sort and filters are done by server
+        self._request = request
+        self._pager = Pager.from_definition(request.query.paging) if request is not None and page is not None else None
+        self._page_request = None
+        if self._pager is not None:
+            self._pager.page_received(page, len(self._store))
+
+    def _bind_columns(self) -> None:
+        """
+        Translate nci columns, make cell readers of visible columns and resolve style columns
+        (after store arrays are changed)
+        :return:
+        """
+        # Values shown, sorted and exported by source column of visible columns: translations of nci columns
+        self._values = {column: self._translate_nci(self._columns[column], self._store.column(name))
+                        for name, column in zip(self._visable_columns, self._visible)}
+        self._cells = [self._make_cell_reader(self._columns[column], self._values[column]) for column in self._visible]
+        self._sorter = RowSorter(self._values)
+        predicates = self._filter_engine.predicates.values() if self._filter_engine is not None else ()
+        self._filter_engine = FilterEngine(ColumnValues(self._store, self._values), predicates)
+        self._bind_styles()
+
+    def _translate_nci(self, column: Column, values: np.ndarray) -> np.ndarray:
+        """
+        Translate visible nci column once
+        :param column: column model
+        :param values: column array
+        :return: translations or values of not nci column
+        """
+        if not self._is_translated(column):
+            return values
+        return translate_codes(values, Cli3App.instance().nci.get(column.nci.get('name', None), None),
+                               column.nci_column.upper())
+
+    def _is_translated(self, column: Column) -> bool:
+        """
+        Column values are shown, sorted and filtered by nci translations (server has codes)
+        :param column: column model
+        :return:
+        """
+        return bool(column.nci) and column.nci_column is not None and column.type not in _NOT_TRANSLATED_TYPES \
+            and column.name in self._visable_columns
+
+    def _bind_styles(self) -> None:
+        """
+        Forget style numbers, style columns are resolved on first lookup
+        :return:
+        """
+        self._style_table = Cli3App.instance().get_style_table()
+        # Visible column -> style numbers of its cells, None - no style
+        self._style_codes = [_UNRESOLVED] * len(self._visable_columns)
+        # Style column name -> style numbers (STYLE column is shared by columns)
+        self._encoded_styles = {}
+
+    def _resolve_styles(self, column: int) -> typing.Optional[np.ndarray]:
+        """
+        Resolve style column into style numbers once: cell style column of visible column
+        or STYLE column of row
+        :param column: visible column
+        :return: style numbers or None if there is no style column
+        """
+        name = f'STYLE_{self._visable_columns[column]}'
+        if self._store.position(name) is None:
+            name = 'STYLE' if self._store.position('STYLE') is not None else None
+        if name is not None and name not in self._encoded_styles:
+            self._encoded_styles[name] = self._style_table.encode(self._store.column(name))
+        codes = self._encoded_styles[name] if name is not None else None
+        self._style_codes[column] = codes
+        return codes
+
+    def _make_cell_reader(self, column: Column, values: np.ndarray) -> typing.Callable[[int], typing.Any]:
+        """
+        Function of source row giving display value of column cell (None for null)
+        :param column: column model
+        :param values: column array
+        :return:
+        """
+        if column.type in ('DATE', 'DATETIME', 'TIME') and values.dtype.kind == 'M':
+            ticks = values.view(np.int64)
+            if column.type == 'DATE':
+                return lambda row: None if ticks[row] == _NAT else _EPOCH_DATE.addDays(int(ticks[row] // _DAY_NS))
+            if column.type == 'DATETIME':
+                return lambda row: None if ticks[row] == _NAT else _make_datetime(int(ticks[row]))
+            return lambda row: None if ticks[row] == _NAT else \
+                QTime.fromMSecsSinceStartOfDay(int(ticks[row] % _DAY_NS) // 10 ** 6)
+        if column.type == 'NUMBER':
+            return lambda row: None if values[row] != values[row] else float(values[row])
+        if column.type == 'BOOL':
+            return lambda row: _NO_VALUE
+        if values.dtype.kind == 'O':
+            return lambda row: values[row] if values[row] is None or type(values[row]) is str else str(values[row])
+        return lambda row: str(values[row])
+
+    # Paging section
+    def is_paged(self) -> bool:
+        return self._pager is not None
+
+    def canFetchMore(self, parent: QModelIndex = QModelIndex()) -> bool:
+        return self._pager is not None and self._pager.has_more() and not self._pager.loading
+
+    def fetchMore(self, parent: QModelIndex = QModelIndex()) -> None:
+        """
+        Request next page of paged cursor
+        :param parent:
+        :return:
+        """
+        if not self.canFetchMore(parent):
+            return
+        self._pager.loading = True
+        session = Cli3App.instance().session
+        self._page_request = Request(self._request.query, self._request.params, self._pager.page_params())
+        self._page_request.getDoneSignal.connect(self._page_received)
+        session.send_request(self._page_request, Priority.INTERACTIVE, self)
+        session.requestSentSignal.emit(self._page_request)
+
+    def _page_received(self, request: Request) -> None:
+        """
+        Append received page rows
+        :param request: page request
+        :return:
+        """
+        request.getDoneSignal.disconnect(self._page_received)
+        Cli3App.instance().session.requestDoneSignal.emit(request)
+        if request is not self._page_request:
+            # Page of previous sort or filters
+            return
+        self._page_request = None
+        if request.error != 0:
+            self._pager.failed(str(request.answer))
+            return
+        cursor = next((value for value in request.get_content().values() if value['type'] == 'cursor'), None)
+        if cursor is None:
+            self._pager.failed('No cursor in page answer')
+            return
+        page = ColumnStore.from_data(cursor['data'], self._columns, self._visable_columns)
+        if len(page) > 0:
+            start = len(self._store)
+            self.beginInsertRows(QModelIndex(), len(self._order), len(self._order) + len(page) - 1)
+            self._store.append(page)
+            self._order = np.concatenate([self._order, np.arange(start, len(self._store))])
+            self._bind_columns()
+            self.endInsertRows()
+        self._pager.page_received(cursor.get('page', None), len(page))
+
+    def _reload(self) -> None:
+        """
+        Drop loaded pages and fetch first page with current sort and filters
+        :return:
+        """
+        if self._page_request is not None:
+            self._page_request.cancel()
+            self._page_request = None
+        self.beginResetModel()
+        self._store.clear()
+        self._order = self._order[:0]
+        self._bind_columns()
+        self._pager.reset()
+        self.endResetModel()
+        self.fetchMore()
 
     def get_visable_dataframe(self):
-        visable_df = self._dataframe.copy()
+        visable_df = arrays_to_dataframe({name: self._values[column][self._order]
+                                          for name, column in zip(self._visable_columns, self._visible)},
+                                         pd.Index(self._order))
         visable_df.columns = [self.get_column_by_name(column).title for column in visable_df.columns]
         return visable_df
 
@@ -70,19 +251,19 @@ class Cli3TableModel(QAbstractTableModel):
 
     def get_source_column(self, column):
         """
-        Get column index in source dataframe
+        Get column index in source store
         :param column:
         :return:
         """
-        return self._source.columns.get_loc(self._dataframe.columns[column])
+        return self._visible[column]
 
     def get_source_row(self, row):
         """
-        Get row index in source dataframe
+        Get row index in source store
         :param column:
         :return:
         """
-        return self._dataframe.index[row]
+        return int(self._order[row])
 
     def get_source_index(self, index: QModelIndex) -> QModelIndex:
         """
@@ -90,189 +271,241 @@ class Cli3TableModel(QAbstractTableModel):
         :param index: visible index
         :return: source index
         """
-        if 0 <= index.row() < len(self._dataframe.values):
-            if 0 <= index.column() < len(self._dataframe.columns):
+        if 0 <= index.row() < len(self._order):
+            if 0 <= index.column() < len(self._visible):
                 row = self.get_source_row(index.row())
                 column = self.get_source_column(index.column())
                 return self.index(row, column)
         return QModelIndex()
 
     @property
-    def source(self):
-        return self._source
+    def store(self) -> ColumnStore:
+        return self._store
 
     # Filters section
-    def get_filters(self) -> dict:
+    def get_filters(self) -> typing.Dict[str, Predicate]:
         """
         Get all filter set on columns
-        :return: filters dict {column->value}
+        :return: filters dict {column name->predicate}
         """
-        return self._filters
+        return dict(self._filter_engine.predicates)
 
     def hasFilter(self, column) -> bool:
         """
         Check is column filtered
-        :param column: column name
+        :param column: visible column
         :return:
         """
-        column_name = self._dataframe.columns[column]
-        return column_name in self._filters.keys()
+        return self._filter_engine.has(self._visable_columns[column])
 
     def setFilter(self, column, value) -> None:
         """
-        Set filter value to column
-        :param column:
-        :param value:
+        Filter rows equal to value in column
+        :param column: visible column
+        :param value: cell value, None - column is null
         :return:
         """
         if not self.hasFilter(column):
-            column_name = self._dataframe.columns[column]
-            self._filters[column_name] = value
-        self._applyFilters()
+            self.add_filter(Equals(self._visable_columns[column], value))
 
     def resetFilter(self, column):
         """
-        Reset filter value to column
-        :param column:
-        :param value:
+        Reset filter of column
+        :param column: visible column
+        :return:
+        """
+        self.remove_filter(self._visable_columns[column])
+
+    def add_filter(self, predicate: Predicate) -> None:
+        """
+        Set predicate of column (previous predicate of the column is replaced)
+        :param predicate: predicate on column name (see cli3.filters)
         :return:
+        :raise ValueError: unknown column or predicate server can not apply to paged cursor
         """
-        if self.hasFilter(column):
-            column_name = self._dataframe.columns[column]
-            del self._filters[column_name]
+        if self._pager is not None:
+            self._server_filter_value(predicate)
+        self._filter_engine.set(predicate)
         self._applyFilters()
 
+    def remove_filter(self, name: str) -> None:
+        """
+        Remove predicate of column
+        :param name: column name
+        :return:
+        """
+        if self._filter_engine.remove(name) is not None:
+            self._applyFilters()
+
+    def clear_filters(self) -> None:
+        if len(self._filter_engine.predicates) > 0:
+            self._filter_engine.clear()
+            self._applyFilters()
+
     def _applyFilters(self) -> None:
         """
-        Make visible dataframe appling all filters on source
+        Make visible rows appling all filters on source
+        (paged cursor is filtered by server).
+        Rows going away or coming back are signaled as removed or inserted, if both - model is reset
         :return:
         """
-        self._dataframe = self._source.loc[:, self._visable_columns]
-        for column, value in self._filters.items():
-            if value is not None:
-                self._dataframe = self._dataframe[self._source[column] == value]
-            else:
-                self._dataframe = self._dataframe[self._source[column].isnull()]
+        if self._pager is not None:
+            self._pager.set_filters({name: self._server_filter_value(predicate)
+                                     for name, predicate in self._filter_engine.predicates.items()})
+            self._reload()
+            return
+        old_mask = self._mask
+        self._mask = self._filter_engine.mask()
+        if self._mask is None and old_mask is None:
+            return
+        if old_mask is None or self._mask is not None and not (self._mask & ~old_mask).any():
+            self._remove_rows(~self._mask[self._order])
+        elif self._mask is None or not (old_mask & ~self._mask).any():
+            order = self._make_order()
+            self._insert_rows(~old_mask[order], order)
+        else:
+            self.beginResetModel()
+            self._update_order()
+            self.endResetModel()
+
+    def _server_filter_value(self, predicate: Predicate):
+        """
+        Filter value of paged cursor in answer format, translation of nci column is sent as its code
+        :param predicate: predicate on column
+        :return: json value, None - is null
+        :raise ValueError: predicate can not be sent to server
+        """
+        value = predicate.server_value()
+        column = self.get_column_by_name(predicate.column)
+        if value is not None and column is not None and self._is_translated(column):
+            position = self._store.position(column.name)
+            codes = pd.unique(self._store.column(column.name)[self._values[position] == value])
+            if len(codes) != 1:
+                raise ValueError(f'Filter {predicate} does not match one code of nci column')
+            value = codes[0]
+        return filter_value(value, column)
+
+    def _remove_rows(self, removed: np.ndarray) -> None:
+        """
+        Remove visible rows by runs, bottom-up, or reset model if rows are scattered
+        :param removed: flags of visible rows
+        :return:
+        """
+        removed_runs = runs(removed, self.MAX_ROW_RUNS)
+        if removed_runs is None:
+            self.beginResetModel()
+            self._order = self._order[~removed]
+            self.endResetModel()
+            return
+        for first, last in reversed(removed_runs):
+            self.beginRemoveRows(QModelIndex(), first, last)
+            self._order = np.concatenate([self._order[:first], self._order[last + 1:]])
+            self.endRemoveRows()
 
-        self.layoutChanged.emit()
+    def _insert_rows(self, inserted: np.ndarray, order: np.ndarray) -> None:
+        """
+        Insert visible rows by runs, top-down, or reset model if rows are scattered
+        :param inserted: flags of rows of new order
+        :param order: new visible rows
+        :return:
+        """
+        inserted_runs = runs(inserted, self.MAX_ROW_RUNS)
+        if inserted_runs is None:
+            self.beginResetModel()
+            self._order = order
+            self.endResetModel()
+            return
+        positions = np.arange(len(order))
+        for first, last in inserted_runs:
+            self.beginInsertRows(QModelIndex(), first, last)
+            # Rows before the run are at their places already
+            self._order = order[~inserted | (positions <= last)]
+            self.endInsertRows()
+
+    def _update_order(self) -> None:
+        self._order = self._make_order()
+
+    def _make_order(self) -> np.ndarray:
+        """
+        Visible rows: sorted rows left by filters
+        :return:
+        """
+        if len(self._sort) > 0:
+            rows = self._sorter.rows([(self._visible[column], ascending) for column, ascending in self._sort])
+            return rows if self._mask is None else rows[self._mask[rows]]
+        return np.arange(len(self._store)) if self._mask is None else np.flatnonzero(self._mask)
 
     # Data section
     def rowCount(self, parent=None):
-        return len(self._dataframe.values)
+        return len(self._order)
 
     def columnCount(self, parent=None):
-        return self._dataframe.columns.size
+        return len(self._visible)
 
     def data(self, index, role=Qt.DisplayRole):
         if index.isValid():
-            if self._get_cell_value(index.row(), index.column()) is None:
+            row = self._order[index.row()]
+            value = self._cells[index.column()](row)
+            if value is None:
                 return QtCore.QVariant()
             if role == Qt.DisplayRole:
-                return self._get_cell_value(index.row(), index.column())
+                return value
             elif role == Qt.EditRole:
-                return self._get_cell_value(index.row(), index.column())
+                return value
             elif role == Qt.CheckStateRole:
-                return self._get_check_value(index.row(), index.column())
+                return self._get_check_value(row, index.column())
             elif role == Qt.ForegroundRole:
-                style = self._get_cell_style(index.row(), index.column())
-                if style is not None:
-                    text_color = self._hex2rgb(style['text_color'])
-                    color = QtGui.QColor(text_color[0], text_color[1], text_color[2])
-                    return QtGui.QBrush(color)
+                style = self._get_cell_style(row, index.column())
+                if style != NO_STYLE:
+                    return self._style_table.foreground[style]
             elif role == Qt.BackgroundRole:
-                style = self._get_cell_style(index.row(), index.column())
-                if style is not None:
-                    text_color = self._hex2rgb(style['background_color'])
-                    color = QtGui.QColor(text_color[0], text_color[1], text_color[2])
-                    color.setAlphaF(0.5)
-                    return QtGui.QBrush(color)
-            elif role == Qt.ToolTipRole:
-                return f'{self._get_cell_value(index.row(), index.column()).value()}'
-            elif role == Qt.WhatsThisRole:
-                return f'{self._get_cell_value(index.row(), index.column()).value()}'
+                style = self._get_cell_style(row, index.column())
+                if style != NO_STYLE:
+                    return self._style_table.background[style]
+            elif role == Qt.ToolTipRole or role == Qt.WhatsThisRole:
+                if value is _NO_VALUE:
+                    return f'{bool(self._values[self._visible[index.column()]][row])}'
+                return f'{value}'
         return QtCore.QVariant()
 
     def itemData(self, index: QModelIndex):
         if index.isValid():
-            if index.row() >= 0 and index.row() < len(self._dataframe.values):
-                if index.column() >= 0 and index.column() < len(self._dataframe.columns):
-                    return self._dataframe.iloc[index.row(), index.column()]
+            if index.row() >= 0 and index.row() < len(self._order):
+                if index.column() >= 0 and index.column() < len(self._visible):
+                    return self._values[self._visible[index.column()]][self._order[index.row()]]
         return None
 
-    def _hex2rgb(self, hex_color):
-        color = hex_color[-6:]
-        return tuple(int(color[i:i + 2], 16) for i in (0, 2, 4))
-
-    def _get_cell_style(self, row: int, column: int):
+    def _get_cell_style(self, row: int, column: int) -> int:
         """
-        Get cell style from hiden styeles column
-        :param row:
-        :param column:
-        :return:
+        Get cell style number resolved from hiden styeles columns
+        :param row: source row
+        :param column: visible column
+        :return: number in style table, NO_STYLE if cell has no style
         """
-        style = None
-        if 'STYLE' in self._source.columns:
-            style = self._source.loc[self.get_source_row(row), 'STYLE']
-        column_name = self._dataframe.columns[column]
-        if f'STYLE_{column_name}' in self._source.columns:
-            style = self._source.loc[self.get_source_row(row), f'STYLE_{column_name}']
-        if style is not None:
-            if style in Cli3App.instance().styles.keys():
-                return Cli3App.instance().styles[style]
-        return None
+        codes = self._style_codes[column]
+        if codes is _UNRESOLVED:
+            codes = self._resolve_styles(column)
+        return codes[row] if codes is not None else NO_STYLE
 
     def _get_cell_value(self, row: int, column: int):
         """
-        Get dataframe cell value converted to column type
-        :param row:
-        :param column:
-        :return:
+        Get cell value converted to column type
+        :param row: visible row
+        :param column: visible column
+        :return: display value, None for null
         """
-        if self._dataframe.iloc[row, column] is None:
-            return None
-        src_column = self.get_source_column(column)
-        if self._columns[src_column].type == 'DATETIME':
-            datetime = QDateTime(self._dataframe.iloc[row, column])
-            return QtCore.QVariant(datetime)
-        elif self._columns[src_column].type == 'DATE':
-            date = QDate(self._dataframe.iloc[row, column])
-            return QtCore.QVariant(date)
-        elif self._columns[src_column].type == 'TIME':
-            time = QDate(self._dataframe.iloc[row, column])
-            return QtCore.QVariant(time)
-        elif self._columns[src_column].type == 'NUMBER':
-            number = float(self._dataframe.iloc[row, column])
-            return QtCore.QVariant(number)
-        elif self._columns[src_column].type == 'BOOL':
-            boolean = bool(self._dataframe.iloc[row, column])
-            return QtCore.QVariant()  # QtCore.QVariant(boolean)
-        else:
-            value = str(self._dataframe.iloc[row, column])
-            nci = self._columns[src_column].nci
-            nci_column = self._columns[src_column].nci_column
-            if nci is not None and nci_column is not None:
-                value = self._get_value_from_nci(value, nci.get('name', None), nci_column.upper())
-            return QtCore.QVariant(value)
-
-    def _get_value_from_nci(self, key, nci_table, nci_column):
-        """
-        Translate value in nci column
-        :param key: value to translate
-        :param nci_table:
-        :param nci_column:
-        :return:
-        """
-        nci_df = Cli3App.instance().nci.get(nci_table, None)
-        if nci_df is not None:
-            if key in nci_df.index.values:
-                if nci_column in nci_df.columns:
-                    return nci_df.loc[key, nci_column]
-        return key
+        return self._cells[column](self._order[row])
 
     def _get_check_value(self, row: int, column: int):
+        """
+        Check state of BOOL cell
+        :param row: source row
+        :param column: visible column
+        :return:
+        """
         src_column = self.get_source_column(column)
         if self._columns[src_column].type == 'BOOL':
-            boolean = bool(self._dataframe.iloc[row, column])
+            boolean = bool(self._values[src_column][row])
             return Qt.Checked if boolean else Qt.Unchecked
         else:
             return QtCore.QVariant()
@@ -280,42 +513,80 @@ class Cli3TableModel(QAbstractTableModel):
     def headerData(self, column, orientation, role=QtCore.Qt.DisplayRole):
         if orientation == QtCore.Qt.Horizontal:
             if role == QtCore.Qt.DisplayRole:
-                col = next((c for c in self._columns if c.name == self._visable_columns[column]), None)
-                if col is not None:
-                    if '<br>' in col.title:
-                        return QtCore.QVariant(col.title.replace('<br>', '\n'))
-                    return QtCore.QVariant(col.title)
+                col = self._columns[self._visible[column]]
+                title = col.title.replace('<br>', '\n')
+                if len(self._sort) > 1:
+                    # Place of column in multi-column sort
+                    keys = [key for key, ascending in self._sort]
+                    if column in keys:
+                        title += f' {"▲" if self._sort[keys.index(column)][1] else "▼"}{keys.index(column) + 1}'
+                return QtCore.QVariant(title)
             elif role == QtCore.Qt.DecorationRole:
                 if self.hasFilter(column):
                     return Cli3App.instance().icons.get('filter')
         elif orientation == QtCore.Qt.Vertical:
             if role == QtCore.Qt.DisplayRole:
-                return QtCore.QVariant(str(self._dataframe.index[column] + 1))
+                return QtCore.QVariant(str(self._order[column] + 1))
         return QtCore.QVariant()
 
     # Sort section
+    def get_sort(self) -> typing.List[typing.Tuple[int, bool]]:
+        """
+        Current sort
+        :return: [(visible column, ascending)], first column is the main one
+        """
+        return list(self._sort)
+
+    def is_sortable(self, column: int) -> bool:
+        """
+        Server sorts nci columns of paged cursor by codes, not by translations shown, so they are not sorted
+        :param column: visible column
+        :return:
+        """
+        return self._pager is None or not self._is_translated(self._columns[self._visible[column]])
+
+    def set_sort(self, sort: typing.List[typing.Tuple[int, bool]]) -> None:
+        """
+        Stable sort by several columns: typed values, translations of nci columns
+        :param sort: [(visible column, ascending)], first column is the main one, empty - source order
+        :return:
+        :raise ValueError: nci column of paged cursor (see is_sortable)
+        """
+        for column, ascending in sort:
+            if not self.is_sortable(column):
+                raise ValueError(f'Column {self._visable_columns[column]} is not sorted by server')
+        self._sort = list(sort)
+        if self._pager is not None:
+            # Server sorts paged cursor by column values
+            self._pager.set_sort([(self._visable_columns[column], ascending) for column, ascending in self._sort])
+            self._reload()
+            return
+        self.layoutAboutToBeChanged.emit()
+        self._update_order()
+        self.layoutChanged.emit()
+
     def sort(self, column: int, order: Qt.SortOrder = ...) -> None:
         """
-        Sort dataframe by column with specified sort order
+        Sort rows by column with specified sort order
         :param column: Column to sort
         :param order: ort order
         :return:
         """
-        col = self._dataframe.columns[column]
-        # Temporary column with display value of column
-        self._dataframe['_FOR_SORT'] = self._dataframe.apply(
-            lambda row: self._get_cell_value(self._dataframe.index.get_loc(row.name), column), axis=1)
-        # Sort by temp column
-        self._dataframe.sort_values(by=['_FOR_SORT'], ascending=True if order == 0 else False,
-                                    inplace=True, axis=0)
-        # drop temp column
-        self._dataframe.drop('_FOR_SORT', axis=1, inplace=True)
-        self.layoutChanged.emit()
-        super().sort(column, order)
+        self.set_sort([(column, order == Qt.AscendingOrder)])
 
-    # Restore original dataframe order
+    # Restore original order
     def unsort(self, column):
-        self._dataframe.sort_index(inplace=True)
+        self.set_sort([])
+
+
+def _make_datetime(ticks: int) -> QDateTime:
+    """
+    Local date time of datetime64 value
+    :param ticks: nanoseconds since epoch
+    :return:
+    """
+    day, msecs = divmod(ticks // 10 ** 6, 86400 * 1000)
+    return QDateTime(_EPOCH_DATE.addDays(day), QTime.fromMSecsSinceStartOfDay(msecs))
 
 
 class TableWindow(MdiWindow, Ui_TableWindow):
@@ -333,58 +604,93 @@ class TableWindow(MdiWindow, Ui_TableWindow):
         self.tableView.setContextMenuPolicy(Qt.CustomContextMenu)
         self.tableView.customContextMenuRequested.connect(self._show_context_menu)
         self.tableView.setSelectionBehavior(QAbstractItemView.SelectItems)
+        # Drill down requests sent from this window
+        self._sent_requests = []
 
     def set_request(self, request: Request):
         super().set_request(request)
-        self._answer = json.loads(request.answer)
+        self._answer = request.get_content()
         for attribute, value in self._answer.items():
             if value['type'] == 'cursor':
                 columns = value['columns']
                 data = value['data']
-                model = Cli3TableModel(data, columns)
+                self._wait_nci(columns)
+                with request.spans.measure(Phase.MODEL):
+                    model = Cli3TableModel(data, columns, request, value.get('page', None))
+                self.trace_first_paint(request, self.tableView.viewport())
                 self.setModel(model)
                 break
 
+    def _wait_nci(self, columns):
+        """
+        Wait for nci tables used by columns if they are still loading
+        :param columns: columns json list
+        :return:
+        """
+        for column in columns:
+            nci = column.get('nci', None) or {}
+            if nci.get('name', None) is not None:
+                Cli3App.instance().get_nci(nci['name'])
+
     def _show_context_menu(self, point):
+        """
+        Request definitions of all subqueries at once and show menu when all are received
+        :param point: menu position
+        :return:
+        """
         index = self.tableView.indexAt(point)
         if not index.isValid():
             return
-        menu = QtWidgets.QMenu()
         column_index = self.tableView.model().get_source_column(index.column())
         column = self.tableView.model().get_column_by_index(column_index)
-        if column.has_subqueries():
-            for subquery in column.subqueries:
-                query = self._make_query(subquery, index)
-                if query is not None:
-                    action = menu.addAction(query.name)
-                    action.setIcon(Cli3App.instance().icons.get('table'))
-                    action.triggered.connect(partial(self._send_query, query))
-
-        if column.has_subqueries() and self._request.query.has_subqueries():
-            menu.addSeparator()
-
-        if self._request.query.has_subqueries():
-            for subquery in self._request.query.subqueries:
-                query = self._make_query(subquery, index)
-                if query is not None:
-                    action = menu.addAction(query.name)
-                    action.setIcon(Cli3App.instance().icons.get('table'))
-                    action.triggered.connect(partial(self._send_query, query))
-
-        if column.has_subqueries() or self._request.query.has_subqueries():
+        if not column.has_subqueries() and not self._request.query.has_subqueries():
+            return
+        subqueries = column.subqueries + self._request.query.subqueries
+        session = Cli3App.instance().session
+        group = session.gather([f'{session.QUERY_API}?id={subquery.id}' for subquery in subqueries])
+        group.add_done_callback(partial(self._exec_context_menu, point, index, len(column.subqueries)))
+
+    def _exec_context_menu(self, point, index, column_subqueries_count, group):
+        """
+        Show context menu with received subqueries
+        :param point: menu position
+        :param index: clicked index
+        :param column_subqueries_count: count of column subqueries first in group
+        :param group: replies with subqueries definitions
+        :return:
+        """
+        menu = QtWidgets.QMenu()
+        queries = []
+        for i, reply in enumerate(group.replies):
+            if i == column_subqueries_count and 0 < i:
+                menu.addSeparator()
+            query = self._make_query(reply, index)
+            if query is not None:
+                queries.append(query)
+                action = menu.addAction(query.name)
+                action.setIcon(Cli3App.instance().icons.get('table'))
+                action.triggered.connect(partial(self._send_query, query))
+        if len(queries) > 1:
             menu.addSeparator()
-            menu.addAction("Cancel")
-            menu.exec_(self.tableView.mapToGlobal(point))
-
-    def _make_query(self, query, index):
-        err, message = Cli3App.instance().session.get(f'{Cli3App.instance().session.QUERY_API}?id={query.id}')
+            open_all_action = menu.addAction("Open all")
+            open_all_action.setIcon(Cli3App.instance().icons.get('table'))
+            open_all_action.triggered.connect(partial(self._send_queries, queries))
+        menu.addSeparator()
+        cancel_action = menu.addAction("Cancel")
+        cancel_action.setIcon(Cli3App.instance().icons.get('cancel'))
+        cancel_action.setEnabled(self.locked or any(request.is_running() for request in self._sent_requests))
+        cancel_action.triggered.connect(self.cancel)
+        menu.exec_(self.tableView.mapToGlobal(point))
+
+    def _make_query(self, reply, index):
+        err, message = reply.result()
         if err == QtNetwork.QNetworkReply.NoError:
-            json_query = json.loads(message)
+            json_query = reply.json('query')
             query = Query(json_query)
-            row_idx = self.tableView.model().get_source_row(index.row())
-            row = self.tableView.model().source.loc[row_idx, :]
+            model = self.tableView.model()
+            row = model.store.row(model.get_source_row(index.row()), [param.name.upper() for param in query.in_params])
             for param in query.in_params:
-                if param.name.upper() in row.index:
+                if param.name.upper() in row:
                     param.value = row[param.name.upper()]
             return query
         return None
@@ -395,7 +701,28 @@ class TableWindow(MdiWindow, Ui_TableWindow):
         :param query: Query to send
         :return:
         """
-        Cli3App.instance().session.send_query(query)
+        request = Cli3App.instance().session.send_query(query, source=self)
+        self._sent_requests = [sent for sent in self._sent_requests if sent.is_running()] + [request]
+
+    def _send_queries(self, queries) -> None:
+        """
+        Send all subqueries in one batch
+        :param queries: Queries to send
+        :return:
+        """
+        requests = Cli3App.instance().session.send_batch([(query, None) for query in queries], source=self)
+        self._sent_requests = [sent for sent in self._sent_requests if sent.is_running()] + requests
+
+    def cancel(self) -> bool:
+        """
+        Cancel refresh and queries sent from this window
+        :return: True if any request was cancelled
+        """
+        cancelled = super().cancel()
+        for request in self._sent_requests:
+            cancelled = request.cancel() or cancelled
+        self._sent_requests = []
+        return cancelled
 
     def setModel(self, model: QAbstractTableModel):
         self.tableView.setModel(model)
@@ -406,31 +733,39 @@ class TableWindow(MdiWindow, Ui_TableWindow):
         super().setupUi(self)
         self.tableView.setSelectionMode(QAbstractItemView.SingleSelection)
         self.tableView.verticalHeader().setVisible(True)
-        self.tableView.setSortingEnabled(True)
+        # Model is sorted by header clicks, not by view
+        self.tableView.setSortingEnabled(False)
+        self.tableView.horizontalHeader().setSectionsClickable(True)
         self.tableView.horizontalHeader().setSortIndicatorShown(False)
         self.tableView.horizontalHeader().sectionClicked.connect(self._change_sort_order)
         # init menu actions
 
-    _last_sorted_column = -1
-    _last_sort_order = -1
-
     def _change_sort_order(self, column):
         """
-        Dance with buben to restore original sort state
-        :param column:
+        Click cycles column sort: ascending, descending, source order.
+        Shift+click adds column to sort keys (or cycles its order if it is sorted already)
+        :param column: clicked column
         :return:
         """
-        if self.tableView.horizontalHeader().sortIndicatorOrder() == Qt.AscendingOrder and \
-                column == self._last_sorted_column:
-            self.tableView.horizontalHeader().setSortIndicator(column, Qt.DescendingOrder)
-            self.tableView.horizontalHeader().setSortIndicatorShown(False)
-            self.tableView.model().unsort(column)
-            self._last_sorted_column = -1
-            self._last_sort_order = None
+        model = self.tableView.model()
+        if not model.is_sortable(column):
+            return
+        sort = model.get_sort()
+        orders = dict(sort)
+        ascending = True if column not in orders else False if orders[column] else None
+        if QApplication.keyboardModifiers() & Qt.ShiftModifier:
+            if column in orders:
+                sort = [(key, ascending if key == column else order) for key, order in sort]
+            else:
+                sort.append((column, ascending))
+            sort = [(key, order) for key, order in sort if order is not None]
         else:
-            self.tableView.horizontalHeader().setSortIndicatorShown(True)
-            self._last_sorted_column = column
-            self._last_sort_order = self.tableView.horizontalHeader().sortIndicatorOrder()
+            sort = [(column, ascending)] if ascending is not None else []
+        model.set_sort(sort)
+        header = self.tableView.horizontalHeader()
+        header.setSortIndicatorShown(len(sort) > 0)
+        if len(sort) > 0:
+            header.setSortIndicator(sort[0][0], Qt.AscendingOrder if sort[0][1] else Qt.DescendingOrder)
 
     def _selection_changed(self, new_selection, old_selection):
         Cli3App.instance().updateMainWindiwSignal.emit()
@@ -456,11 +791,12 @@ class TableWindow(MdiWindow, Ui_TableWindow):
             cell = self.tableView.model().itemData(indexes[0])
             if self.tableView.model().hasFilter(indexes[0].column()):
                 self.tableView.model().resetFilter(indexes[0].column())
-                if self._last_sorted_column != -1:
-                    # Resore last sort
-                    self.tableView.model().sort(self._last_sorted_column, self._last_sort_order)
             else:
-                self.tableView.model().setFilter(indexes[0].column(), cell)
+                try:
+                    self.tableView.model().setFilter(indexes[0].column(), cell)
+                except ValueError as e:
+                    QtWidgets.QMessageBox.warning(self, 'Filter', str(e))
+                    return
             idx = self.tableView.model().index(0, indexes[0].column())
             self.tableView.selectionModel().select(idx, QItemSelectionModel.ClearAndSelect)
             self.tableView.resizeColumnToContents(indexes[0].column())
@@ -1,5 +1,3 @@
-import json
-
 from cli3.mdi_window import MdiWindow
 from cli3.network import Request
 from ui.text_window import Ui_TextWindow
@@ -21,8 +19,9 @@ class TextWindow(MdiWindow, Ui_TextWindow):
 
     def set_request(self, request: Request):
         super().set_request(request)
-        self._answer = json.loads(request.answer)
+        self._answer = request.get_content()
         for attribute, value in self._answer.items():
             if value['type'] == 'text':
+                self.trace_first_paint(request, self.textBrowser.viewport())
                 self.textBrowser.setText(value.get('data', 'Bad text format'))
                 break
@@ -0,0 +1,118 @@
+"""
+Фазы выполнения запроса.
+Spans of request phases (time.monotonic seconds) and export to Chrome trace-event json
+(chrome://tracing, https://ui.perfetto.dev)
+"""
+import json
+import time
+import typing
+from contextlib import contextmanager
+
+
+class Phase:
+    QUEUE = 'queue'
+    TTFB = 'ttfb'
+    DOWNLOAD = 'download'
+    DECODE = 'decode'
+    PARSE = 'parse'
+    MODEL = 'model'
+    PAINT = 'paint'
+
+    ALL = (QUEUE, TTFB, DOWNLOAD, DECODE, PARSE, MODEL, PAINT)
+
+
+class Spans(object):
+    """
+    Spans of request phases, phase may have several spans (chunks, retries)
+    """
+
+    def __init__(self, spans: typing.List[typing.Tuple[str, float, float]] = None):
+        self.spans = list(spans or [])
+
+    def __len__(self):
+        return len(self.spans)
+
+    def add(self, phase: str, start: typing.Optional[float], end: float = None) -> None:
+        """
+        Add span
+        :param phase: Phase value
+        :param start: start time, None - span is not added
+        :param end: end time, None - now
+        :return:
+        """
+        if start is None:
+            return
+        end = time.monotonic() if end is None else end
+        if end >= start:
+            self.spans.append((phase, start, end))
+
+    @contextmanager
+    def measure(self, phase: str):
+        """
+        Add span of with block
+        :param phase: Phase value
+        :return:
+        """
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.add(phase, start)
+
+    def duration(self, phase: str) -> float:
+        """
+        Total seconds of phase
+        :param phase: Phase value
+        :return:
+        """
+        return sum(end - start for name, start, end in self.spans if name == phase)
+
+    def has(self, phase: str) -> bool:
+        return any(name == phase for name, start, end in self.spans)
+
+    def copy(self) -> 'Spans':
+        return Spans(self.spans)
+
+
+def chrome_trace(traces: typing.List[typing.Tuple[str, Spans]], merge_gap: float = 0.001) -> dict:
+    """
+    Chrome trace-event json, every request is a thread, phases are complete events
+    :param traces: [(request name, spans)]
+    :param merge_gap: consecutive spans of phase closer than gap (sec) are one event
+    :return: trace dict
+    """
+    origin = min((start for name, spans in traces for phase, start, end in spans.spans), default=0.0)
+    events = []
+    for tid, (name, spans) in enumerate(traces, 1):
+        events.append({'name': 'thread_name', 'ph': 'M', 'pid': 1, 'tid': tid, 'args': {'name': name}})
+        for phase, start, end, count in _merge(spans.spans, merge_gap):
+            events.append({'name': phase, 'cat': 'request', 'ph': 'X', 'pid': 1, 'tid': tid,
+                           'ts': round((start - origin) * 1e6, 1), 'dur': round((end - start) * 1e6, 1),
+                           'args': {'spans': count}})
+    return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+
+def _merge(spans: typing.List[typing.Tuple[str, float, float]], gap: float) \
+        -> typing.List[typing.Tuple[str, float, float, int]]:
+    merged = {}
+    result = []
+    for phase, start, end in sorted(spans, key=lambda span: span[1]):
+        last = merged.get(phase, None)
+        if last is not None and start - result[last][2] <= gap:
+            name, last_start, last_end, count = result[last]
+            result[last] = (name, last_start, max(last_end, end), count + 1)
+        else:
+            merged[phase] = len(result)
+            result.append((phase, start, end, 1))
+    return result
+
+
+def save_chrome_trace(path: str, traces: typing.List[typing.Tuple[str, Spans]]) -> None:
+    """
+    Save Chrome trace-event json file
+    :param path: file name
+    :param traces: [(request name, spans)]
+    :return:
+    """
+    with open(path, 'w', encoding='utf-8') as outp:
+        json.dump(chrome_trace(traces), outp)
@@ -0,0 +1,57 @@
+import asyncio
+import unittest
+
+from cli3.aio import AsyncSession, HttpError
+from cli3.mock_server import MockServer, demo_queries
+from cli3.stream import ColumnBuffers
+
+
+class AsyncSessionTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = MockServer(demo_queries(2500), arrow=False).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def _run(self, coroutine):
+        return asyncio.run(coroutine)
+
+    def test_queries_over_pooled_connections(self):
+        async def run():
+            async with AsyncSession(self.server.server, self.server.schema, max_connections=3) as session:
+                query = await session.query(1)
+                answers = await asyncio.gather(*[session.send_query(query) for i in range(12)])
+                return session.pool, answers
+
+        connections = self.server.connections_count
+        pool, answers = self._run(run())
+        self.assertEqual(len(answers), 12)
+        self.assertIsInstance(answers[0]['cursor']['data'], ColumnBuffers)
+        self.assertEqual(len(answers[0]['cursor']['data']), 2500)
+        self.assertLessEqual(pool.opened, 3)
+        self.assertLessEqual(self.server.connections_count - connections, 3)
+        self.assertGreater(pool.reused, 0)
+
+    def test_paged_query_is_loaded_whole(self):
+        async def run():
+            async with AsyncSession(self.server.server, self.server.schema) as session:
+                return await session.run_query(3)
+
+        data = self._run(run())['cursor']['data']
+        self.assertEqual(len(data), 2500)
+        self.assertEqual(data.column(0), list(range(2500)))
+
+    def test_error_status(self):
+        async def run():
+            async with AsyncSession(self.server.server, self.server.schema) as session:
+                await session.query(404)
+
+        with self.assertRaises(HttpError) as error:
+            self._run(run())
+        self.assertEqual(error.exception.status, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
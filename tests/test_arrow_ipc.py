@@ -0,0 +1,65 @@
+import asyncio
+import unittest
+import urllib.request
+
+from cli3.aio import AsyncSession
+from cli3.arrow_ipc import ARROW_STREAM, ArrowColumns, available, decode_answer, encode_answer
+from cli3.mock_server import MockServer, demo_queries
+from cli3.stream import ColumnBuffers
+
+COLUMNS = [{'name': 'ID', 'type': 'INTEGER'}, {'name': 'VALUE', 'type': 'NUMBER'},
+           {'name': 'DAY', 'type': 'DATE'}, {'name': 'FLAG', 'type': 'BOOL'}, {'name': 'NAME', 'type': 'STRING'}]
+ROWS = [[1, 1.5, '2022-01-31', True, 'a'], [None, None, None, None, None], [3, 2, '2022-02-01', 'FALSE', 4]]
+
+
+@unittest.skipUnless(available(), 'pyarrow is not installed')
+class ArrowAnswerTestCase(unittest.TestCase):
+    def test_round_trip(self):
+        answer = {'cursor': {'type': 'cursor', 'columns': COLUMNS, 'data': ROWS, 'page': {'total': 3}}, 'x': 1}
+        decoded = decode_answer(encode_answer(answer, batch_size=2))
+        cursor = decoded['cursor']
+        self.assertEqual(decoded['x'], 1)
+        self.assertEqual(cursor['columns'], COLUMNS)
+        self.assertEqual(cursor['page'], {'total': 3})
+        data = cursor['data']
+        self.assertIsInstance(data, ArrowColumns)
+        self.assertEqual(len(data), 3)
+        self.assertEqual(data.column(0), [1, None, 3])
+        self.assertEqual(data.column(3), [True, None, False])
+        self.assertEqual(data.column(4), ['a', None, '4'])
+        self.assertEqual(str(data.table.schema.field('DAY').type), 'timestamp[ms]')
+
+    def test_not_one_cursor(self):
+        self.assertIsNone(encode_answer({'text': {'type': 'text', 'value': 'x'}}))
+        with self.assertRaises(ValueError):
+            decode_answer(b'not arrow')
+
+    def test_ingest(self):
+        try:
+            from cli3.ingest import make_dataframe
+        except ImportError:
+            self.skipTest('pandas is not installed')
+        from cli3.models import Column
+        columns = [Column(column) for column in COLUMNS]
+        data = decode_answer(encode_answer({'cursor': {'type': 'cursor', 'columns': COLUMNS, 'data': ROWS}}))
+        df = make_dataframe(data['cursor']['data'], columns)
+        self.assertTrue(df.equals(make_dataframe(ColumnBuffers.from_rows(ROWS), columns)))
+
+    def test_mock_server(self):
+        async def run(server):
+            async with AsyncSession(server.server, server.schema) as session:
+                return await session.run_query(1), await session.run_query(2)
+
+        with MockServer(demo_queries(2500)) as server:
+            request = urllib.request.Request(f'{server.url}/api/docs/request?id=1')
+            with urllib.request.urlopen(request) as answer:
+                self.assertEqual(answer.headers['Content-Type'], 'application/json')
+            whole, paged = asyncio.run(run(server))
+        self.assertIsInstance(whole['cursor']['data'], ArrowColumns)
+        self.assertEqual(len(whole['cursor']['data']), 2500)
+        # Pages are concatenated
+        self.assertEqual(paged['cursor']['data'].column(0), list(range(2500)))
+
+
+if __name__ == '__main__':
+    unittest.main()
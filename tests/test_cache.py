@@ -0,0 +1,167 @@
+import os
+import tempfile
+import unittest
+
+from cli3.cache import MetadataCache, ResultCache, parse_cache_control, result_key
+from cli3.stream import ColumnBuffers
+
+_app = None
+
+
+def qt_application():
+    """
+    Application of Qt sessions, alive until tests end (network manager of sessions dies with it)
+    """
+    global _app
+    from PyQt5.QtCore import QCoreApplication
+    _app = QCoreApplication.instance() or _app or QCoreApplication([])
+    return _app
+
+
+class MetadataCacheTestCase(unittest.TestCase):
+    def test_fresh_and_stale(self):
+        cache = MetadataCache(ttl=60)
+        cache.put('http://host/api/docs/tree', 'tree', {'etag': '"v1"'})
+        entry = cache.get('http://host/api/docs/tree')
+        self.assertTrue(entry.is_fresh())
+        self.assertFalse(entry.is_fresh(entry.stored_at + 61))
+        self.assertEqual(entry.validators(), {'If-None-Match': '"v1"'})
+        self.assertEqual(cache.hits, 1)
+
+    def test_cache_control(self):
+        self.assertEqual(parse_cache_control('max-age=10, no-cache'), {'max-age': '10', 'no-cache': None})
+        cache = MetadataCache(ttl=60)
+        self.assertEqual(cache.put('a', 'body', {'cache-control': 'max-age=10'}).max_age, 10)
+        self.assertEqual(cache.put('b', 'body', {'cache-control': 'no-cache'}).max_age, 0)
+        self.assertIsNone(cache.put('c', 'body', {'cache-control': 'no-store'}))
+        self.assertNotIn('c', cache)
+
+    def test_revalidate(self):
+        cache = MetadataCache(ttl=0)
+        cache.put('a', 'body', {'last-modified': 'Sat, 01 Jan 2022 00:00:00 GMT'})
+        self.assertFalse(cache.get('a').is_fresh())
+        entry = cache.revalidate('a', {'cache-control': 'max-age=30'})
+        self.assertTrue(entry.is_fresh())
+        self.assertEqual(entry.body, 'body')
+        self.assertEqual(entry.validators(), {'If-Modified-Since': 'Sat, 01 Jan 2022 00:00:00 GMT'})
+
+    def test_lru_eviction(self):
+        cache = MetadataCache(max_entries=2)
+        cache.put('a', '1')
+        cache.put('b', '2')
+        cache.get('a')
+        cache.put('c', '3')
+        self.assertIn('a', cache)
+        self.assertNotIn('b', cache)
+        self.assertEqual(cache.evictions, 1)
+
+    def test_session_hit_is_deferred(self):
+        from cli3.network import Session
+        qt_application()
+        session = Session('http://localhost:1', '/main', cache=MetadataCache(ttl=60))
+        session.cache.put(session.get_base_url() + session.TREE_API, '{"folders": []}', {}, session.get_cache_scope())
+        received = []
+        reply = session.get_async(session.TREE_API).add_done_callback(received.append)
+        self.assertEqual(received, [])
+        self.assertFalse(reply.is_finished())
+        self.assertEqual(reply.wait(), (0, '{"folders": []}'))
+        self.assertEqual(received, [reply])
+        self.assertTrue(reply.from_cache)
+
+    def test_session_metadata_scope(self):
+        from cli3.network import Session
+        qt_application()
+        cache = MetadataCache(ttl=60)
+        alice = Session('http://localhost:1', '/main', cache=cache)
+        alice._username = 'alice'
+        url = alice.get_base_url() + alice.TREE_API
+        cache.put(url, '{"folders": ["alice"]}', {}, alice.get_cache_scope())
+        self.assertEqual(alice.get_async(alice.TREE_API).wait(), (0, '{"folders": ["alice"]}'))
+        bob = Session('http://localhost:1', '/main', cache=cache)
+        bob._username = 'bob'
+        self.assertIsNone(cache.get(url, bob.get_cache_scope()))
+        self.assertIsNone(cache.get(url))
+        self.assertFalse(bob.get_async(bob.TREE_API, retry=False).from_cache)
+
+    def test_persistence(self):
+        with tempfile.TemporaryDirectory() as path:
+            filename = os.path.join(path, 'cache.json')
+            cache = MetadataCache(path=filename)
+            cache.put('a', 'body', {'etag': '"v1"'})
+            cache.put('a', 'scoped', {}, 'alice')
+            cache.save()
+            restored = MetadataCache(path=filename)
+            self.assertEqual(restored.get('a').body, 'body')
+            self.assertEqual(restored.get('a', 'alice').body, 'scoped')
+            self.assertEqual(restored.get('a').etag, '"v1"')
+
+
+class ResultCacheTestCase(unittest.TestCase):
+    def test_result_key(self):
+        self.assertEqual(result_key(1, {'a': 1, 'b': '2'}), result_key(1, {'b': '2', 'a': 1}))
+        self.assertNotEqual(result_key(1, {'a': 1}), result_key(2, {'a': 1}))
+        self.assertNotEqual(result_key(1, {'a': 1}), result_key(1, {'a': 2}))
+        self.assertNotEqual(result_key(1, {'a': 1}, 'alice'), result_key(1, {'a': 1}, 'bob'))
+
+    def test_put_get_persist(self):
+        with tempfile.TemporaryDirectory() as path:
+            cache = ResultCache(path, ttl=60)
+            content = {'cursor': {'type': 'cursor', 'columns': [], 'data': ColumnBuffers.from_rows([[1, 'a']])}}
+            cache.put('k', content, query_id=1)
+            self.assertIsNone(cache.put('no', content, ttl=0))
+            cache = ResultCache(path, ttl=60)
+            entry, result = cache.get('k')
+            self.assertEqual(entry.query_id, 1)
+            self.assertEqual(list(result['cursor']['data'].rows()), [[1, 'a']])
+            self.assertIsNone(cache.get('no'))
+            self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_ttl_and_eviction(self):
+        with tempfile.TemporaryDirectory() as path:
+            cache = ResultCache(path, max_entries=2)
+            cache.put('old', 'x', ttl=1e-9)
+            self.assertIsNone(cache.get('old'))
+            self.assertEqual(cache.expirations, 1)
+            cache.put('a', 'x' * 100)
+            cache.put('b', 'x' * 100)
+            cache.get('a')
+            cache.put('c', 'x' * 100)
+            self.assertNotIn('b', cache)
+            self.assertEqual(cache.evictions, 1)
+            cache.max_bytes = cache.size
+            cache.put('d', 'x' * 100)
+            self.assertEqual(len(cache), 2)
+            self.assertLessEqual(cache.size, cache.max_bytes)
+            self.assertEqual(len([name for name in os.listdir(path) if name.endswith('.pickle')]), 2)
+            cache.invalidate()
+            self.assertEqual((len(cache), cache.size), (0, 0))
+
+    def test_session_scope(self):
+        from cli3.models import Query
+        from cli3.network import Request, RequestState, Session
+        qt_application()
+        with tempfile.TemporaryDirectory() as path:
+            cache = ResultCache(path, ttl=60)
+            query = Query({'id': 1, 'name': 'Q', 'url': '/query/1', 'params': {}})
+
+            def session(schema, username):
+                result = Session('http://localhost:1', schema, result_cache=cache)
+                result.login(username, 'secret')
+                return result
+
+            def request():
+                result = Request(query, {})
+                result.state = RequestState.DONE
+                result.content = {'answer': 'a'}
+                return result
+
+            alice = session('/main', 'alice')
+            alice._cache_result(request())
+            self.assertTrue(session('/main', 'alice')._answer_from_cache(request()))
+            self.assertFalse(session('/main', 'bob')._answer_from_cache(request()))
+            self.assertFalse(session('/other', 'alice')._answer_from_cache(request()))
+            alice.logout()
+            self.assertFalse(alice._answer_from_cache(request()))
+
+if __name__ == '__main__':
+    unittest.main()
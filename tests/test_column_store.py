@@ -0,0 +1,134 @@
+import unittest
+
+try:
+    import numpy as np
+    import pandas as pd
+    from cli3.column_store import ColumnStore, ColumnValues, RowSorter
+    from cli3.ingest import make_dataframe
+except ImportError:
+    np = None
+
+from cli3.models import Column
+from cli3.stream import ColumnBuffers
+
+
+@unittest.skipIf(np is None, 'numpy and pandas are not installed')
+class ColumnStoreTestCase(unittest.TestCase):
+    columns = [Column({'name': 'id', 'type': 'INTEGER'}), Column({'name': 'n', 'type': 'NUMBER'}),
+               Column({'name': 's', 'type': 'STRING'}), Column({'name': 'd', 'type': 'DATE'})]
+    rows = [[1, 1.5, 'a', '2022-01-31'], [2, None, None, None], [3, 3.5, 'c', '2022-03-01']]
+
+    def test_arrays(self):
+        store = ColumnStore.from_data(self.rows, self.columns)
+        self.assertEqual(len(store), 3)
+        self.assertEqual(store.names, ['ID', 'N', 'S', 'D'])
+        self.assertEqual(store.position('S'), 2)
+        self.assertIsNone(store.column('X'))
+        for values in store.arrays:
+            self.assertTrue(values.flags['C_CONTIGUOUS'])
+        self.assertEqual(store.column('ID').dtype, np.int64)
+        self.assertEqual(store.is_null('N').tolist(), [False, True, False])
+        self.assertEqual(store.is_null('S').tolist(), [False, True, False])
+
+    def test_row(self):
+        row = ColumnStore.from_data(self.rows, self.columns).row(0)
+        self.assertEqual(row['ID'], 1)
+        self.assertEqual(row['S'], 'a')
+        self.assertEqual(row['D'], pd.Timestamp('2022-01-31'))
+
+    def test_append(self):
+        store = ColumnStore.from_data(self.rows, self.columns)
+        store.append(ColumnStore.from_data([[4, 4.5, 'd', '2022-04-01']], self.columns))
+        self.assertEqual(len(store), 4)
+        self.assertEqual(store.column('S').tolist(), ['a', None, 'c', 'd'])
+        store.clear()
+        self.assertEqual(len(store), 0)
+        self.assertEqual(store.column('ID').dtype, np.int64)
+
+    def test_dataframe(self):
+        store = ColumnStore.from_data(self.rows, self.columns)
+        df = store.to_dataframe(['ID', 'S'], np.array([2, 0]))
+        self.assertEqual(list(df.columns), ['ID', 'S'])
+        self.assertEqual(list(df.index), [2, 0])
+        self.assertEqual(df['S'].tolist(), ['c', 'a'])
+        self.assertEqual(df['S'].dtype, object)
+        self.assertEqual(len(store.to_dataframe()), 3)
+
+    def test_lazy_columns(self):
+        store = ColumnStore.from_data(self.rows, self.columns, ['ID'])
+        self.assertEqual(len(store), 3)
+        self.assertEqual([store.is_converted(name) for name in store.names], [True, False, False, False])
+        self.assertEqual(store.row(2, ['D', 'X']), {'D': pd.Timestamp('2022-03-01')})
+        self.assertEqual([store.is_converted(name) for name in store.names], [True, False, False, True])
+        self.assertEqual(store.column('N').tolist()[0], 1.5)
+        self.assertTrue(store.is_converted('N'))
+        store.append(ColumnStore.from_data([[4, 4.5, 'd', '2022-04-01']], self.columns, ['ID']))
+        self.assertFalse(store.is_converted('S'))
+        self.assertEqual(len(store), 4)
+        self.assertEqual(store.column('S').tolist(), ['a', None, 'c', 'd'])
+        self.assertEqual(store.column('N').tolist()[3], 4.5)
+        store.clear()
+        self.assertEqual(store.column('ID').dtype, np.int64)
+        self.assertEqual(store.column('D').dtype.kind, 'M')
+
+    def test_compact_buffers(self):
+        rows = self.rows + [[None, 4.5, 'd', '2022-04-01']]
+        data = ColumnBuffers.from_rows(self.rows)
+        store = ColumnStore.from_data(data, self.columns, ['ID', 'N'])
+        # Raw values of converted columns are replaced by typed arrays
+        self.assertIs(data.column(0), store.column('ID'))
+        self.assertIs(data.column(1), store.column('N'))
+        self.assertIsInstance(data.column(2), list)
+        store.column('D')
+        self.assertIs(data.column(3), store.column('D'))
+        # Buffers give the same arrays again
+        again = ColumnStore.from_data(data, self.columns)
+        for name in again.names:
+            np.testing.assert_array_equal(again.column(name), store.column(name))
+        self.assertEqual(make_dataframe(data, self.columns, nullable=True)['ID'].tolist(), [1, 2, 3])
+        data.extend(ColumnBuffers.from_rows(rows[3:]))
+        self.assertEqual(data.column(1)[3], 4.5)
+        # Null INTEGER keeps raw values
+        data = ColumnBuffers.from_rows(rows)
+        ColumnStore.from_data(data, self.columns)
+        self.assertIsInstance(data.column(0), list)
+        self.assertTrue(make_dataframe(data, self.columns, nullable=True)['ID'].isnull()[3])
+
+    def test_column_values(self):
+        store = ColumnStore.from_data(self.rows, self.columns, [])
+        values = ColumnValues(store, {2: np.array(['x', 'y', 'z'], dtype=object)})
+        self.assertEqual(list(values), store.names)
+        self.assertEqual(values['S'].tolist(), ['x', 'y', 'z'])
+        self.assertFalse(store.is_converted('S'))
+        self.assertEqual(values['ID'].tolist(), [1, 2, 3])
+        self.assertNotIn('X', values)
+
+
+@unittest.skipIf(np is None, 'numpy and pandas are not installed')
+class RowSorterTestCase(unittest.TestCase):
+    values = [np.array([2, 1, 2, 1, 3]), np.array(['b', None, 'a', 'c', 'a'], dtype=object),
+              np.array([1.5, np.nan, 0.5, 2.5, np.nan])]
+
+    def test_sort(self):
+        sorter = RowSorter(self.values)
+        self.assertEqual(sorter.rows([(0, True)]).tolist(), [1, 3, 0, 2, 4])
+        self.assertEqual(sorter.rows([(0, False)]).tolist(), [4, 0, 2, 1, 3])
+        # Nulls go last in both orders
+        self.assertEqual(sorter.rows([(1, True)]).tolist(), [2, 4, 0, 3, 1])
+        self.assertEqual(sorter.rows([(2, False)]).tolist(), [3, 0, 2, 1, 4])
+
+    def test_multi_column(self):
+        sorter = RowSorter(self.values)
+        self.assertEqual(sorter.rows([(0, False), (1, True)]).tolist(), [4, 2, 0, 3, 1])
+        self.assertEqual(sorter.rows([(1, True), (0, False)]).tolist(), [4, 2, 0, 3, 1])
+
+    def test_cache(self):
+        sorter = RowSorter(self.values)
+        rows = sorter.rows([(0, True)])
+        self.assertIs(sorter.rows([(0, True)]), rows)
+        sorts = [[(0, False)], [(1, True)], [(1, False)], [(2, True)], [(2, False)]] + \
+                [[(column, True), ((column + 1) % 3, True)] for column in range(3)]
+        for sort in sorts[:RowSorter.MAX_PERMUTATIONS]:
+            sorter.rows(sort)
+        # Oldest sort is dropped
+        self.assertIsNot(sorter.rows([(0, True)]), rows)
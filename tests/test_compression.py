@@ -0,0 +1,48 @@
+import gzip
+import unittest
+import zlib
+
+from cli3.compression import StreamDecoder, accept_encoding
+
+
+class StreamDecoderTestCase(unittest.TestCase):
+    data = b'{"cursor": {"data": [["1", "2"]]}}' * 100
+
+    def _decode(self, decoder: StreamDecoder, body: bytes, chunk_size: int = 7) -> bytes:
+        data = b''.join(decoder.decompress(body[i:i + chunk_size]) for i in range(0, len(body), chunk_size))
+        return data + decoder.flush()
+
+    def test_accept_encoding(self):
+        self.assertTrue(accept_encoding().startswith('gzip, deflate'))
+
+    def test_identity(self):
+        decoder = StreamDecoder(None)
+        self.assertEqual(self._decode(decoder, self.data), self.data)
+        self.assertEqual(decoder.ratio, 1.0)
+
+    def test_gzip(self):
+        body = gzip.compress(self.data)
+        decoder = StreamDecoder('gzip')
+        self.assertEqual(self._decode(decoder, body), self.data)
+        self.assertEqual(decoder.compressed_size, len(body))
+        self.assertGreater(decoder.ratio, 10)
+
+    def test_gzip_members(self):
+        decoder = StreamDecoder('gzip')
+        self.assertEqual(self._decode(decoder, gzip.compress(b'abc') + gzip.compress(b'def'), 100), b'abcdef')
+
+    def test_deflate(self):
+        self.assertEqual(self._decode(StreamDecoder('deflate'), zlib.compress(self.data)), self.data)
+        raw = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+        body = raw.compress(self.data) + raw.flush()
+        self.assertEqual(self._decode(StreamDecoder('deflate'), body), self.data)
+
+    def test_errors(self):
+        with self.assertRaises(ValueError):
+            StreamDecoder('br')
+        with self.assertRaises(ValueError):
+            StreamDecoder('gzip').decompress(b'not gzip data')
+
+
+if __name__ == '__main__':
+    unittest.main()
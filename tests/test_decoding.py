@@ -0,0 +1,54 @@
+import unittest
+
+from cli3.decoding import available_backends, backend, benchmark, decode, mock_answers, set_backend, to_text
+from cli3.models import Query
+from cli3.network import Reply
+
+
+class DecodingTestCase(unittest.TestCase):
+
+    def test_backends_agree(self):
+        answers = mock_answers(50, 7)
+        for name, (body, schema) in answers.items():
+            expected = decode(body, using='json')
+            for using in available_backends():
+                self.assertEqual(decode(body, schema, using), expected, f'{name} by {using}')
+
+    def test_buffers(self):
+        for using in available_backends():
+            for data in (b'{"a": [1, 2]}', bytearray(b'{"a": [1, 2]}'), memoryview(b'{"a": [1, 2]}'), '{"a": [1, 2]}'):
+                self.assertEqual(decode(data, using=using), {'a': [1, 2]})
+
+    def test_bad_json(self):
+        for using in available_backends():
+            with self.assertRaises(ValueError):
+                decode(b'{"a": ', using=using)
+
+    def test_set_backend(self):
+        current = backend()
+        try:
+            set_backend('json')
+            self.assertEqual(backend(), 'json')
+            with self.assertRaises(ValueError):
+                set_backend('yaml')
+        finally:
+            set_backend(current)
+
+    @unittest.skipUnless('msgspec' in available_backends(), 'msgspec is not installed')
+    def test_typed_schema(self):
+        query = decode(b'{"id": 1, "name": "Q", "url": "/query/1", "params": {}, "extra": 1}', 'query', 'msgspec')
+        self.assertEqual(Query(query).id, 1)
+        self.assertNotIn('extra', query)
+        with self.assertRaises(ValueError):
+            decode(b'{"folders": [{"name": 1}]}', 'tree', 'msgspec')
+
+    def test_benchmark(self):
+        results = benchmark({'query': (b'{"id": 1, "name": "Q", "url": "/query/1"}', 'query')}, repeat=1)
+        self.assertEqual(set(results['query']), set(available_backends()))
+
+    def test_reply_body(self):
+        reply = Reply('http://localhost/api/docs/query')
+        reply.set_result(0, '{"id": 1}'.encode())
+        self.assertEqual(reply.json('query'), {'id': 1})
+        self.assertEqual(reply.result(), (0, '{"id": 1}'))
+        self.assertEqual(to_text(reply.body), '{"id": 1}')
@@ -0,0 +1,116 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from cli3.filters import Contains, Equals, FilterEngine, In, IsNull, Predicate, Range, ValueIndex, runs
+
+
+class FiltersTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.columns = {
+            'ID': np.arange(8, dtype=np.int64),
+            'NAME': np.array(['alpha', 'beta', None, 'Alpha', 'gamma', 'beta', 'delta', None], dtype=object),
+            'SUM': np.array([1.5, np.nan, 3.0, -2.0, 10.0, 0.0, np.nan, 7.25]),
+            'DAY': pd.to_datetime(['2022-01-01', None, '2022-03-01', '2022-01-15', None, '2021-12-31', '2022-02-01',
+                                   '2022-01-01']).to_numpy(),
+        }
+
+    def rows(self, engine):
+        mask = engine.mask()
+        return None if mask is None else np.flatnonzero(mask).tolist()
+
+    def test_predicates(self):
+        for indexed in (True, False):
+            engine = FilterEngine(self.columns)
+            engine.LOW_CARDINALITY = 1000 if indexed else 0
+            cases = [
+                (Equals('NAME', 'beta'), [1, 5]),
+                (Equals('NAME', None), [2, 7]),
+                (Equals('SUM', np.nan), [1, 6]),
+                (Equals('DAY', np.datetime64('2022-01-01')), [0, 7]),
+                (Equals('NAME', 'omega'), []),
+                (In('NAME', ['alpha', 'gamma', None]), [0, 2, 4, 7]),
+                (In('SUM', [0.0, 10.0]), [4, 5]),
+                (Range('SUM', 0, 7.25), [0, 2, 5, 7]),
+                (Range('SUM', 0, 7.25, include_low=False, include_high=False), [0, 2]),
+                (Range('SUM', None, 0), [3, 5]),
+                (Range('DAY', pd.Timestamp('2022-01-01'), pd.Timestamp('2022-01-31')), [0, 3, 7]),
+                (Range('NAME', 'b', 'd'), [1, 5]),
+                (Contains('NAME', 'alp'), [0, 3]),
+                (Contains('NAME', 'alp', case=True), [0]),
+                (Contains('NAME', '^(b|g)', regex=True), [1, 4, 5]),
+                (Contains('SUM', '.5'), [0]),
+                (IsNull('DAY'), [1, 4]),
+                (IsNull('NAME', null=False), [0, 1, 3, 4, 5, 6]),
+            ]
+            for predicate, expected in cases:
+                engine.clear()
+                engine.set(predicate)
+                self.assertEqual(self.rows(engine), expected, f'{predicate} indexed={indexed}')
+
+    def test_bad_predicate(self):
+        with self.assertRaises(TypeError):
+            Predicate('NAME')
+        engine = FilterEngine(self.columns)
+        with self.assertRaises(ValueError):
+            engine.set(Equals('NOTHING', 1))
+        with self.assertRaises(Exception):
+            Contains('NAME', '(', regex=True)
+
+    def test_combined_mask(self):
+        engine = FilterEngine(self.columns)
+        self.assertIsNone(engine.mask())
+        engine.set(IsNull('NAME', null=False))
+        engine.set(Range('SUM', 0))
+        self.assertEqual(self.rows(engine), [0, 4, 5])
+        engine.set(Range('SUM', 1))
+        self.assertEqual(self.rows(engine), [0, 4])
+        self.assertEqual(engine.remove('NAME').column, 'NAME')
+        self.assertIsNone(engine.remove('NAME'))
+        self.assertEqual(self.rows(engine), [0, 2, 4, 7])
+        engine.clear()
+        self.assertIsNone(engine.mask())
+
+    def test_cached_masks(self):
+        engine = FilterEngine(self.columns)
+        calls = []
+        predicate = Equals('NAME', 'beta')
+        evaluate = predicate.evaluate
+        predicate.evaluate = lambda values, index=None: calls.append(1) or evaluate(values, index)
+        engine.set(predicate)
+        engine.set(IsNull('SUM', null=False))
+        engine.mask()
+        engine.remove('NAME')
+        engine.mask()
+        engine.set(predicate)
+        self.assertEqual(self.rows(engine), [5])
+        self.assertEqual(len(calls), 1)
+        engine.MAX_MASKS = 1
+        engine.set(IsNull('DAY'))
+        engine.remove('NAME')
+        engine.set(predicate)
+        engine.mask()
+        self.assertEqual(len(calls), 2)
+
+    def test_value_index(self):
+        index = ValueIndex.build(self.columns['NAME'], 10)
+        self.assertEqual(np.flatnonzero(index.rows('beta')).tolist(), [1, 5])
+        self.assertIs(index.rows('beta'), index.rows('beta'))
+        self.assertFalse(index.rows('omega').any())
+        self.assertIsNone(ValueIndex.build(self.columns['ID'], 4))
+
+    def test_server_value(self):
+        self.assertEqual(Equals('NAME', 'beta').server_value(), 'beta')
+        self.assertIsNone(Equals('NAME', np.nan).server_value())
+        self.assertIsNone(IsNull('NAME').server_value())
+        for predicate in (IsNull('NAME', null=False), In('NAME', ['a']), Range('SUM', 0), Contains('NAME', 'a')):
+            with self.assertRaises(ValueError):
+                predicate.server_value()
+
+    def test_runs(self):
+        flags = np.array([True, True, False, True, False, False, True])
+        self.assertEqual(runs(flags), [(0, 1), (3, 3), (6, 6)])
+        self.assertEqual(runs(np.zeros(3, dtype=bool)), [])
+        self.assertIsNone(runs(flags, max_runs=2))
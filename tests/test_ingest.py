@@ -0,0 +1,83 @@
+import unittest
+
+try:
+    import numpy as np
+    from cli3.ingest import make_dataframe, parse_bools, parse_column, parse_dates, strptime_format
+except ImportError:
+    np = None
+
+from cli3.models import Column
+from cli3.stream import ColumnBuffers
+
+
+@unittest.skipIf(np is None, 'numpy and pandas are not installed')
+class IngestTestCase(unittest.TestCase):
+    def test_types(self):
+        columns = [Column({'name': 'i', 'type': 'INTEGER'}), Column({'name': 'n', 'type': 'NUMBER'}),
+                   Column({'name': 's', 'type': 'STRING'}), Column({'name': 'b', 'type': 'BOOL'}),
+                   Column({'name': 'd', 'type': 'DATE'}), Column({'name': 't', 'type': 'TIME'})]
+        rows = [[1, 1.5, 'a', True, '2022-01-31', '10:20:30'],
+                ['2', '2.5', 3, 'TRUE', None, None],
+                [None, None, None, 'false', '2022-02-01', '23:59:59']]
+        df = make_dataframe(ColumnBuffers.from_rows(rows), columns)
+        self.assertEqual(list(df.columns), ['I', 'N', 'S', 'B', 'D', 'T'])
+        self.assertEqual(df['I'].dtype, np.int64)
+        self.assertEqual(df['I'].tolist(), [1, 2, 0])
+        self.assertEqual(df['N'].dtype, np.float64)
+        self.assertTrue(np.isnan(df['N'][2]))
+        self.assertEqual(df['S'].dtype, object)
+        self.assertEqual(df['S'].tolist(), ['a', '3', None])
+        self.assertEqual(df['B'].tolist(), [True, True, False])
+        self.assertEqual(str(df['D'].dtype), 'datetime64[ns]')
+        self.assertEqual(str(df['D'][0].date()), '2022-01-31')
+        self.assertTrue(df['D'].isnull()[1])
+        self.assertEqual(str(df['T'][2].time()), '23:59:59')
+        # Row lists give the same frame
+        self.assertTrue(make_dataframe(rows, columns).equals(df))
+
+    def test_formats(self):
+        self.assertEqual(strptime_format('dd.MM.yyyy HH:mm'), '%d.%m.%Y %H:%M')
+        self.assertEqual(strptime_format('%d/%m/%Y'), '%d/%m/%Y')
+        self.assertIsNone(strptime_format('{:.2f}'))
+        column = Column({'name': 'd', 'type': 'DATE', 'format': 'dd/MM/yyyy'})
+        self.assertEqual(str(parse_column(['31/01/2022'], column)[0])[:10], '2022-01-31')
+        # Values not in format are inferred
+        column = Column({'name': 'd', 'type': 'DATETIME'})
+        self.assertEqual(str(parse_column(['2022-01-31 10:00'], column)[0])[:16], '2022-01-31T10:00')
+
+    def test_dates(self):
+        times = parse_dates(['12:30:00', ''], 'TIME')
+        self.assertEqual(str(times[0]), '1900-01-01T12:30:00.000000000')
+        self.assertTrue(np.isnat(times[1]))
+        self.assertEqual([str(time)[11:19] for time in parse_dates(['10:00', '10:00:01', None], 'TIME')],
+                         ['10:00:00', '10:00:01', ''])
+        # Time zone is dropped, local time is kept
+        datetimes = parse_dates(['2022-01-31 10:20:30+03:00', '2022-01-31T10:20:30Z', '2022-01-31 10:20:30'],
+                                'DATETIME')
+        self.assertEqual({str(value)[:19] for value in datetimes}, {'2022-01-31T10:20:30'})
+        self.assertEqual(str(parse_dates(['2022-01-31T10:20:30+0300'], 'DATETIME')[0])[:19], '2022-01-31T10:20:30')
+        # Not parsed values are null
+        self.assertEqual([str(value)[:10] for value in parse_dates(['2022-01-31', 'bad', None], 'DATE')],
+                         ['2022-01-31', 'NaT', 'NaT'])
+
+    def test_bools(self):
+        self.assertEqual(parse_bools([True, 'tRuE', 'TRUE', 1, 1.0, None, 'false', False]).tolist(),
+                         [True, True, True, False, False, False, False, False])
+
+    def test_nullable_integers(self):
+        column = Column({'name': 'i', 'type': 'INTEGER'})
+        self.assertEqual(make_dataframe([[1], [None], ['3']], [column])['I'].tolist(), [1, 0, 3])
+        df = make_dataframe([[1], [None], ['3']], [column], nullable=True)
+        self.assertEqual(str(df['I'].dtype), 'Int64')
+        self.assertEqual(df['I'].isnull().tolist(), [False, True, False])
+        self.assertEqual(df['I'][2], 3)
+
+    def test_empty(self):
+        df = make_dataframe(ColumnBuffers(), [Column({'name': 'b', 'type': 'BOOL'}),
+                                              Column({'name': 'd', 'type': 'DATE'})])
+        self.assertEqual(len(df), 0)
+        self.assertEqual(df['B'].dtype, bool)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import asyncio
+import random
+import unittest
+
+from cli3.aio import AsyncSession
+from cli3.loadtest import LoadReport, Mix, percentile, run_async
+from cli3.mock_server import MockServer, demo_queries
+
+
+class MixTestCase(unittest.TestCase):
+    def test_parse(self):
+        mix = Mix.parse('1:3, 2?P=x&Q=:1,3')
+        self.assertEqual(mix.entries, [(1, {}, 3.0), (2, {'P': 'x', 'Q': ''}, 1.0), (3, {}, 1.0)])
+        self.assertEqual(mix.query_ids(), [1, 2, 3])
+        with self.assertRaises(ValueError):
+            Mix.parse('')
+
+    def test_choose(self):
+        mix = Mix.parse('1:9,2:1')
+        rnd = random.Random(1)
+        chosen = [mix.choose(rnd)[0] for _ in range(1000)]
+        self.assertGreater(chosen.count(1), 800)
+        self.assertGreater(chosen.count(2), 50)
+
+
+class ReportTestCase(unittest.TestCase):
+    def test_percentile(self):
+        values = list(range(101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([1, 2], 50), 1.5)
+        self.assertEqual(percentile([], 95), 0.0)
+
+    def test_summary(self):
+        report = LoadReport(2)
+        report.start()
+        for latency in (0.1, 0.2, 0.3):
+            report.add(latency)
+        report.add(1.0, error=True)
+        report.received = 1000
+        report.finish()
+        summary = report.summary()
+        self.assertEqual(summary['requests'], 4)
+        self.assertEqual(summary['errors'], 1)
+        self.assertAlmostEqual(summary['p50'], 0.25)
+        self.assertEqual(summary['max'], 1.0)
+        self.assertGreater(summary['bytes_per_second'], 0)
+        self.assertIn('req/s', str(report))
+
+
+class RunAsyncTestCase(unittest.TestCase):
+    def test_run(self):
+        async def run(server):
+            async with AsyncSession(server.server, server.schema, max_connections=3) as session:
+                return await run_async(session, Mix.parse('1:2,3:1'), 20, 3, random.Random(0))
+
+        with MockServer(demo_queries(1500)) as server:
+            report = asyncio.run(run(server))
+        summary = report.summary()
+        self.assertEqual(summary['requests'], 20)
+        self.assertEqual(summary['errors'], 0)
+        self.assertGreater(summary['bytes_per_second'], 0)
+        self.assertGreaterEqual(summary['p99'], summary['p50'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+import json
+import time
+import unittest
+import urllib.error
+import urllib.request
+
+from cli3.mock_server import MockServer, NetworkProfile, demo_queries, synthetic_query
+from cli3.stream import ColumnBuffers, columnize
+from cli3.synthetic import Generator, make_specs
+
+
+class MockServerBatchTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = MockServer(demo_queries(30)).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def test_batch(self):
+        body = json.dumps({'requests': ['id=1', 'id=2&limit=10&offset=0', 'id=99']}).encode()
+        request = urllib.request.Request(f'{self.server.url}/api/docs/batch', body,
+                                         {'Content-Type': 'application/json'})
+        with urllib.request.urlopen(request) as answer:
+            self.assertEqual(answer.headers['Content-Type'], 'application/x-ndjson')
+            parts = [json.loads(line) for line in answer.read().splitlines()]
+        self.assertEqual([part['index'] for part in parts], [0, 1, 2])
+        self.assertEqual(len(parts[0]['answer']['cursor']['data']), 30)
+        self.assertEqual(parts[1]['answer']['cursor']['page']['total'], 30)
+        self.assertEqual(parts[2]['status'], 400)
+        answer = columnize(parts[1]['answer'])
+        self.assertIsInstance(answer['cursor']['data'], ColumnBuffers)
+        self.assertEqual(len(answer['cursor']['data']), 10)
+
+
+class SyntheticTestCase(unittest.TestCase):
+    def test_cursor(self):
+        generator = Generator(seed=1, nci_size=10)
+        specs = make_specs(8, nci_columns=2, style_columns=3, nci_tables=['A', 'B'])
+        columns, rows = generator.cursor(specs, 50, row_style=True)
+        names = [column['name'] for column in columns]
+        self.assertEqual(names[:10], ['ID', 'C1', 'C2', 'C3', 'C4', 'C5', 'C6', 'C7', 'N1', 'N2'])
+        self.assertEqual(names[10:], ['STYLE_C1', 'STYLE_C2', 'STYLE_C3', 'STYLE'])
+        self.assertEqual(columns[9]['nci'], {'name': 'B'})
+        self.assertEqual(len(rows), 50)
+        self.assertTrue(all(len(row) == len(columns) for row in rows))
+        codes = {row[0] for row in generator.nci_table('A')['rows']}
+        self.assertTrue(all(row[8] in codes for row in rows))
+        self.assertTrue(all(row[10] is None or row[10] in generator.styles() for row in rows))
+        # Reproducible
+        self.assertEqual(rows, generator.cursor(specs, 50, row_style=True)[1])
+
+    def test_nulls(self):
+        specs = make_specs(3, ['NUMBER'], nulls=0.5)
+        columns, rows = Generator().cursor(specs, 200)
+        self.assertTrue(all(row[0] is not None for row in rows))
+        self.assertTrue(0 < sum(row[1] is None for row in rows) < 200)
+
+
+class MockServerApiTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        generator = Generator(nci_size=5)
+        queries = demo_queries(10) + [synthetic_query(10, generator, 20, 4, nci_columns=1, style_columns=1)]
+        cls.server = MockServer(queries, generator=generator, nci_tables=['NCI_1'], users={'user': 'secret'},
+                                require_auth=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor())
+
+    def get(self, uri: str):
+        with self.opener.open(f'{self.server.url}{uri}') as answer:
+            return json.loads(answer.read())
+
+    def login(self):
+        self.opener.open(f'{self.server.url}/api/auth/signin?username=user&password=secret').close()
+
+    def test_auth(self):
+        with self.assertRaises(urllib.error.HTTPError) as error:
+            self.get('/api/docs/tree')
+        self.assertEqual(error.exception.code, 401)
+        with self.assertRaises(urllib.error.HTTPError) as error:
+            self.opener.open(f'{self.server.url}/api/auth/signin?username=user&password=wrong')
+        self.assertEqual(error.exception.code, 401)
+        self.login()
+        self.get('/api/docs/styles')
+        self.opener.open(f'{self.server.url}/api/auth/signout').close()
+        with self.assertRaises(urllib.error.HTTPError):
+            self.get('/api/docs/styles')
+
+    def test_apis(self):
+        self.login()
+        tree = self.get('/api/docs/tree')
+        self.assertEqual([folder['name'] for folder in tree['folders']], ['Mock', 'Synthetic'])
+        self.assertEqual([query['id'] for query in tree['folders'][0]['folders'][0]['queries']], [2, 3])
+        self.assertEqual(self.get('/api/nci'), [{'name': 'NCI_1'}])
+        self.assertEqual(len(self.get('/api/nci/NCI_1')['rows']), 5)
+        self.assertEqual(len(self.get('/api/docs/styles')), 8)
+        cursor = self.get('/api/docs/request?id=10')['cursor']
+        self.assertEqual(len(cursor['data']), 20)
+        self.assertEqual(cursor['columns'][-1]['name'], 'STYLE_C1')
+        with self.assertRaises(urllib.error.HTTPError) as error:
+            self.get('/api/nci/NCI_2')
+        self.assertEqual(error.exception.code, 404)
+
+
+class MockServerProfileTestCase(unittest.TestCase):
+    def test_profile(self):
+        profile = NetworkProfile(latency=0.05, bandwidth=200000)
+        with MockServer(demo_queries(2000), profile=profile, compress=True) as server:
+            started = time.monotonic()
+            request = urllib.request.Request(f'{server.url}/api/docs/request?id=1')
+            with urllib.request.urlopen(request) as answer:
+                size = len(answer.read())
+                self.assertIsNone(answer.headers['Content-Encoding'])
+            self.assertGreaterEqual(time.monotonic() - started, 0.05 + size / 200000 * 0.9)
+            request = urllib.request.Request(f'{server.url}/api/docs/request?id=1', headers={'Accept-Encoding': 'gzip'})
+            with urllib.request.urlopen(request) as answer:
+                self.assertEqual(answer.headers['Content-Encoding'], 'gzip')
+                self.assertLess(len(answer.read()), size)
+
+
+if __name__ == '__main__':
+    unittest.main()
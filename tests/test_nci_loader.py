@@ -0,0 +1,25 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from cli3.nci_loader import translate_codes, _index_nci_table
+
+
+class TranslateCodesTestCase(unittest.TestCase):
+    table = _index_nci_table(pd.DataFrame({'CODE': ['01', '02', '02'], 'NAME': ['One', 'Two', 'Second']}))
+
+    def test_translate(self):
+        codes = np.array(['02', None, '01', '99'], dtype=object)
+        self.assertEqual(translate_codes(codes, self.table, 'NAME').tolist(), ['Two', None, 'One', '99'])
+        # Codes are not changed
+        self.assertEqual(codes.tolist(), ['02', None, '01', '99'])
+
+    def test_not_loaded(self):
+        codes = np.array(['01', None], dtype=object)
+        self.assertEqual(translate_codes(codes, None, 'NAME').tolist(), ['01', None])
+        self.assertEqual(translate_codes(codes, self.table, 'TITLE').tolist(), ['01', None])
+
+    def test_integer_codes(self):
+        table = _index_nci_table(pd.DataFrame({'CODE': [1, 2], 'NAME': ['One', 'Two']}))
+        self.assertEqual(translate_codes(np.array([2, 3]), table, 'NAME').tolist(), ['Two', '3'])
@@ -0,0 +1,94 @@
+import json
+import unittest
+import urllib.request
+
+import numpy as np
+import pandas as pd
+
+from cli3.mock_server import MockServer, MockQuery, DEMO_COLUMNS, make_rows
+from cli3.models import Column
+from cli3.paging import Pager, encode_page, decode_sort, decode_filters, filter_value
+
+
+class PagerTestCase(unittest.TestCase):
+    def test_offset(self):
+        pager = Pager(Pager.OFFSET, 10)
+        self.assertEqual(pager.page_params(), {'limit': '10', 'offset': '0'})
+        pager.page_received({'total': 15}, 10)
+        self.assertTrue(pager.has_more())
+        self.assertEqual(pager.page_params()['offset'], '10')
+        pager.page_received({'total': 15}, 5)
+        self.assertFalse(pager.has_more())
+
+    def test_keyset_sort_filters(self):
+        pager = Pager(Pager.KEYSET, 10)
+        pager.page_received({'next': '9'}, 10)
+        self.assertEqual(pager.page_params()['after'], '9')
+        pager.set_sort([('NAME', False)])
+        pager.set_filters({'DAY': None})
+        params = pager.page_params()
+        self.assertEqual(params['after'], '')
+        self.assertEqual(decode_sort(params['sort']), [('NAME', False)])
+        self.assertEqual(decode_filters(params['filter']), {'DAY': None})
+        self.assertTrue(encode_page(params).startswith('&limit=10'))
+
+
+class MockServerPagingTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        rows = make_rows(25)
+        rows[3][3] = None
+        cls.server = MockServer([MockQuery(1, 'Paged', DEMO_COLUMNS, rows)]).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def _cursor(self, params: dict) -> dict:
+        url = f'{self.server.url}/api/docs/request?id=1{encode_page(params)}'
+        with urllib.request.urlopen(url) as answer:
+            return json.loads(answer.read())['cursor']
+
+    def _load_all(self, pager: Pager) -> list:
+        rows = []
+        while pager.has_more():
+            cursor = self._cursor(pager.page_params())
+            rows.extend(cursor['data'])
+            pager.page_received(cursor['page'], len(cursor['data']))
+        return rows
+
+    def test_offset_and_keyset_pages(self):
+        for mode in (Pager.OFFSET, Pager.KEYSET):
+            pager = Pager(mode, 10)
+            pager.set_sort([('VALUE', False)])
+            rows = self._load_all(pager)
+            self.assertEqual(len(rows), 25)
+            values = [row[2] for row in rows]
+            self.assertEqual(values, sorted(values, reverse=True))
+
+    def test_filter_pushdown(self):
+        pager = Pager(Pager.OFFSET, 10)
+        pager.set_filters({'DAY': None})
+        rows = self._load_all(pager)
+        self.assertEqual([row[0] for row in rows], [3])
+        self.assertEqual(pager.total, 1)
+
+    def test_typed_filter_pushdown(self):
+        columns = {column['name']: Column(column) for column in DEMO_COLUMNS}
+        for day in (np.datetime64('2022-04-16'), pd.Timestamp('2022-04-16')):
+            pager = Pager(Pager.OFFSET, 10)
+            pager.set_filters({'DAY': filter_value(day, columns['DAY'])})
+            self.assertEqual(decode_filters(pager.page_params()['filter']), {'DAY': '2022-04-16'})
+            rows = self._load_all(pager)
+            self.assertEqual([row[0] for row in rows], [15])
+        pager = Pager(Pager.OFFSET, 10)
+        pager.set_filters({'ID': filter_value(np.int64(7), columns['ID'])})
+        self.assertEqual([row[0] for row in self._load_all(pager)], [7])
+
+    def test_whole_answer(self):
+        self.assertEqual(len(self._cursor({})['data']), 25)
+        self.assertNotIn('page', self._cursor({}))
+
+
+if __name__ == '__main__':
+    unittest.main()
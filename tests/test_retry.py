@@ -0,0 +1,50 @@
+import random
+import unittest
+
+from cli3.retry import RetryPolicy, RetryBudget, parse_retry_after
+
+
+class RetryTestCase(unittest.TestCase):
+    def test_parse_retry_after(self):
+        self.assertEqual(parse_retry_after('5'), 5.0)
+        self.assertIsNone(parse_retry_after(None))
+        self.assertIsNone(parse_retry_after('soon'))
+        now = 1445412480.0  # Wed, 21 Oct 2015 07:28:00 GMT
+        self.assertEqual(parse_retry_after('Wed, 21 Oct 2015 07:28:30 GMT', now), 30.0)
+        self.assertEqual(parse_retry_after('Wed, 21 Oct 2015 07:27:00 GMT', now), 0.0)
+
+    def test_backoff_is_capped(self):
+        policy = RetryPolicy(max_attempts=10, base_delay=1, max_delay=4, rnd=random.Random(1))
+        for attempts in range(1, 10):
+            delay = policy.delay(attempts)
+            self.assertGreaterEqual(delay, 0)
+            self.assertLessEqual(delay, min(4, 2 ** (attempts - 1)))
+        self.assertIsNone(policy.delay(10))
+
+    def test_retry_after(self):
+        policy = RetryPolicy(max_attempts=3, max_delay=10)
+        self.assertEqual(policy.delay(1, retry_after=7), 7)
+        self.assertIsNone(policy.delay(1, retry_after=60))
+
+    def test_budget(self):
+        policy = RetryPolicy(max_attempts=5, budget=RetryBudget(ratio=0.5, initial=1))
+        self.assertIsNotNone(policy.delay(1))
+        self.assertIsNone(policy.delay(1))
+        policy.request_started()
+        policy.request_started()
+        self.assertIsNotNone(policy.delay(1))
+
+    def test_session_transient_errors(self):
+        from PyQt5.QtNetwork import QNetworkReply
+        from cli3.network import Session
+        session = Session('http://localhost:1', '/main', retry_policy=RetryPolicy(max_attempts=3))
+        # Watchdog timeout after answer headers
+        self.assertIsNotNone(session._retry_delay(1, QNetworkReply.TimeoutError, 200, None))
+        self.assertIsNotNone(session._retry_delay(1, QNetworkReply.RemoteHostClosedError, 200, None))
+        self.assertIsNotNone(session._retry_delay(1, QNetworkReply.ServiceUnavailableError, 503, None))
+        self.assertIsNone(session._retry_delay(1, QNetworkReply.OperationCanceledError, 200, None))
+        self.assertIsNone(session._retry_delay(1, QNetworkReply.ContentNotFoundError, 404, None))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import unittest
+
+from cli3.scheduler import RequestScheduler, Priority
+
+
+class RequestSchedulerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.sent = []
+        self.scheduler = RequestScheduler(self.sent.append, max_per_host=2, reserved_interactive=1)
+
+    def test_limit_per_host(self):
+        for item in ('a', 'b', 'c'):
+            self.scheduler.submit(item, 'host1')
+        self.scheduler.submit('d', 'host2')
+        self.assertEqual(self.sent, ['a', 'b', 'd'])
+        self.assertEqual(self.scheduler.position('c'), 1)
+        self.scheduler.done('a')
+        self.assertEqual(self.sent, ['a', 'b', 'd', 'c'])
+        self.assertIsNone(self.scheduler.position('c'))
+
+    def test_reserved_interactive(self):
+        self.scheduler.submit('refresh1', 'host', Priority.REFRESH)
+        self.scheduler.submit('refresh2', 'host', Priority.REFRESH)
+        self.assertEqual(self.sent, ['refresh1'])
+        self.scheduler.submit('click', 'host', Priority.INTERACTIVE)
+        self.assertEqual(self.sent, ['refresh1', 'click'])
+        self.scheduler.done('click')
+        self.assertEqual(self.scheduler.queued(), ['refresh2'])
+
+    def test_priority_and_fair_turns(self):
+        self.scheduler.submit('busy1', 'host')
+        self.scheduler.submit('busy2', 'host')
+        for item, source in (('w1-1', 'w1'), ('w1-2', 'w1'), ('w2-1', 'w2')):
+            self.scheduler.submit(item, 'host', Priority.REFRESH, source)
+        self.scheduler.submit('prefetch', 'host', Priority.PREFETCH)
+        self.scheduler.submit('click', 'host', Priority.INTERACTIVE)
+        self.assertEqual(self.scheduler.queued(), ['click', 'w1-1', 'w2-1', 'w1-2', 'prefetch'])
+        self.assertEqual(self.scheduler.position('w2-1'), 3)
+
+    def test_remove_queued(self):
+        for item in ('a', 'b', 'c'):
+            self.scheduler.submit(item, 'host')
+        self.scheduler.done('c')
+        self.assertEqual(self.scheduler.queued(), [])
+        self.assertFalse(self.scheduler.is_queued('c'))
+
+
+if __name__ == '__main__':
+    unittest.main()
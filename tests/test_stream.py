@@ -0,0 +1,49 @@
+import json
+import unittest
+
+from cli3.stream import AnswerStreamParser, ColumnBuffers
+
+
+class AnswerStreamParserTestCase(unittest.TestCase):
+    answer = {
+        'cursor': {
+            'type': 'cursor',
+            'columns': [{'name': 'id', 'title': 'Id [#]'}, {'name': 'name', 'title': 'Name'}],
+            'data': [['1', 'Тест " ] ['], [None, '2'], ['3', 'a\\b']],
+        },
+        'text': {'type': 'text', 'data': 'text [1]'},
+        'empty': {'type': 'cursor', 'columns': [], 'data': []},
+    }
+
+    def _parse(self, body: bytes, chunk_size: int) -> dict:
+        parser = AnswerStreamParser()
+        for i in range(0, len(body), chunk_size):
+            parser.feed(body[i:i + chunk_size])
+        return parser.close()
+
+    def test_chunks(self):
+        body = json.dumps(self.answer, ensure_ascii=False, indent=1).encode()
+        for chunk_size in (1, 2, 3, 7, 64, len(body)):
+            answer = self._parse(body, chunk_size)
+            data = answer['cursor']['data']
+            self.assertIsInstance(data, ColumnBuffers)
+            self.assertEqual(list(data.rows()), self.answer['cursor']['data'])
+            self.assertEqual(data.column(1), ['Тест " ] [', '2', 'a\\b'])
+            self.assertEqual(answer['cursor']['columns'], self.answer['cursor']['columns'])
+            self.assertEqual(answer['text'], self.answer['text'])
+            self.assertEqual(len(answer['empty']['data']), 0)
+
+    def test_truncated(self):
+        body = json.dumps(self.answer).encode()
+        parser = AnswerStreamParser()
+        parser.feed(body[:len(body) // 2])
+        with self.assertRaises(ValueError):
+            parser.close()
+
+    def test_ragged_rows(self):
+        buffers = ColumnBuffers.from_rows([['1'], ['2', '3']])
+        self.assertEqual(buffers.to_dict(['A', 'B', 'C']), {'A': ['1', '2'], 'B': [None, '3'], 'C': [None, None]})
+
+
+if __name__ == '__main__':
+    unittest.main()
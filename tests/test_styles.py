@@ -0,0 +1,25 @@
+import unittest
+
+import numpy as np
+
+from cli3.styles import StyleTable, NO_STYLE
+
+
+class StyleTableTestCase(unittest.TestCase):
+    styles = {'RED': {'text_color': '#ff0000', 'background_color': '#00ff00'},
+              'BLUE': {'text_color': '#0000ff', 'background_color': '#ffffff'}}
+
+    def test_encode(self):
+        table = StyleTable(self.styles)
+        values = np.array(['BLUE', None, 'RED', 'UNKNOWN', 'BLUE'], dtype=object)
+        codes = table.encode(values)
+        self.assertEqual(codes.dtype, np.int16)
+        self.assertEqual(codes.tolist(), [1, NO_STYLE, 0, NO_STYLE, 1])
+        self.assertEqual(StyleTable({}).encode(values).tolist(), [NO_STYLE] * 5)
+
+    def test_brushes(self):
+        table = StyleTable(self.styles)
+        self.assertEqual(len(table), 2)
+        self.assertEqual(table.foreground[0].color().name(), '#ff0000')
+        self.assertEqual(table.background[1].color().name(), '#ffffff')
+        self.assertAlmostEqual(table.background[1].color().alphaF(), 0.5, places=2)
@@ -0,0 +1,295 @@
+import unittest
+from unittest import mock
+
+import pandas as pd
+from PyQt5.QtCore import QCoreApplication, QDate, QDateTime, Qt, QTime
+
+from cli3.app import Cli3App
+from cli3.filters import Contains, In, IsNull, Range
+from cli3.models import Query
+from cli3.network import Request
+from cli3.styles import StyleTable
+from cli3.table_window import Cli3TableModel
+
+_app = None
+
+COLUMNS = [
+    {'name': 'ID', 'title': 'Id', 'type': 'INTEGER', 'visable': True},
+    {'name': 'NAME', 'title': 'Name', 'type': 'STRING', 'visable': True},
+    {'name': 'SUM', 'title': 'Sum', 'type': 'NUMBER', 'visable': True},
+    {'name': 'DAY', 'title': 'Day', 'type': 'DATE', 'visable': True},
+    {'name': 'AT', 'title': 'At', 'type': 'DATETIME', 'visable': True},
+    {'name': 'HOUR', 'title': 'Hour', 'type': 'TIME', 'visable': True},
+    {'name': 'OK', 'title': 'Ok', 'type': 'BOOL', 'visable': True},
+    {'name': 'HIDDEN', 'title': 'Hidden', 'type': 'STRING', 'visable': False},
+    {'name': 'STYLE', 'title': None, 'type': 'STRING', 'visable': False},
+    {'name': 'STYLE_NAME', 'title': None, 'type': 'STRING', 'visable': False},
+]
+
+ROWS = [
+    [3, 'gamma', 1.5, '2022-01-31', '2022-01-31 10:20:30', '10:20:30', True, 'h3', 'RED', None],
+    [1, 'alpha', None, None, None, None, False, 'h1', None, 'BLUE'],
+    [2, None, -2.0, '2021-12-01', '2021-12-01 00:00:00', '00:00:01', 'true', 'h2', 'BLUE', 'RED'],
+    [4, 'beta', 10.0, '2022-03-01', '2022-03-01 23:59:59', '23:59:59', None, 'h4', None, None],
+]
+
+STYLES = {'RED': {'text_color': '#ff0000', 'background_color': '#00ff00'},
+          'BLUE': {'text_color': '#0000ff', 'background_color': '#ffffff'}}
+
+
+class StubApp(object):
+    """
+    Cli3App.instance() of model tests: nci tables, styles, icons and session
+    """
+
+    def __init__(self):
+        self.nci = {}
+        self.icons = {}
+        self.session = mock.Mock()
+        self.style_table = StyleTable(STYLES)
+
+    def get_style_table(self) -> StyleTable:
+        return self.style_table
+
+
+class TableModelTestCase(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        global _app
+        _app = QCoreApplication.instance() or _app or QCoreApplication([])
+
+    def setUp(self):
+        self.stub = StubApp()
+        patcher = mock.patch.object(Cli3App, 'instance', return_value=self.stub)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def make_model(self, rows=None, columns=None, request=None, page=None) -> Cli3TableModel:
+        return Cli3TableModel(ROWS if rows is None else rows, COLUMNS if columns is None else columns, request, page)
+
+    def value(self, model, row, column, role=Qt.DisplayRole):
+        value = model.data(model.index(row, column), role)
+        return value.value() if hasattr(value, 'value') else value
+
+    def column(self, model, column):
+        return [model.itemData(model.index(row, column)) for row in range(model.rowCount())]
+
+    def test_cells(self):
+        model = self.make_model()
+        self.assertEqual((model.rowCount(), model.columnCount()), (4, 7))
+        self.assertEqual(self.value(model, 0, 0), '3')
+        self.assertEqual(self.value(model, 0, 1), 'gamma')
+        self.assertEqual(self.value(model, 0, 2), 1.5)
+        self.assertEqual(self.value(model, 0, 3), QDate(2022, 1, 31))
+        self.assertEqual(self.value(model, 0, 4), QDateTime(QDate(2022, 1, 31), QTime(10, 20, 30)))
+        self.assertEqual(self.value(model, 0, 5), QTime(10, 20, 30))
+        self.assertEqual(self.value(model, 0, 6, Qt.CheckStateRole), Qt.Checked)
+        self.assertEqual(self.value(model, 2, 6, Qt.CheckStateRole), Qt.Checked)
+        self.assertEqual(self.value(model, 1, 6, Qt.CheckStateRole), Qt.Unchecked)
+        self.assertEqual(self.value(model, 0, 6, Qt.ToolTipRole), 'True')
+        self.assertEqual(self.value(model, 0, 2, Qt.ToolTipRole), '1.5')
+        for column in (1, 2, 3, 4, 5):
+            self.assertIsNone(self.value(model, 1 if column != 1 else 2, column))
+        self.assertEqual(self.value(model, 2, 0, Qt.EditRole), '2')
+        self.assertIsNone(model.itemData(model.index(9, 0)))
+
+    def test_styles(self):
+        model = self.make_model()
+        # Row style
+        self.assertEqual(self.value(model, 0, 0, Qt.ForegroundRole).color().name(), '#ff0000')
+        # Style column of NAME replaces row style
+        self.assertEqual(self.value(model, 1, 1, Qt.ForegroundRole).color().name(), '#0000ff')
+        self.assertIsNone(self.value(model, 1, 0, Qt.ForegroundRole))
+        self.assertEqual(self.value(model, 2, 0, Qt.BackgroundRole).color().name(), '#ffffff')
+        self.assertIsNone(self.value(model, 3, 0, Qt.ForegroundRole))
+        self.assertIsNone(self.value(model, 0, 1, Qt.BackgroundRole))
+
+    def test_source_rows_and_export(self):
+        model = self.make_model()
+        self.assertEqual(model.get_source_row(2), 2)
+        self.assertEqual(model.get_source_column(1), 1)
+        self.assertEqual(model.store.row(0)['HIDDEN'], 'h3')
+        df = model.get_visable_dataframe()
+        self.assertEqual(list(df.columns), ['Id', 'Name', 'Sum', 'Day', 'At', 'Hour', 'Ok'])
+        self.assertEqual(df['Name'].tolist(), ['gamma', 'alpha', None, 'beta'])
+        self.assertEqual(df['Day'].iloc[0], pd.Timestamp('2022-01-31'))
+
+    def test_paged_fetch(self):
+        query = Query({'id': 1, 'name': 'Paged', 'url': '/query/1', 'params': {},
+                       'paging': {'mode': 'offset', 'page_size': 2}})
+        model = self.make_model(ROWS[:2], request=Request(query, {}), page={'offset': 0, 'limit': 2, 'total': 4})
+        self.assertTrue(model.canFetchMore())
+        model.fetchMore()
+        request = self.stub.session.send_request.call_args[0][0]
+        self.assertEqual(request.page['offset'], '2')
+        self.assertFalse(model.canFetchMore())
+        inserted = []
+        model.rowsInserted.connect(lambda parent, first, last: inserted.append((first, last)))
+        request.content = {'cursor': {'type': 'cursor', 'columns': COLUMNS, 'data': ROWS[2:],
+                                      'page': {'offset': 2, 'limit': 2, 'total': 4}}}
+        request.getDoneSignal.emit(request)
+        self.assertEqual(inserted, [(2, 3)])
+        self.assertEqual(self.column(model, 0), [3, 1, 2, 4])
+        self.assertEqual(self.value(model, 2, 0, Qt.ForegroundRole).color().name(), '#0000ff')
+        self.assertFalse(model.canFetchMore())
+
+    def test_sort(self):
+        model = self.make_model()
+        changes = []
+        model.layoutChanged.connect(lambda: changes.append('layout'))
+        model.sort(0, Qt.AscendingOrder)
+        self.assertEqual(self.column(model, 0), [1, 2, 3, 4])
+        model.sort(2, Qt.DescendingOrder)
+        # Nulls go last
+        self.assertEqual(self.column(model, 0), [4, 3, 2, 1])
+        model.set_sort([(1, True)])
+        self.assertEqual(self.column(model, 1)[:3], ['alpha', 'beta', 'gamma'])
+        self.assertIsNone(self.column(model, 1)[3])
+        model.set_sort([(6, False), (0, False)])
+        self.assertEqual(self.column(model, 0), [3, 2, 4, 1])
+        self.assertEqual(model.get_sort(), [(6, False), (0, False)])
+        self.assertEqual(model.headerData(0, Qt.Horizontal, Qt.DisplayRole), 'Id ▼2')
+        self.assertEqual(model.headerData(6, Qt.Horizontal, Qt.DisplayRole), 'Ok ▼1')
+        model.unsort(0)
+        self.assertEqual(self.column(model, 0), [3, 1, 2, 4])
+        self.assertEqual(model.headerData(0, Qt.Horizontal, Qt.DisplayRole), 'Id')
+        self.assertEqual(changes, ['layout'] * 5)
+        # Source rows follow sort
+        model.sort(0, Qt.DescendingOrder)
+        self.assertEqual([model.get_source_row(row) for row in range(4)], [3, 0, 2, 1])
+
+    def test_paged_sort(self):
+        query = Query({'id': 1, 'name': 'Paged', 'url': '/query/1', 'params': {},
+                       'paging': {'mode': 'offset', 'page_size': 2}})
+        model = self.make_model(ROWS[:2], request=Request(query, {}), page={'offset': 0, 'limit': 2, 'total': 4})
+        model.sort(1, Qt.DescendingOrder)
+        self.assertEqual(model.rowCount(), 0)
+        request = self.stub.session.send_request.call_args[0][0]
+        self.assertEqual(request.page['sort'], 'NAME:desc')
+
+    def record_rows(self, model) -> list:
+        events = []
+        model.rowsRemoved.connect(lambda parent, first, last: events.append(('removed', first, last)))
+        model.rowsInserted.connect(lambda parent, first, last: events.append(('inserted', first, last)))
+        model.modelReset.connect(lambda: events.append(('reset',)))
+        return events
+
+    def test_filters(self):
+        model = self.make_model()
+        events = self.record_rows(model)
+        model.setFilter(6, True)
+        self.assertEqual(self.column(model, 0), [3, 2])
+        self.assertEqual(events, [('removed', 3, 3), ('removed', 1, 1)])
+        self.assertTrue(model.hasFilter(6))
+        self.assertFalse(model.hasFilter(0))
+        events.clear()
+        model.add_filter(Range('SUM', 0))
+        self.assertEqual(self.column(model, 0), [3])
+        self.assertEqual(events, [('removed', 1, 1)])
+        events.clear()
+        model.resetFilter(6)
+        self.assertEqual(self.column(model, 0), [3, 4])
+        self.assertEqual(events, [('inserted', 1, 1)])
+        events.clear()
+        # Rows go and come back at once
+        model.add_filter(Range('SUM', None, 0))
+        self.assertEqual(self.column(model, 0), [2])
+        self.assertEqual(events, [('reset',)])
+        events.clear()
+        model.clear_filters()
+        self.assertEqual(self.column(model, 0), [3, 1, 2, 4])
+        self.assertEqual(events, [('inserted', 0, 1), ('inserted', 3, 3)])
+        self.assertEqual(model.get_filters(), {})
+
+    def test_filters_keep_sort(self):
+        model = self.make_model()
+        model.sort(0, Qt.DescendingOrder)
+        events = self.record_rows(model)
+        model.add_filter(In('NAME', ['alpha', 'beta']))
+        self.assertEqual(self.column(model, 0), [4, 1])
+        self.assertEqual(events, [('removed', 1, 2)])
+        model.add_filter(Contains('HIDDEN', '4'))
+        self.assertEqual(self.column(model, 0), [4])
+        model.set_sort([])
+        self.assertEqual(self.column(model, 0), [4])
+        model.remove_filter('HIDDEN')
+        model.remove_filter('NAME')
+        self.assertEqual(self.column(model, 0), [3, 1, 2, 4])
+
+    def test_scattered_rows_reset_model(self):
+        rows = [[i, f'n{i}', float(i % 2), None, None, None, False, None, None, None] for i in range(10)]
+        model = self.make_model(rows)
+        model.MAX_ROW_RUNS = 2
+        events = self.record_rows(model)
+        model.add_filter(Range('SUM', 1))
+        self.assertEqual(self.column(model, 0), [1, 3, 5, 7, 9])
+        self.assertEqual(events, [('reset',)])
+
+    def test_paged_filters(self):
+        query = Query({'id': 1, 'name': 'Paged', 'url': '/query/1', 'params': {},
+                       'paging': {'mode': 'offset', 'page_size': 2}})
+        model = self.make_model(ROWS[:2], request=Request(query, {}), page={'offset': 0, 'limit': 2, 'total': 4})
+        model.setFilter(3, model.itemData(model.index(0, 3)))
+        request = self.stub.session.send_request.call_args[0][0]
+        self.assertEqual(request.page['filter'], '{"DAY":"2022-01-31"}')
+        with self.assertRaises(ValueError):
+            model.add_filter(IsNull('NAME', null=False))
+        self.assertFalse(model.hasFilter(1))
+
+    def test_nci_columns(self):
+        self.stub.nci['NCI_1'] = pd.DataFrame({'NAME': ['Alpha', 'Gamma', 'One and half']},
+                                              index=pd.Index(['alpha', 'gamma', '1.5'], name='CODE'))
+        nci = {'nci': {'name': 'NCI_1'}, 'nci_column': 'name'}
+        columns = [dict(column) for column in COLUMNS]
+        columns[1].update(nci)
+        columns[2].update(nci)
+        columns[7].update(nci={}, nci_column='name')
+        model = self.make_model(columns=columns)
+        self.assertEqual(self.column(model, 1), ['Gamma', 'Alpha', None, 'beta'])
+        # Numbers are shown as is
+        self.assertEqual(self.value(model, 0, 2), 1.5)
+        self.assertFalse(model._is_translated(model._columns[7]))
+        model.sort(1, Qt.AscendingOrder)
+        self.assertEqual(self.column(model, 0), [1, 3, 4, 2])
+        model.sort(2, Qt.AscendingOrder)
+        self.assertEqual(self.column(model, 2)[:3], [-2.0, 1.5, 10.0])
+
+    def test_lazy_hidden_columns(self):
+        model = self.make_model()
+        store = model.store
+        converted = lambda: [name for name in store.names if store.is_converted(name)]
+        self.assertEqual(converted(), ['ID', 'NAME', 'SUM', 'DAY', 'AT', 'HOUR', 'OK'])
+        self.value(model, 0, 0)
+        model.get_visable_dataframe()
+        self.assertEqual(len(converted()), 7)
+        # Style lookup of ID takes row styles, of NAME - its style column
+        self.value(model, 0, 0, Qt.ForegroundRole)
+        self.assertEqual(converted()[7:], ['STYLE'])
+        self.value(model, 0, 1, Qt.ForegroundRole)
+        self.assertEqual(converted()[7:], ['STYLE', 'STYLE_NAME'])
+        # Subquery params read only their columns
+        self.assertEqual(store.row(1, ['HIDDEN', 'NOTHING']), {'HIDDEN': 'h1'})
+        self.assertTrue(store.is_converted('HIDDEN'))
+
+    def test_lazy_columns_of_pages(self):
+        query = Query({'id': 1, 'name': 'Paged', 'url': '/query/1', 'params': {},
+                       'paging': {'mode': 'offset', 'page_size': 2}})
+        model = self.make_model(ROWS[:2], request=Request(query, {}), page={'offset': 0, 'limit': 2, 'total': 4})
+        model.fetchMore()
+        request = self.stub.session.send_request.call_args[0][0]
+        request.content = {'cursor': {'type': 'cursor', 'columns': COLUMNS, 'data': ROWS[2:],
+                                      'page': {'offset': 2, 'limit': 2, 'total': 4}}}
+        request.getDoneSignal.emit(request)
+        self.assertFalse(model.store.is_converted('HIDDEN'))
+        self.assertEqual(model.store.column('HIDDEN').tolist(), ['h3', 'h1', 'h2', 'h4'])
+
+    def test_filter_hidden_column(self):
+        model = self.make_model()
+        model.add_filter(In('HIDDEN', ['h2', 'h4']))
+        self.assertTrue(model.store.is_converted('HIDDEN'))
+        self.assertEqual(self.column(model, 0), [2, 4])
+
+
+if __name__ == '__main__':
+    unittest.main()
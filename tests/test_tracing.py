@@ -0,0 +1,43 @@
+import json
+import os
+import tempfile
+import unittest
+
+from cli3.tracing import Spans, Phase, chrome_trace, save_chrome_trace
+
+
+class TracingTestCase(unittest.TestCase):
+    def test_spans(self):
+        spans = Spans()
+        spans.add(Phase.QUEUE, 1.0, 1.5)
+        spans.add(Phase.PARSE, 2.0, 2.1)
+        spans.add(Phase.PARSE, 2.2, 2.4)
+        spans.add(Phase.TTFB, None)
+        with spans.measure(Phase.MODEL):
+            pass
+        self.assertAlmostEqual(spans.duration(Phase.PARSE), 0.3)
+        self.assertTrue(spans.has(Phase.MODEL))
+        self.assertFalse(spans.has(Phase.TTFB))
+        self.assertEqual(len(spans.copy()), len(spans))
+
+    def test_chrome_trace(self):
+        spans = Spans([(Phase.QUEUE, 10.0, 10.5), (Phase.PARSE, 11.0, 11.1), (Phase.PARSE, 11.1005, 11.2),
+                       (Phase.PARSE, 12.0, 12.5)])
+        trace = chrome_trace([('Query [A=1]', spans)])
+        events = trace['traceEvents']
+        self.assertEqual(events[0], {'name': 'thread_name', 'ph': 'M', 'pid': 1, 'tid': 1,
+                                     'args': {'name': 'Query [A=1]'}})
+        parse = [event for event in events if event['name'] == Phase.PARSE]
+        self.assertEqual(len(parse), 2)
+        self.assertEqual(parse[0]['args']['spans'], 2)
+        self.assertEqual(parse[0]['ts'], 1000000.0)
+        self.assertAlmostEqual(parse[0]['dur'], 200000.0, delta=1)
+        with tempfile.TemporaryDirectory() as path:
+            filename = os.path.join(path, 'trace.json')
+            save_chrome_trace(filename, [('Query', spans)])
+            with open(filename) as inp:
+                self.assertEqual(json.load(inp)['displayTimeUnit'], 'ms')
+
+
+if __name__ == '__main__':
+    unittest.main()